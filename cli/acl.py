@@ -13,6 +13,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+from functools import lru_cache
 
 # aceflag: an int value taken from the constant ACEFLAG_*
 # acemask:  an int value taken from the constant ACEMASK_*
@@ -160,6 +161,22 @@ ACEFLAG_STR_INT = {
 }
 
 
+def _aceflag_to_cdmi_str(num_value):
+    res = []
+    for idx in range(len(ACEFLAG_TABLE)):
+        if num_value == 0:
+            return ", ".join(res)
+
+        if num_value & ACEFLAG_TABLE[idx][0] == ACEFLAG_TABLE[idx][0]:
+            res.append(ACEFLAG_TABLE[idx][1])
+            num_value = num_value ^ ACEFLAG_TABLE[idx][0]
+    return ", ".join(res)
+
+
+# All the combinations of flags (they are all on the lowest byte)
+ACEFLAG_INT_CDMI_STR = [_aceflag_to_cdmi_str(value) for value in range(0x100)]
+
+
 def aceflag_to_cdmi_str(num_value):
     """Return the string value for ACE flag value given
 
@@ -170,22 +187,17 @@ def aceflag_to_cdmi_str(num_value):
     :type num_value: integer
     :rtype: string
     """
-    res = []
-    for idx in range(len(ACEFLAG_TABLE)):
-        if num_value == 0:
-            return ", ".join(res)
-
-        if num_value & ACEFLAG_TABLE[idx][0] == ACEFLAG_TABLE[idx][0]:
-            res.append(ACEFLAG_TABLE[idx][1])
-            num_value = num_value ^ ACEFLAG_TABLE[idx][0]
-    return ", ".join(res)
+    if 0 <= num_value < 0x100:
+        return ACEFLAG_INT_CDMI_STR[num_value]
+    return _aceflag_to_cdmi_str(num_value)
 
 
+@lru_cache(maxsize=4096)
 def acemask_to_cdmi_str(num_value, is_object):
     """Return the string value for ACE mask value given.
 
     Return the string value for the ACE mask value given. It returns a
-    text expression simpler to understand.
+    text expression simpler to understand. The results are memoized.
 
     :param num_value: ACE mask numeric value
     :type num_value: integer
@@ -223,6 +235,7 @@ def str_to_acemask(lvl, is_object):
         return ACEMASK_STR_INT_COL.get(lvl, 0)
 
 
+@lru_cache(maxsize=4096)
 def cdmi_str_to_aceflag(cdmi_str):
     """Return the aceflag from a cdmi string"""
     aceflag = 0
@@ -233,6 +246,7 @@ def cdmi_str_to_aceflag(cdmi_str):
     return aceflag
 
 
+@lru_cache(maxsize=4096)
 def cdmi_str_to_acemask(cdmi_str, is_object):
     """Return the acemask from a cdmi string"""
     if is_object:
@@ -257,3 +271,133 @@ def str_to_cdmi_str_acemask(lvl, is_object):
     """Return the cdmi string from a simplified access level"""
     acemask = str_to_acemask(lvl, is_object)
     return acemask_to_cdmi_str(acemask, is_object)
+
+
+def is_inherited_ace(ace):
+    """Return True if an ACE has been inherited from an ancestor"""
+    aceflag = cdmi_str_to_aceflag(ace.get("aceflags", ""))
+    return aceflag & ACEFLAG_INHERITED == ACEFLAG_INHERITED
+
+
+def has_own_ace(acl, identifier):
+    """Return True if an ACL has an ACE for ``identifier`` which isn't
+    inherited from an ancestor"""
+    return any(
+        ace.get("identifier") == identifier and not is_inherited_ace(ace)
+        for ace in acl
+    )
+
+
+def merge_ace(acl, ace):
+    """Return a new ACL where ``ace`` replaces the ACEs defined on the object
+    (not inherited) for the same identifier and type, or is appended.
+
+    :param acl: list of ACE (dict)
+    :type acl: list
+    :param ace: ACE to add to the list
+    :type ace: dict
+    :rtype: list
+    """
+    res = []
+    added = False
+    for current in acl:
+        if (
+            current.get("identifier") == ace["identifier"]
+            and current.get("acetype", "ALLOW") == ace["acetype"]
+            and not is_inherited_ace(current)
+        ):
+            if not added:
+                res.append(ace)
+                added = True
+        else:
+            res.append(current)
+    if not added:
+        res.append(ace)
+    return res
+
+
+def ace_acemask(ace):
+    """Return the acemask of an ACE, whether it uses the object or the
+    container names of the masks"""
+    acemask = ace.get("acemask", "")
+    if isinstance(acemask, int):
+        return acemask
+    return cdmi_str_to_any_acemask(acemask)
+
+
+@lru_cache(maxsize=4096)
+def cdmi_str_to_any_acemask(cdmi_str):
+    """Return the acemask from a cdmi string which may use the object or the
+    container names of the masks"""
+    return cdmi_str_to_acemask(cdmi_str, True) | cdmi_str_to_acemask(cdmi_str, False)
+
+
+def effective_acemask(aces, identifiers):
+    """Return the acemask granted by a list of ACEs to a principal.
+
+    The ACEs are evaluated in order, a bit is granted by the first ALLOW ACE
+    which sets it unless a previous DENY ACE set it.
+
+    :param aces: list of (ACE, aceflag, acemask) as returned by ``parse_acl``,
+      in evaluation order
+    :type aces: list
+    :param identifiers: identifiers which match the principal (its name, its
+      groups, ...)
+    :type identifiers: set
+    :rtype: int
+    """
+    allowed = 0
+    denied = 0
+    for ace, _, acemask in aces:
+        if ace.get("identifier") not in identifiers:
+            continue
+        if ace.get("acetype", "ALLOW").upper() == "DENY":
+            denied |= acemask & ~allowed
+        else:
+            allowed |= acemask & ~denied
+    return allowed
+
+
+def _batch(func, values, *args):
+    """Apply a conversion to a list of values, each distinct value is
+    converted once"""
+    converted = {value: func(value, *args) for value in set(values)}
+    return [converted[value] for value in values]
+
+
+def aceflags_to_cdmi_strs(num_values):
+    """Return the cdmi strings of a list of aceflags"""
+    return _batch(aceflag_to_cdmi_str, num_values)
+
+
+def acemasks_to_cdmi_strs(num_values, is_object):
+    """Return the cdmi strings of a list of acemasks"""
+    return _batch(acemask_to_cdmi_str, num_values, is_object)
+
+
+def cdmi_strs_to_aceflags(cdmi_strs):
+    """Return the aceflags of a list of cdmi strings"""
+    return _batch(cdmi_str_to_aceflag, cdmi_strs)
+
+
+def cdmi_strs_to_acemasks(cdmi_strs, is_object):
+    """Return the acemasks of a list of cdmi strings"""
+    return _batch(cdmi_str_to_acemask, cdmi_strs, is_object)
+
+
+def cdmi_strs_to_str_acemasks(cdmi_strs, is_object):
+    """Return the simplified access levels of a list of cdmi strings"""
+    return _batch(cdmi_str_to_str_acemask, cdmi_strs, is_object)
+
+
+def parse_acl(acl):
+    """Decode the flags and the masks of a list of ACEs.
+
+    :param acl: list of ACE (dict)
+    :type acl: list
+    :returns: list of (ACE, aceflag, acemask) tuples
+    :rtype: list
+    """
+    aceflags = cdmi_strs_to_aceflags([ace.get("aceflags", "") for ace in acl])
+    acemasks = [ace_acemask(ace) for ace in acl]
+    return list(zip(acl, aceflags, acemasks))
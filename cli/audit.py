@@ -0,0 +1,170 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+from cli.acl import (
+    ACEFLAG_CONTAINER_INHERIT,
+    ACEFLAG_INHERIT_ONLY,
+    ACEFLAG_INHERITED,
+    ACEFLAG_NO_PROPAGATE,
+    ACEFLAG_OBJECT_INHERIT,
+    effective_acemask,
+    parse_acl,
+)
+from cli.client import CDMI_CONTAINER
+
+# Identifiers which match every user or every authenticated user
+EVERYONE = "EVERYONE@"
+AUTHENTICATED = "AUTHENTICATED@"
+
+ACL_FIELDS = ["objectType", "metadata:cdmi_acl"]
+
+
+class AuditError(Exception):
+    """The permissions can't be computed"""
+
+
+def parent_container(path):
+    """Return the path of the parent container of a path, None for the root.
+
+    :arg path: Absolute path, containers end with a /
+    :rtype: str
+
+    """
+    if path == "/":
+        return None
+    return path.rstrip("/").rsplit("/", 1)[0] + "/"
+
+
+class PermissionAnalyzer():
+    """Compute the effective permissions of a user or a group in the archive.
+
+    The ACEs which apply to a container or a data object are the ACEs defined
+    on it followed by the ACEs inherited from its ancestors (nearest first),
+    according to their CONTAINER_INHERIT, OBJECT_INHERIT, NO_PROPAGATE and
+    INHERIT_ONLY flags. The ACLs of the ancestors and the group lookups are
+    memoized, so each of them is read once whatever the number of paths
+    checked.
+    """
+
+    def __init__(self, client):
+        """Create a new ``PermissionAnalyzer``.
+
+        :arg client: The client used to read the ACLs and the groups
+        :type client: cli.client.RadonClient
+
+        """
+        self.client = client
+        # path -> (is_object, ACEs defined on the node, see parse_acl)
+        self._acls = {}
+        # container path -> ACEs inherited by its children
+        self._propagated = {}
+        # principal -> (identifiers, administrator)
+        self._principals = {}
+
+    def principal(self, name):
+        """Return the identifiers which match a user or a group in an ACE,
+        and if the principal is an administrator (who bypasses the ACLs).
+
+        :arg name: Name of a user or a group
+        :rtype: (set, bool)
+
+        """
+        if name in self._principals:
+            return self._principals[name]
+        res = self.client.list_user(name)
+        if res.ok():
+            user = res.json()
+            groups = [
+                g["name"] if isinstance(g, dict) else g for g in user.get("groups", [])
+            ]
+            principal = (
+                set(groups) | {name, EVERYONE, AUTHENTICATED},
+                bool(user.get("administrator")),
+            )
+        elif res.code() == 404:
+            res = self.client.list_group(name)
+            if not res.ok():
+                raise AuditError("{} isn't a user or a group".format(name))
+            principal = ({name, EVERYONE}, False)
+        else:
+            raise AuditError(res.msg())
+        self._principals[name] = principal
+        return principal
+
+    def add_node(self, path, cdmi_info):
+        """Record the ACL of a container or data object read elsewhere (as by
+        ``RadonClient.walk``), so that it isn't read again.
+
+        :arg path: Absolute path, containers end with a /
+        :arg cdmi_info: CDMI description with the objectType and the metadata
+
+        """
+        acl = cdmi_info.get("metadata", {}).get("cdmi_acl", [])
+        # ACEs already flagged as inherited are computed from the ancestors
+        own = [entry for entry in parse_acl(acl) if not entry[1] & ACEFLAG_INHERITED]
+        self._acls[path] = (cdmi_info.get("objectType") != CDMI_CONTAINER, own)
+
+    def node(self, path):
+        """Return (is_object, ACEs defined on the node) for a path"""
+        if path not in self._acls:
+            res = self.client.get_cdmi(path, ACL_FIELDS)
+            if not res.ok():
+                raise AuditError("{}: {}".format(path, res.msg()))
+            self.add_node(path, res.json())
+        return self._acls[path]
+
+    def propagated(self, path):
+        """Return the ACEs inherited by the children of a container"""
+        if path is None:
+            return []
+        if path not in self._propagated:
+            inherit = ACEFLAG_CONTAINER_INHERIT | ACEFLAG_OBJECT_INHERIT
+            _, own = self.node(path)
+            aces = [entry for entry in own if entry[1] & inherit]
+            for ace, aceflag, acemask in self.propagated(parent_container(path)):
+                if aceflag & ACEFLAG_NO_PROPAGATE:
+                    continue
+                if not aceflag & ACEFLAG_CONTAINER_INHERIT:
+                    # An OBJECT_INHERIT ACE is kept on the container as
+                    # inherit-only, it applies to the objects below it
+                    aceflag |= ACEFLAG_INHERIT_ONLY
+                aces.append((ace, aceflag, acemask))
+            self._propagated[path] = aces
+        return self._propagated[path]
+
+    def applicable_aces(self, path):
+        """Return the ACEs which apply to a container or a data object, in
+        evaluation order, as (ACE, aceflag, acemask) tuples"""
+        is_object, own = self.node(path)
+        aces = [entry for entry in own if not entry[1] & ACEFLAG_INHERIT_ONLY]
+        flag = ACEFLAG_OBJECT_INHERIT if is_object else ACEFLAG_CONTAINER_INHERIT
+        for entry in self.propagated(parent_container(path)):
+            if entry[1] & flag:
+                aces.append(entry)
+        return aces
+
+    def check(self, path, name):
+        """Return the effective acemask of a principal on a path.
+
+        :arg path: Absolute path, containers end with a /
+        :arg name: Name of a user or a group
+        :returns: (is_object, acemask)
+        :rtype: (bool, int)
+
+        """
+        identifiers, _ = self.principal(name)
+        is_object, _ = self.node(path)
+        return is_object, effective_acemask(self.applicable_aces(path), identifiers)
@@ -0,0 +1,208 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from cli.client import fast_normalize_path, normalize_path, normalize_path_cached
+from cli.mockserver import CDMI_CONTAINER, CDMI_OBJECT
+
+
+class BenchResult():
+    """The result of a benchmark"""
+
+    def __init__(self, name, value, unit, detail=""):
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.detail = detail
+
+    def __str__(self):
+        return "{:<14} {:>12.1f} {:<6} {}".format(
+            self.name, self.value, self.unit, self.detail
+        )
+
+
+def bench_put_small(client, mock, count, size):
+    """Rate of uploads of small data objects"""
+    client.mkdir("/bench-put-small/")
+    data = os.urandom(size)
+    start = time.monotonic()
+    for idx in range(count):
+        client.put("/bench-put-small/obj{}".format(idx), data)
+    elapsed = time.monotonic() - start
+    return [BenchResult(
+        "put-small", count / elapsed, "ops/s", "({} x {} bytes)".format(count, size)
+    )]
+
+
+def bench_get_small(client, mock, count, size):
+    """Rate of downloads of small data objects"""
+    fill_container(mock, "/bench-get-small/", count, size)
+    start = time.monotonic()
+    for idx in range(count):
+        client.open("/bench-get-small/obj{}".format(idx)).content
+    elapsed = time.monotonic() - start
+    return [BenchResult(
+        "get-small", count / elapsed, "ops/s", "({} x {} bytes)".format(count, size)
+    )]
+
+
+def bench_large(client, mock, count, size):
+    """Throughput of the upload and the download of a large data object"""
+    large = max(size, 64 * 1024 * 1024)
+    results = []
+    with tempfile.TemporaryFile() as fh:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(large // len(chunk)):
+            fh.write(chunk)
+        fh.seek(0)
+        start = time.monotonic()
+        client.put("/bench-large", fh)
+        elapsed = time.monotonic() - start
+    results.append(BenchResult(
+        "put-large", large / elapsed / 1024 ** 2, "MiB/s", "({} bytes)".format(large)
+    ))
+    start = time.monotonic()
+    res = client.open("/bench-large")
+    for _ in res.iter_content(1024 * 1024):
+        pass
+    elapsed = time.monotonic() - start
+    results.append(BenchResult(
+        "get-large", large / elapsed / 1024 ** 2, "MiB/s", "({} bytes)".format(large)
+    ))
+    return results
+
+
+def bench_ls(client, mock, count, size):
+    """Latency of the listing of a container for several container sizes"""
+    results = []
+    nb_children = 10
+    while nb_children <= max(count, 10) * 10:
+        path = "/bench-ls-{}/".format(nb_children)
+        fill_container(mock, path, nb_children, 0)
+        latencies = []
+        for _ in range(5):
+            start = time.monotonic()
+            client.ls(path)
+            latencies.append(time.monotonic() - start)
+        results.append(BenchResult(
+            "ls", statistics.median(latencies) * 1000, "ms",
+            "({} children)".format(nb_children)
+        ))
+        nb_children *= 10
+    return results
+
+
+def bench_meta(client, mock, count, size):
+    """Rate of metadata read-modify-write cycles, as done by radon meta"""
+    fill_container(mock, "/bench-meta/", 1, size)
+    path = "/bench-meta/obj0"
+    start = time.monotonic()
+    for idx in range(count):
+        metadata = client.get_cdmi(path).json()["metadata"]
+        metadata["bench"] = str(idx)
+        client.put(path, metadata=metadata)
+    elapsed = time.monotonic() - start
+    return [BenchResult(
+        "meta-rmw", count / elapsed, "ops/s", "({} cycles)".format(count)
+    )]
+
+
+def bench_normalize(client, mock, count, size):
+    """Rate of normalization of the paths of the requests, with the reference
+    implementation and with the fast path and the cache. The test suite
+    checks that both give the same URL paths."""
+    paths = []
+    for idx in range(count * 50):
+        # Paths built by the walk, and paths typed by the users
+        paths.append("/bench/dir{}/obj{}".format(idx % 100, idx))
+        paths.append("/bench/dir{}/".format(idx % 100))
+        paths.append("obj{}".format(idx % 500))
+        paths.append("../data {}/./é{}".format(idx % 50, idx % 500))
+    pwd = "/bench/dir0/"
+    results = []
+    for name, normalize in (
+        ("normalize-ref", normalize_path),
+        ("normalize", fast_normalize_path),
+    ):
+        normalize_path_cached.cache_clear()
+        start = time.monotonic()
+        for path in paths:
+            normalize(pwd, path)
+        elapsed = time.monotonic() - start
+        results.append(BenchResult(
+            name, len(paths) / elapsed, "ops/s", "({} paths)".format(len(paths))
+        ))
+    return results
+
+
+def bench_startup(client, mock, count, size):
+    """Time to start the command line interface"""
+    latencies = []
+    for _ in range(5):
+        start = time.monotonic()
+        subprocess.run(
+            [sys.executable, "-m", "cli.radon", "--version"],
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        latencies.append(time.monotonic() - start)
+    return [BenchResult("startup", statistics.median(latencies) * 1000, "ms")]
+
+
+BENCHMARKS = [
+    ("put-small", bench_put_small),
+    ("get-small", bench_get_small),
+    ("large", bench_large),
+    ("ls", bench_ls),
+    ("meta", bench_meta),
+    ("normalize", bench_normalize),
+    ("startup", bench_startup),
+]
+
+
+def fill_container(mock, path, nb_objects, size):
+    """Create a container with ``nb_objects`` data objects directly in the
+    mock archive, so that the setup isn't measured"""
+    value = os.urandom(size)
+    with mock.lock:
+        mock.nodes[path] = mock.new_node(CDMI_CONTAINER)
+        for idx in range(nb_objects):
+            mock.nodes["{}obj{}".format(path, idx)] = mock.new_node(CDMI_OBJECT, value)
+
+
+def run_benchmarks(client, mock, names=None, count=200, size=4096):
+    """Run the benchmarks and yield their results.
+
+    :arg client: A client connected to the mock server
+    :type client: cli.client.RadonClient
+    :arg mock: The mock server
+    :type mock: cli.mockserver.MockRadonServer
+    :arg names: Names of the benchmarks to run, all of them by default
+    :arg count: Number of operations for the rate benchmarks
+    :arg size: Size of the small data objects
+
+    """
+    for name, bench in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for result in bench(client, mock, count, size):
+            yield result
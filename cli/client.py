@@ -15,37 +15,88 @@ limitations under the License.
 """
 
 
-import json
+import errno
+import itertools
 import mimetypes
 import os
+import posixpath
+import re
+import threading
+import time
+import weakref
 from base64 import b64encode
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from urllib.parse import unquote
 from urllib.request import pathname2url, url2pathname
 
 import requests
 
 import cli
-
+from cli.compression import (
+    ENCODING_METADATA,
+    CompressionError,
+    compress_stream,
+    decompress_stream,
+    sniff_codec,
+)
+from cli.jsonbackend import dumps, iter_array, loads
+from cli.throttle import Throttle
+from cli.transport import ZeroCopyAdapter
+
+CDMI_CAPABILITY = "application/cdmi-capability"
 CDMI_CONTAINER = "application/cdmi-container"
 CDMI_OBJECT = "application/cdmi-object"
+# Size of the chunks streamed when a data object is copied through the client
+COPY_CHUNK_SIZE = 1024 * 1024
+# Number of paths whose normalization is memoized
+NORMALIZE_CACHE_SIZE = 16384
+# Absolute paths which are already normalized and don't need to be quoted in
+# a URL (no empty, "." or ".." segment, only unreserved characters), as the
+# paths built by the walk
+NORMALIZED_PATH = re.compile(r"(?:/(?!\.\.?(?:/|\Z))[A-Za-z0-9_.~-]+)*/?\Z")
+# Number of work items of a bulk method read ahead of the requests in flight,
+# per request
+READ_AHEAD = 4
+# Requests with a larger body don't measure the latency of the archive for
+# the throttle, their time to first byte includes the upload
+LATENCY_MAX_BODY = 1024 * 1024
 
 
 class Response():
     """A Response object returned by the client. It contains an error code and
     a JSON response. 0 or means the code executed correctly.
+
+    The body of an HTTP response is only decoded when it's read with
+    ``json`` or ``msg``, the responses of bulk operations are often never
+    read.
     """
 
+    __slots__ = ("_code", "_json", "_body")
+
     def __init__(self, code, msg):
         self._code = code
+        # The body of an HTTP response, until it's decoded in _json
+        self._body = None
         if isinstance(msg, dict):
             self._json = msg
         elif isinstance(msg, requests.Response):
-            try:
-                self._json = msg.json()
-            except ValueError:
-                self._json = {"msg": msg.content}
+            # The requests.Response (and its connection) isn't kept
+            self._json = None
+            self._body = msg.content
         else:
             self._json = {"msg": msg}
 
+    def _decode(self):
+        """Decode the body of the HTTP response, once"""
+        if self._body is not None:
+            try:
+                self._json = loads(self._body)
+            except ValueError:
+                self._json = {"msg": self._body}
+            self._body = None
+        return self._json
+
     def ok(self):
         """Check if the response is valid or not. Some HTTP error codes like
         201 or 206 can be mapped to 0 to validate a response"""
@@ -61,24 +112,44 @@ class Response():
         "msg" is used when we want to store string in the Response
         "detail" comes from Django errors (mainly 401/403)
         otherwise it's a full json response (CDMI for instance)"""
-        if "msg" in self._json:
-            return self._json["msg"]
-        elif "detail" in self._json:
-            return self._json["detail"]
+        msg = self._decode()
+        if "msg" in msg:
+            return msg["msg"]
+        elif "detail" in msg:
+            return msg["detail"]
         else:
-            return self._json
+            return msg
 
     def json(self):
         """Return a full json message if we are sure we stored a json dict"""
-        return self._json
+        return self._decode()
+
+    def release(self):
+        """Drop the body of the response to save memory, only the code is
+        kept (``json`` returns an empty dict).
+
+        :returns: The response
+        :rtype: Response
+
+        """
+        self._body = None
+        self._json = {}
+        return self
 
     def __str__(self):
-        return "({}, {})".format(self._code, self._json)
+        return "({}, {})".format(self._code, self._decode())
 
 
 class RadonClient():
     """A client to an Radon archive. Communicate with the archive through HTTP
-    REST Api (CDMI for the archive and a simple one for admin operations)"""
+    REST Api (CDMI for the archive and a simple one for admin operations)
+
+    A client can be shared by several threads once it's configured (logged
+    in, throttle and compression set): each thread sends its requests with
+    its own ``requests.Session``, the connection pool is shared. The working
+    container is the only state changed by the commands, tasks which need
+    their own working container use a ``handle`` of the client.
+    """
 
     def __init__(self, url):
         """Create a new instance of ``CDMIClient``.
@@ -93,6 +164,175 @@ class RadonClient():
         self._pwd = "/"
         self.auth = None
         self.u_agent = "Radon Client {0}".format(cli.__version__)
+        self.throttle = Throttle()
+        # Codec used to compress the uploads, None to upload them as is
+        self.compression = None
+        self._capabilities = None
+        self._mount_adapter()
+        # A cli.trace.Tracer which records the requests, if any
+        self.tracer = None
+        # A cli.index.NamespaceIndex kept up to date by the changes, if any
+        self.index = None
+
+    def __getstate__(self):
+        # The connection pool can't be saved with the session, the tracer
+        # and the capabilities of the server only live for one process
+        state = self.__dict__.copy()
+        state.pop("session", None)
+        state.pop("_adapter", None)
+        state.pop("_local", None)
+        state.pop("tracer", None)
+        state.pop("index", None)
+        state.pop("_capabilities", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "throttle" not in state:
+            # Session saved by a previous version of the client
+            self.throttle = Throttle()
+        if "compression" not in state:
+            self.compression = None
+        # Saved by a previous version of the client
+        self.__dict__.pop("session", None)
+        self.tracer = None
+        self.index = None
+        self._capabilities = None
+        self._mount_adapter()
+
+    def _mount_adapter(self):
+        """Use the zero-copy transport, with a connection pool sized for the
+        number of requests in flight. The sessions of the threads are created
+        again, with the new transport."""
+        self._adapter = ZeroCopyAdapter(
+            pool_maxsize=max(requests.adapters.DEFAULT_POOLSIZE, self.throttle.max_jobs)
+        )
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """The ``requests.Session`` of the current thread, a Session isn't
+        thread-safe but its transport (and its connection pool) is shared by
+        the sessions of all the threads"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def _request(self, method, url, **kwargs):
+        """Send an HTTP request to the archive, within the limits of the
+        throttle.
+
+        :arg method: HTTP method
+        :arg url: Full URL of the request
+        :arg kwargs: Extra parameters for ``requests.Session.request``, and
+          ``held_slot``, the slot held by the streamed body the request is
+          sent for
+        :returns: The response of the archive, a streamed response holds its
+          slot in ``held_slot`` until its body is read
+        :rtype: requests.Response
+
+        """
+        held_slot = kwargs.pop("held_slot", None)
+        kwargs.setdefault("auth", self.auth)
+        kwargs.setdefault("verify", False)
+        bytes_out = body_size(kwargs.get("data"))
+        slot = self.throttle.acquire(bytes_out, held_slot)
+        wall_start = time.time()
+        start = time.monotonic()
+        res = None
+        try:
+            res = self.session.request(method, url, **kwargs)
+        finally:
+            total = time.monotonic() - start
+            status = res.status_code if res is not None else None
+            ttfb = res.elapsed.total_seconds() if res is not None else total
+            latency = ttfb if bytes_out <= LATENCY_MAX_BODY else None
+            if kwargs.get("stream") and res is not None:
+                # The slot is held while the body is read
+                res.held_slot = self.throttle.begin_stream(status, latency, slot)
+                release_with_body(res, res.held_slot.release)
+            else:
+                self.throttle.release(status, latency, slot)
+            if self.tracer:
+                self.tracer.record(
+                    {
+                        "start": wall_start,
+                        "method": method,
+                        "path": self.path_template(url),
+                        "url": url,
+                        "status": status,
+                        "bytes_out": bytes_out,
+                        "bytes_in": response_size(res, kwargs.get("stream")),
+                        "ttfb": ttfb,
+                        "total": total,
+                        "retries": response_retries(res),
+                    }
+                )
+        self.throttle.consume(int(res.headers.get("Content-Length", 0) or 0))
+        return res
+
+    def _run_many(self, tasks, jobs, keep_body=True):
+        """Run the tasks of a bulk method with ``jobs`` requests in parallel.
+
+        The tasks are read as the previous ones complete, so that an iterable
+        of millions of work items isn't held in memory. The pending tasks are
+        cancelled when the generator is closed.
+
+        :arg tasks: An iterable of (key, function, arguments), the function
+          returns a Response
+        :arg jobs: Number of requests in parallel
+        :arg keep_body: Keep the body of the successful responses, otherwise
+          they are released (the errors keep their message)
+        :returns: A generator of (key, Response), in completion order
+
+        """
+        executor = ThreadPoolExecutor(jobs)
+        pending = {}
+
+        def results(done):
+            for future in done:
+                res = future.result()
+                if not keep_body and res.ok():
+                    res.release()
+                yield pending.pop(future), res
+
+        try:
+            for key, fn, args in tasks:
+                if len(pending) >= jobs * READ_AHEAD:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from results(done)
+                pending[executor.submit(run_task, fn, *args)] = key
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from results(done)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _update_index(self, path, removed=False):
+        """Keep the index of the namespace up to date after a change, the
+        path is marked as stale (or removed) in the index"""
+        if self.index is None:
+            return
+        path = unquote(fast_normalize_path(self.pwd(), path))
+        if removed:
+            self.index.remove(path)
+        else:
+            self.index.touch(path)
+
+    def configure_throttle(self, max_rate=0, max_bandwidth=0, max_jobs=0):
+        """Set the client-side limits for the requests sent to the archive.
+
+        :arg max_rate: Maximum number of requests per second (0 for no limit)
+        :arg max_bandwidth: Maximum number of bytes per second (0 for no limit)
+        :arg max_jobs: Maximum number of requests in flight (0 for no limit)
+
+        """
+        self.throttle = Throttle(max_rate, max_bandwidth, max_jobs)
+        self._mount_adapter()
 
     def authenticate(self, username, password):
         """Authenticate the client with ``username`` and ``password``.
@@ -109,11 +349,11 @@ class RadonClient():
 
         """
         auth = (username, password)
-        res = requests.get(
+        res = self._request(
+            "GET",
             self.normalize_admin_url("authenticate"),
             headers={"user-agent": self.u_agent},
             auth=auth,
-            verify=False,
         )
         if res.status_code == 200:
             # authentication ok, keep authentication info for future use
@@ -121,7 +361,7 @@ class RadonClient():
             return Response(0, "Successfully logged in")
         elif res.status_code == 401:
             try:
-                val = res.json()
+                val = loads(res.content)
             except ValueError:
                 val = "Login credentials not accepted"
             return Response(401, val)
@@ -167,13 +407,7 @@ class RadonClient():
         data = {"groupname": groupname, "add_users": ls_user}
         headers = {"user-agent": self.u_agent}
         req_url = self.normalize_admin_url(u"groups/{}".format(groupname))
-        res = requests.put(
-            req_url,
-            headers=headers,
-            auth=self.auth,
-            data=json.dumps(data),
-            verify=False,
-        )
+        res = self._request("PUT", req_url, headers=headers, data=dumps(data))
         if res.status_code in [200, 201, 206]:
             return Response(0, res)
         else:
@@ -190,13 +424,7 @@ class RadonClient():
         data = {"groupname": groupname}
         headers = {"user-agent": self.u_agent}
         req_url = self.normalize_admin_url("groups")
-        res = requests.post(
-            req_url,
-            headers=headers,
-            auth=self.auth,
-            data=json.dumps(data),
-            verify=False,
-        )
+        res = self._request("POST", req_url, headers=headers, data=dumps(data))
         if res.status_code == 201:
             return Response(0, u"Group {} has been created".format(groupname))
         else:
@@ -221,18 +449,156 @@ class RadonClient():
         }
         headers = {"user-agent": self.u_agent}
         req_url = self.normalize_admin_url("users")
-        res = requests.post(
-            req_url,
-            headers=headers,
-            auth=self.auth,
-            data=json.dumps(data),
-            verify=False,
-        )
+        res = self._request("POST", req_url, headers=headers, data=dumps(data))
         if res.status_code == 201:
             return Response(0, u"User {} has been created".format(username))
         else:
             return Response(res.status_code, res)
 
+    def capabilities(self):
+        """Return the capabilities of the server and of its containers
+        ("cdmi_copy_dataobject", "cdmi_move_container", ...). They are read
+        once per client, an empty dict is returned if the server doesn't
+        publish them.
+
+        :returns: The capabilities, their values are strings ("true")
+        :rtype: dict
+
+        """
+        if self._capabilities is None:
+            capabilities = {}
+            headers = {
+                "user-agent": self.u_agent,
+                "Accept": CDMI_CAPABILITY,
+                "X-CDMI-Specification-Version": "1.1",
+            }
+            for path in ("/cdmi_capabilities/", "/cdmi_capabilities/container/"):
+                res = self._request("GET", self.cdmi_url + path, headers=headers)
+                if res.status_code != 200:
+                    continue
+                try:
+                    capabilities.update(loads(res.content).get("capabilities", {}))
+                except (ValueError, AttributeError):
+                    continue
+            self._capabilities = capabilities
+        return self._capabilities
+
+    def copy(self, src, dest, move=False):
+        """Copy or move a container or a data object on the server, with the
+        CDMI copy and move fields, the data doesn't go through the client.
+
+        :arg src: path of the source (containers end with a /)
+        :arg dest: path of the copy (containers end with a /)
+        :arg move: Move the source instead of copying it
+        :returns: CDMI JSON response
+        :rtype: Response
+
+        """
+        # The source is given by its path in the namespace, without the
+        # prefix of the CDMI API
+        src_path = unquote(fast_normalize_path(self.pwd(), src))
+        data = dumps({"move" if move else "copy": src_path})
+        res = self.put_cdmi(dest, data)
+        if res.ok() and move:
+            self._update_index(src, removed=True)
+        return res
+
+    def copy_object(self, src, dest, metadata=None):
+        """Copy a data object through the client, the value is streamed from
+        the source to the copy. It's used when the server can't copy.
+
+        :arg src: path of the data object to copy
+        :arg dest: path of the copy
+        :arg metadata: metadata of the copy
+        :returns: The response of the last request
+        :rtype: Response
+
+        """
+        res = self.open(src)
+        if res.status_code != 200:
+            return Response(res.status_code, res)
+        mimetype = res.headers.get("Content-Type", "application/octet-stream")
+        try:
+            put = self.put_http(dest, res.iter_content(COPY_CHUNK_SIZE), mimetype)
+        finally:
+            res.close()
+        if not put.ok() or not metadata:
+            return put
+        return self.put_cdmi(dest, dumps({"metadata": metadata}))
+
+    def copy_tree(self, src, dest, jobs=8):
+        """Copy a container and its descendants through the client, with
+        ``jobs`` requests in parallel. It's used when the server can't copy.
+
+        The containers are created as they are read, the data objects are
+        copied with ``copy_object``. The user metadata are copied, the cdmi_
+        metadata (as the ACL) are managed by the server.
+
+        :arg src: path of the container (ending with a /) or data object
+        :arg dest: path of the copy (ending with a / for a container)
+        :arg jobs: Number of requests in parallel
+        :returns: A generator of (source path, Response), in completion order
+
+        """
+        # The walk yields absolute paths, the targets are built from them
+        src = unquote(fast_normalize_path(self.pwd(), src))
+
+        def done(res):
+            """The task of a request already sent"""
+            return res
+
+        def tasks():
+            for path, res in self.walk(src, ["objectType", "metadata"], jobs):
+                if not res.ok():
+                    yield path, done, (res,)
+                    continue
+                target = dest + path[len(src):]
+                info = res.json()
+                metadata = {
+                    k: v
+                    for k, v in info.get("metadata", {}).items()
+                    if not k.startswith("cdmi_")
+                }
+                if info.get("objectType") == CDMI_CONTAINER:
+                    # Created before its children are read by the walk
+                    target = target if target.endswith("/") else target + "/"
+                    data = dumps({"metadata": metadata})
+                    yield path, done, (run_task(self.put_cdmi, target, data),)
+                    continue
+                yield path, self.copy_object, (path, target, metadata)
+
+        return self._run_many(tasks(), jobs)
+
+    def decoded_content(self, path, res, chunk_size=COPY_CHUNK_SIZE):
+        """Return the content of a data object opened with ``open``, the
+        objects uploaded compressed by the client are decompressed in a
+        background thread.
+
+        The metadata are only read when the content starts with the magic
+        number of a codec, to check it was compressed by the client and not
+        uploaded as a compressed file.
+
+        :arg path: path of the data object
+        :arg res: response returned by ``open``
+        :arg chunk_size: Size of the chunks read from the response
+        :returns: A generator of bytes
+
+        """
+        chunks = res.iter_content(chunk_size)
+        first = next(chunks, b"")
+        chunks = itertools.chain([first], chunks)
+        codec = sniff_codec(first)
+        if codec:
+            info = self.get_cdmi(
+                path,
+                ["metadata:" + ENCODING_METADATA],
+                held_slot=getattr(res, "held_slot", None),
+            )
+            metadata = info.json().get("metadata", {}) if info.ok() else {}
+            if metadata.get(ENCODING_METADATA) == codec:
+                return decompress_stream(chunks, codec)
+        return chunks
+
     def delete(self, path):
         """Delete a container or a data object.
 
@@ -246,8 +612,9 @@ class RadonClient():
 
         """
         req_url = self.normalize_cdmi_url(path)
-        res = requests.delete(req_url, auth=self.auth, verify=False)
+        res = self._request("DELETE", req_url)
         if res.status_code == 204:
+            self._update_index(path, removed=True)
             return Response(0, "ok")
         else:
             return Response(res.status_code, res)
@@ -262,17 +629,17 @@ class RadonClient():
         """
         req_url = self.normalize_admin_url(path)
         headers = {"user-agent": self.u_agent}
-        res = requests.get(req_url, headers=headers, auth=self.auth, verify=False)
+        res = self._request("GET", req_url, headers=headers)
         if res.status_code in [400, 401, 403, 404, 406]:
             return Response(res.status_code, res)
         try:
-            return Response(0, res.json())
+            return Response(0, loads(res.content))
         except ValueError:
             # The API does not appear to return valid JSON
             # It is probably not a CDMI API - this will be a problem!
             return Response(500, "Invalid response format")
 
-    def get_cdmi(self, path):
+    def get_cdmi(self, path, fields=None, held_slot=None):
         """Return CDMI response a container or data object.
 
         Read the container or data object at ``path`` return the
@@ -280,22 +647,22 @@ class RadonClient():
         current working container.
 
         :arg path: path to read CDMI
+        :arg fields: CDMI fields to read ("children", "metadata:cdmi_acl",
+          ...), all of them by default
+        :arg held_slot: The slot held by a streamed body the description is
+          read for (see ``_request``)
         :returns: (status code, json)
         :rtype: (int, str)
 
         """
-        req_url = self.normalize_cdmi_url(path)
+        req_url = self.normalize_cdmi_url(path) + cdmi_query(fields)
         headers = {"user-agent": self.u_agent, "X-CDMI-Specification-Version": "1.1"}
         if path.endswith("/"):
             headers["Accept"] = CDMI_CONTAINER
         else:
             headers["Accept"] = CDMI_OBJECT
-        res = requests.get(
-            req_url,
-            headers=headers,
-            auth=self.auth,
-            allow_redirects=False,
-            verify=False,
+        res = self._request(
+            "GET", req_url, headers=headers, allow_redirects=False, held_slot=held_slot
         )
         if res.status_code in [400, 401, 403]:
             return Response(res.status_code, res.content)
@@ -307,18 +674,148 @@ class RadonClient():
                 return Response(res.status_code, msg)
             else:
                 # Resource doesn't exist, we check if that's a container
-                return self.get_cdmi(path + "/")
+                return self.get_cdmi(path + "/", fields, held_slot)
         elif res.status_code == 502:
             return Response(res.status_code, "Unable to connect")
         elif res.status_code == 302:
-            return Response(0, res.json())
+            return Response(0, loads(res.content))
         try:
-            return Response(0, res.json())
+            return Response(0, loads(res.content))
         except ValueError:
             # The API does not appear to return valid JSON
             # It is probably not a CDMI API - this will be a problem!
             return Response(500, "Invalid response format")
 
+    def get_cdmi_if_changed(self, path, fields=None, etag=None):
+        """Read the CDMI description of a container or a data object if it
+        changed since it was read with the ETag ``etag`` (a conditional
+        request), as ``get_cdmi``.
+
+        :arg path: path to read (containers end with a /)
+        :arg fields: CDMI fields to read, all of them by default
+        :arg etag: The ETag of the previous read, None to read it anyway
+        :returns: The Response (its code is 304 if it didn't change) and the
+          new ETag (None if the server doesn't send them)
+        :rtype: (Response, str)
+
+        """
+        req_url = self.normalize_cdmi_url(path) + cdmi_query(fields)
+        headers = {"user-agent": self.u_agent, "X-CDMI-Specification-Version": "1.1"}
+        headers["Accept"] = CDMI_CONTAINER if path.endswith("/") else CDMI_OBJECT
+        if etag:
+            headers["If-None-Match"] = etag
+        res = self._request("GET", req_url, headers=headers, allow_redirects=False)
+        new_etag = res.headers.get("ETag")
+        if res.status_code == 304:
+            return Response(304, "Not modified"), new_etag or etag
+        if res.status_code != 200:
+            return Response(res.status_code, res), None
+        try:
+            return Response(0, loads(res.content)), new_etag
+        except ValueError:
+            return Response(500, "Invalid response format"), None
+
+    def get_file(self, path, dest):
+        """Download a data object to a local file, the objects uploaded
+        compressed by the client are decompressed.
+
+        :arg path: path of the data object
+        :arg dest: path of the local file, or a writable binary file-like
+          object
+        :returns: A Response with the path of the data object and the number
+          of bytes written ({"path": path, "size": size})
+        :rtype: Response
+
+        """
+        res = self.open(path)
+        if res.status_code != 200:
+            return Response(res.status_code, res)
+        size = 0
+        try:
+            if hasattr(dest, "write"):
+                for chunk in self.decoded_content(path, res):
+                    dest.write(chunk)
+                    size += len(chunk)
+            else:
+                with open(dest, "wb") as fh:
+                    for chunk in self.decoded_content(path, res):
+                        fh.write(chunk)
+                        size += len(chunk)
+        finally:
+            res.close()
+        return Response(0, {"path": path, "size": size})
+
+    def get_many(self, items, jobs=8):
+        """Download data objects to local files, with ``jobs`` requests in
+        parallel. See ``get_file``.
+
+        The downloads are cancelled if the generator is closed before its
+        end. A failed download doesn't stop the others, its Response holds
+        the error (a partial local file may be left).
+
+        :arg items: An iterable of (path of the data object, local path or
+          writable binary file-like object)
+        :arg jobs: Number of requests in parallel
+        :returns: A generator of (path, Response), in completion order
+
+        """
+        tasks = ((path, self.get_file, (path, dest)) for path, dest in items)
+        return self._run_many(tasks, jobs)
+
+    def handle(self, pwd=None):
+        """Return a client for a task, which shares the connection pool, the
+        credentials, the throttle and the tracer of this client but has its
+        own working container. Creating a handle doesn't send any request.
+
+        :arg pwd: The working container of the handle, relative to the
+          working container of this client (by default)
+        :returns: A new client
+        :rtype: RadonClient
+
+        """
+        handle = self.__class__.__new__(self.__class__)
+        handle.__dict__.update(self.__dict__)
+        if pwd:
+            pwd = posixpath.normpath(posixpath.join(self._pwd, pwd))
+            handle._pwd = pwd if pwd.endswith("/") else pwd + "/"
+        return handle
+
+    def iter_children(self, path):
+        """List a container with its children parsed as they are received, so
+        that a container with millions of children isn't held in memory.
+
+        The names are yielded in the order of the archive. The generator
+        keeps the connection until it's exhausted or closed.
+
+        :arg path: Path of the container
+        :returns: A Response, its json() is {"children": generator of names}
+        :rtype: Response
+
+        """
+        if not path:
+            path = self.pwd()
+        elif not path.endswith("/"):
+            path = "{}/".format(path)
+        req_url = self.normalize_cdmi_url(path) + cdmi_query(["children"])
+        headers = {
+            "user-agent": self.u_agent,
+            "X-CDMI-Specification-Version": "1.1",
+            "Accept": CDMI_CONTAINER,
+        }
+        res = self._request("GET", req_url, headers=headers, stream=True)
+        if res.status_code != 200:
+            return Response(res.status_code, res)
+
+        def children():
+            try:
+                yield from iter_array(
+                    res.iter_content(COPY_CHUNK_SIZE), "children"
+                )
+            finally:
+                res.close()
+
+        return Response(0, {"children": children()})
+
     def list_group(self, groupname):
         """Get information about a group.
 
@@ -443,13 +940,7 @@ class RadonClient():
         """
         headers = {"user-agent": self.u_agent}
         req_url = self.normalize_admin_url(u"users/{}".format(username))
-        res = requests.put(
-            req_url,
-            headers=headers,
-            auth=self.auth,
-            data=json.dumps(data),
-            verify=False,
-        )
+        res = self._request("PUT", req_url, headers=headers, data=dumps(data))
         if res.status_code == 200:
             return Response(0, u"User {} has been modified".format(username))
         else:
@@ -476,41 +967,72 @@ class RadonClient():
         :returns: absolute CDMI URL
 
         """
-        # Turn URL path into OS path for manipulation
-        mypath = url2pathname(path)
-        if not os.path.isabs(mypath):
-            mypath = os.path.join(url2pathname(self.pwd()), mypath)
-        # normalize path
-        mypath = os.path.normpath(mypath)
-        if path.endswith("/") and not mypath.endswith("/"):
-            mypath += "/"
-        url = self.cdmi_url + pathname2url(mypath)
-        return url
+        return self.cdmi_url + fast_normalize_path(self.pwd(), path)
 
-    def put_cdmi(self, path, data):
+    def put_cdmi(self, path, data, fields=None):
         """Return JSON response for a PUT to a CDMI URL.
 
         :arg path: path to put
         :arg data: JSON data to put
+        :arg fields: CDMI fields to update ("metadata:cdmi_acl", ...), all the
+          fields of ``data`` by default
         :returns: CDMI JSON response or text response
         :rtype: dict
 
         """
-        req_url = self.normalize_cdmi_url(path)
+        req_url = self.normalize_cdmi_url(path) + cdmi_query(fields)
         headers = {"user-agent": self.u_agent, "X-CDMI-Specification-Version": "1.1"}
         if path.endswith("/"):
             headers["Content-type"] = CDMI_CONTAINER
         else:
             headers["Content-type"] = CDMI_OBJECT
-        res = requests.put(
-            req_url, headers=headers, auth=self.auth, data=data, verify=False
-        )
+        res = self._request("PUT", req_url, headers=headers, data=data)
         if res.status_code in [400, 401, 403, 404, 406]:
             return Response(res.status_code, res)
         elif res.status_code == 409:
             return Response(res.status_code, "A resource with this name already exists")
+        self._update_index(path)
         return Response(0, res)
 
+    def put_reference(self, path, url, mimetype=None, metadata=None):
+        """Create a reference object which points to an external URL.
+
+        :arg path: path of the reference to create
+        :arg url: URL of the data
+        :arg mimetype: mimetype of the data
+        :arg metadata: metadata for the reference
+        :returns: CDMI JSON response, the code is 409 if an object already
+          exists at ``path``
+        :rtype: Response
+
+        """
+        data = {"reference": url}
+        if mimetype:
+            data["mimetype"] = mimetype
+        if metadata:
+            data["metadata"] = metadata
+        return self.put_cdmi(path, dumps(data))
+
+    def put_many(self, items, jobs=8, keep_body=True):
+        """Create or update data objects, with ``jobs`` requests in parallel.
+        See ``put``.
+
+        The uploads are cancelled if the generator is closed before its end.
+        A failed upload doesn't stop the others, its Response holds the
+        error.
+
+        :arg items: An iterable of (path, data) or (path, data, mimetype,
+          metadata) tuples, as the arguments of ``put``. File-like data are
+          read by the upload, they aren't closed
+        :arg jobs: Number of requests in parallel
+        :arg keep_body: Keep the CDMI description returned by the successful
+          uploads, it can be released when only the status matters
+        :returns: A generator of (path, Response), in completion order
+
+        """
+        tasks = ((item[0], self.put, item) for item in items)
+        return self._run_many(tasks, jobs, keep_body)
+
     def put_http(self, path, data, content_type):
         """Return JSON response for a PUT to a CDMI URL.
 
@@ -523,13 +1045,45 @@ class RadonClient():
         """
         req_url = self.normalize_cdmi_url(path)
         headers = {"user-agent": self.u_agent, "Content-type": content_type}
-        res = requests.put(
-            req_url, headers=headers, auth=self.auth, data=data, verify=False
-        )
+        res = self._request("PUT", req_url, headers=headers, data=data)
         if res.status_code in [400, 401, 403, 404, 406]:
             return Response(res.status_code, res)
+        self._update_index(path)
         return Response(0, res)
 
+    def path_template(self, url):
+        """Return the template of an archive URL, used to group the requests
+        of the same operation.
+
+        :arg url: Full URL of a request
+        :returns: Path template ("/api/cdmi/{object}", "/api/admin/users/{name}")
+        :rtype: str
+
+        """
+        if url.startswith(self.cdmi_url):
+            if url.endswith("/"):
+                return "/api/cdmi/{container}/"
+            return "/api/cdmi/{object}"
+        if url.startswith(self.admin_url):
+            parts = url[len(self.admin_url):].strip("/").split("/")
+            if len(parts) > 1:
+                return "/api/admin/{}/{{name}}".format(parts[0])
+            return "/api/admin/{}".format(parts[0])
+        return url
+
+    def set_acl(self, path, acl):
+        """Replace the ACL of a container or a data object, the other metadata
+        fields are kept.
+
+        :arg path: path of the container (ending with a /) or the data object
+        :arg acl: list of ACE (dict)
+        :returns: CDMI JSON response
+        :rtype: Response
+
+        """
+        data = dumps({"metadata": {"cdmi_acl": acl}})
+        return self.put_cdmi(path, data, ["metadata:cdmi_acl"])
+
     def pwd(self):
         """Get and return path of current container.
 
@@ -549,7 +1103,7 @@ class RadonClient():
         """
         headers = {"user-agent": self.u_agent}
         req_url = self.normalize_admin_url(u"groups/{}".format(groupname))
-        res = requests.delete(req_url, headers=headers, auth=self.auth, verify=False)
+        res = self._request("DELETE", req_url, headers=headers)
         if res.status_code == 200:
             return Response(0, u"Group {} has been removed".format(groupname))
         else:
@@ -565,7 +1119,7 @@ class RadonClient():
         """
         headers = {"user-agent": self.u_agent}
         req_url = self.normalize_admin_url(u"users/{}".format(username))
-        res = requests.delete(req_url, headers=headers, auth=self.auth, verify=False)
+        res = self._request("DELETE", req_url, headers=headers)
         if res.status_code == 200:
             return Response(0, u"User {} has been removed".format(username))
         else:
@@ -583,18 +1137,66 @@ class RadonClient():
         data = {"groupname": groupname, "rm_users": ls_user}
         headers = {"user-agent": self.u_agent}
         req_url = self.normalize_admin_url(u"groups/{}".format(groupname))
-        res = requests.put(
-            req_url,
-            headers=headers,
-            auth=self.auth,
-            data=json.dumps(data),
-            verify=False,
-        )
+        res = self._request("PUT", req_url, headers=headers, data=dumps(data))
         if res.status_code in [200, 206]:
             return Response(0, res)
         else:
             return Response(res.status_code, res)
 
+    def stat_many(self, paths, fields=None, jobs=8):
+        """Read the CDMI description of containers or data objects, with
+        ``jobs`` requests in parallel. See ``get_cdmi``.
+
+        :arg paths: An iterable of paths (containers end with a /)
+        :arg fields: CDMI fields to read, all of them by default
+        :arg jobs: Number of requests in parallel
+        :returns: A generator of (path, Response), in completion order
+
+        """
+        tasks = ((path, self.get_cdmi, (path, fields)) for path in paths)
+        return self._run_many(tasks, jobs)
+
+    def walk(self, path, fields=None, jobs=8):
+        """Read a container and all its descendants, with ``jobs`` requests
+        in parallel.
+
+        Yield a (path, Response) tuple for each container or data object as
+        soon as it's read, so the order isn't deterministic. Containers paths
+        end with a /.
+
+        :arg path: path of the container (or data object) to walk
+        :arg fields: CDMI fields to read, "objectType" and "children" are
+          added to walk the tree
+        :arg jobs: Number of requests in parallel
+
+        """
+        if fields:
+            fields = list(fields) + [
+                f for f in ("objectType", "children") if f not in fields
+            ]
+        if not path.startswith("/"):
+            path = self.pwd() + path
+        executor = ThreadPoolExecutor(jobs)
+        pending = {executor.submit(self.get_cdmi, path, fields): path}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = pending.pop(future)
+                    res = future.result()
+                    if not res.ok() or res.json().get("objectType") != CDMI_CONTAINER:
+                        yield node, res
+                        continue
+                    if not node.endswith("/"):
+                        node += "/"
+                    yield node, res
+                    for child in res.json().get("children", []):
+                        child_path = node + child
+                        child = executor.submit(self.get_cdmi, child_path, fields)
+                        pending[child] = child_path
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def whoami(self):
         """Return the authenticated user.
 
@@ -607,7 +1209,7 @@ class RadonClient():
         else:
             return "Anonymous"
 
-    def open(self, path):
+    def open(self, path, start=None, end=None):
         """Open a URL in stream mode to avoid loading the whole content in
         memory.
 
@@ -616,15 +1218,19 @@ class RadonClient():
         for chunk in res.iter_content(8192):
             # do domething with chunk
 
+        :arg start: First byte to read, to read a range of the content
+        :arg end: Last byte (included) of the range, the end of the content by
+          default
+
         """
         req_url = self.normalize_cdmi_url(path)
         headers = {
             "user-agent": "Radon Client {0}".format(cli.__version__),
             "Accept": "application/octet-stream",
         }
-        return requests.get(
-            req_url, headers=headers, auth=self.auth, stream=True, verify=False
-        )
+        if start is not None:
+            headers["Range"] = "bytes={}-{}".format(start, "" if end is None else end)
+        return self._request("GET", req_url, headers=headers, stream=True)
 
     def put(self, path, data="", mimetype=None, metadata={}):
         """Create or update a data object.
@@ -643,7 +1249,8 @@ class RadonClient():
         :arg data: content for data object
         :type data: dict (of CDMI JSON) byte string or file-like object
         :arg mimetype: mimetype of data object to create.
-        :arg metadata: metadata for object
+        :arg metadata: metadata for object, only these fields are updated
+          when there's no ``data`` (the content is kept)
         :returns: CDMI JSON response
         :rtype: dict
 
@@ -666,21 +1273,33 @@ class RadonClient():
                     mimetype = type_
         # Deal with varying data type
         if isinstance(data, dict):
-            data = json.dumps(data)
-
+            data = dumps(data)
+        if self.compression and (data or hasattr(data, "read")):
+            # A metadata only update mustn't replace the content
+            return self.put_compressed(path, data, mimetype, metadata)
+
+        if metadata and not data:
+            # Update the given metadata fields only, the content and the
+            # other fields (as the content encoding) are kept
+            fields = ["metadata:" + name for name in metadata]
+            return self.put_cdmi(path, dumps({"metadata": metadata}), fields)
         if metadata:
             # PUT the data as a CDMI object
             # Create the CDMI Data Object Structure
             d = {"metadata": metadata}
+            if hasattr(data, "read"):
+                data = data.read()
+            if isinstance(data, str):
+                data = data.encode("utf-8")
             if data:
                 d.update(
                     {
-                        "value": b64encode(data),
+                        "value": b64encode(data).decode("ascii"),
                         "valuetransferencoding": "base64",
                         "mimetype": mimetype,
                     }
                 )
-            data = json.dumps(d)
+            data = dumps(d)
             # Add the metadata parameters into the URL
             #             p = ''.join(["metadata:{0};".format(k)
             #                          for k
@@ -692,4 +1311,214 @@ class RadonClient():
             # req_url = self.normalize_cdmi_url(path)
             self.put_http(path, data, mimetype)
             # return self.get_cdmi(os.path.split(path)[0])
-            return self.get_cdmi(path)
+            res = self.get_cdmi(path)
+            if res.ok() and ENCODING_METADATA in res.json().get("metadata", {}):
+                # The previous value was compressed, the new one isn't
+                fields = ["metadata:" + ENCODING_METADATA]
+                self.put_cdmi(path, dumps({"metadata": {}}), fields)
+                del res.json()["metadata"][ENCODING_METADATA]
+            return res
+
+    def put_compressed(self, path, data, mimetype, metadata=None):
+        """Upload a data object compressed with the codec of the client.
+
+        The data is compressed in a background thread while it's uploaded,
+        the codec is saved in the radon_content_encoding metadata field so
+        that the object is decompressed when it's downloaded.
+
+        :arg path: path to create
+        :arg data: content for data object
+        :type data: str, bytes, file-like object or iterable of bytes
+        :arg mimetype: mimetype of the uncompressed data
+        :arg metadata: metadata for object, they replace the existing ones
+        :returns: CDMI JSON response
+        :rtype: Response
+
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            chunks = [bytes(data)]
+        elif hasattr(data, "read"):
+            chunks = read_chunks(data)
+        else:
+            chunks = data
+        res = self.put_http(path, compress_stream(chunks, self.compression), mimetype)
+        if not res.ok():
+            return res
+        if metadata:
+            metadata = dict(metadata, **{ENCODING_METADATA: self.compression})
+            fields = None
+        else:
+            metadata = {ENCODING_METADATA: self.compression}
+            fields = ["metadata:" + ENCODING_METADATA]
+        res = self.put_cdmi(path, dumps({"metadata": metadata}), fields)
+        if not res.ok():
+            return res
+        return self.get_cdmi(path)
+
+
+def body_size(data):
+    """Return the size in bytes of a request body, 0 if it can't be known
+    without reading it.
+
+    :arg data: body of the request
+    :type data: str, bytes or file-like object
+    :rtype: int
+
+    """
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    try:
+        return os.fstat(data.fileno()).st_size - data.tell()
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def read_chunks(fh, chunk_size=COPY_CHUNK_SIZE):
+    """Read a binary file-like object (as stdin) in chunks, used as a
+    streamed request body.
+
+    :arg fh: The file-like object to read
+    :arg chunk_size: Maximum size of a chunk
+    :returns: A generator of bytes
+
+    """
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def normalize_path(pwd, path):
+    """Return the URL path of a container or a data object, this is the
+    reference implementation of the normalization.
+
+    :arg pwd: The working container
+    :arg path: path relative to ``pwd``, or absolute
+    :returns: absolute URL path, quoted
+    :rtype: str
+
+    """
+    # Turn URL path into OS path for manipulation
+    mypath = url2pathname(path)
+    if not os.path.isabs(mypath):
+        mypath = os.path.join(url2pathname(pwd), mypath)
+    # normalize path
+    mypath = os.path.normpath(mypath)
+    if path.endswith("/") and not mypath.endswith("/"):
+        mypath += "/"
+    return pathname2url(mypath)
+
+
+normalize_path_cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(normalize_path)
+
+
+def fast_normalize_path(pwd, path):
+    """Return the URL path of a container or a data object, as
+    ``normalize_path``. The paths which are already normalized are returned
+    as is, the normalization of the other ones is memoized.
+
+    :arg pwd: The working container
+    :arg path: path relative to ``pwd``, or absolute
+    :rtype: str
+
+    """
+    if path.startswith("/") and os.sep == "/" and NORMALIZED_PATH.match(path):
+        return path
+    return normalize_path_cached(pwd, path)
+
+
+def cdmi_query(fields):
+    """Return the query string which selects CDMI fields in a URL.
+
+    :arg fields: list of CDMI fields ("children", "metadata:cdmi_acl", ...)
+    :rtype: str
+
+    """
+    if not fields:
+        return ""
+    return "?" + ";".join(fields)
+
+
+def run_task(fn, *args):
+    """Call a task of a bulk method, the errors raised (connection errors,
+    local files which can't be read or written) are returned as a Response
+    so that they don't stop the other tasks.
+
+    :returns: The Response returned by ``fn(*args)``, or the error
+    :rtype: Response
+
+    """
+    try:
+        return fn(*args)
+    except requests.exceptions.RequestException as excpt:
+        return Response(503, "Unable to connect: {}".format(excpt))
+    except CompressionError as excpt:
+        return Response(500, str(excpt))
+    except OSError as excpt:
+        return Response(excpt.errno or errno.EIO, str(excpt))
+
+
+def response_retries(res):
+    """Return the number of retries done by the connection pool to get a
+    response, 0 if it's unknown.
+
+    :arg res: A response from the archive, or None
+    :type res: requests.Response
+    :rtype: int
+
+    """
+    retries = getattr(getattr(res, "raw", None), "retries", None)
+    if retries is None:
+        return 0
+    return len(retries.history)
+
+
+def release_with_body(res, release, *args):
+    """Call ``release(*args)`` once the body of a streamed response is read
+    or closed (or once the response is garbage collected).
+
+    :arg res: A streamed response
+    :type res: requests.Response
+    :arg release: The function to call
+    :arg args: The arguments of ``release``
+
+    """
+    finalizer = weakref.finalize(res, release, *args)
+    release_conn = getattr(res.raw, "release_conn", None)
+    if release_conn is None:
+        # Not a pooled connection, its end can't be seen
+        finalizer()
+        return
+
+    def release_body():
+        # Called by urllib3 at the end of the body and by Response.close()
+        try:
+            release_conn()
+        finally:
+            finalizer()
+
+    res.raw.release_conn = release_body
+
+
+def response_size(res, stream):
+    """Return the size in bytes of a response body. Streamed bodies aren't
+    read, their size comes from the Content-Length header.
+
+    :arg res: A response from the archive, or None
+    :type res: requests.Response
+    :arg stream: True if the response is streamed
+    :rtype: int
+
+    """
+    if res is None:
+        return 0
+    if stream:
+        return int(res.headers.get("Content-Length", 0) or 0)
+    return len(res.content)
@@ -0,0 +1,197 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import queue
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CODECS = ("gzip", "zstd")
+
+# Metadata field which marks the data objects stored compressed
+ENCODING_METADATA = "radon_content_encoding"
+
+# Magic numbers of the compressed streams
+MAGIC_NUMBERS = {
+    "gzip": b"\x1f\x8b",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+
+# Number of chunks buffered between the transfer and the (de)compression
+QUEUE_SIZE = 4
+
+_END = object()
+
+
+class CompressionError(Exception):
+    """The codec can't be used"""
+
+
+def check_codec(codec):
+    """Raise a CompressionError if a codec can't be used"""
+    if codec not in CODECS:
+        raise CompressionError(
+            "Unknown codec {}, use {}".format(codec, " or ".join(CODECS))
+        )
+    if codec == "zstd" and zstandard is None:
+        raise CompressionError("The zstandard package is needed for zstd")
+
+
+def compressor(codec, level=None):
+    """Return a compression object (with compress and flush methods)"""
+    check_codec(codec)
+    if codec == "gzip":
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+    params = {} if level is None else {"level": level}
+    return zstandard.ZstdCompressor(**params).compressobj()
+
+
+def decompressor(codec):
+    """Return a decompression object (with decompress and flush methods)"""
+    check_codec(codec)
+    if codec == "gzip":
+        return zlib.decompressobj(31)
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def sniff_codec(data):
+    """Return the codec whose magic number starts ``data``, None if there
+    isn't any"""
+    for codec, magic in MAGIC_NUMBERS.items():
+        if data.startswith(magic):
+            return codec
+    return None
+
+
+def transform_in_thread(chunks, transform, flush, queue_size=QUEUE_SIZE):
+    """Apply a transformation to a stream of chunks in a background thread,
+    so that it overlaps the transfer of the chunks.
+
+    At most ``queue_size`` transformed chunks wait to be consumed, the
+    memory used doesn't depend on the size of the stream. An exception
+    raised by the transformation is raised by the generator.
+
+    :arg chunks: An iterable of bytes
+    :arg transform: Function applied to each chunk
+    :arg flush: Function which returns the end of the transformed stream
+    :returns: A generator of bytes
+
+    """
+    output = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def worker():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    return
+                data = transform(chunk)
+                if data:
+                    output.put(data)
+            data = flush()
+            if data:
+                output.put(data)
+            output.put(_END)
+        except Exception as err:
+            output.put(err)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = output.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblock the worker if the consumer stopped early
+        stop.set()
+        while thread.is_alive():
+            try:
+                output.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def compress_stream(chunks, codec, level=None):
+    """Compress a stream of chunks in a background thread.
+
+    :arg chunks: An iterable of bytes
+    :arg codec: "gzip" or "zstd"
+    :arg level: Compression level, the codec default by default
+    :returns: A generator of compressed bytes
+
+    """
+    comp = compressor(codec, level)
+    return transform_in_thread(chunks, comp.compress, comp.flush)
+
+
+def decompress_stream(chunks, codec):
+    """Decompress a stream of chunks in a background thread.
+
+    :arg chunks: An iterable of compressed bytes
+    :arg codec: "gzip" or "zstd"
+    :returns: A generator of bytes
+
+    """
+    dec = decompressor(codec)
+
+    def decompress(chunk):
+        try:
+            return dec.decompress(chunk)
+        except Exception as err:
+            # zlib.error or zstandard.ZstdError
+            raise CompressionError("Invalid {} stream: {}".format(codec, err))
+
+    return transform_in_thread(chunks, decompress, dec.flush)
+
+
+class CompressedWriter():
+    """A writable file-like object which compresses the data written to
+    another file-like object. ``close`` writes the end of the stream but
+    doesn't close the underlying file."""
+
+    def __init__(self, fileobj, codec, level=None):
+        self.fileobj = fileobj
+        self._comp = compressor(codec, level)
+
+    def write(self, data):
+        compressed = self._comp.compress(data)
+        if compressed:
+            self.fileobj.write(compressed)
+        return len(data)
+
+    def close(self):
+        self.fileobj.write(self._comp.flush())
+        self.fileobj.flush()
+
+
+def codec_from_name(filename):
+    """Return the codec matching the extension of a file name, None if it
+    isn't compressed"""
+    name = filename.lower()
+    if name.endswith((".gz", ".tgz")):
+        return "gzip"
+    if name.endswith((".zst", ".tzst")):
+        return "zstd"
+    return None
@@ -0,0 +1,428 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import fnmatch
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from cli.client import CDMI_CONTAINER, CDMI_OBJECT, Response
+from cli.tarstream import value_size
+
+# CDMI fields read to index a container or a data object
+INDEX_FIELDS = ["objectType", "metadata", "valuerange", "children"]
+# Number of rows written by a refresh between two commits
+COMMIT_INTERVAL = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    container INTEGER NOT NULL,
+    size INTEGER,
+    mtime TEXT,
+    etag TEXT,
+    stale INTEGER NOT NULL DEFAULT 0,
+    indexed REAL
+);
+CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent);
+CREATE INDEX IF NOT EXISTS nodes_name ON nodes (name);
+CREATE TABLE IF NOT EXISTS metadata (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS metadata_path ON metadata (path);
+CREATE INDEX IF NOT EXISTS metadata_value ON metadata (name, value);
+"""
+
+
+class NamespaceIndexError(Exception):
+    """The index can't be used"""
+
+
+def parent_path(path):
+    """Return the path of the parent container of a path ("" for the root)"""
+    if path == "/":
+        return ""
+    stripped = path.rstrip("/")
+    return stripped[: stripped.rfind("/") + 1]
+
+
+def subtree_end(path):
+    """Return the upper bound of the paths of the descendants of a container,
+    they are between ``path`` and this bound in the order of the paths"""
+    return path[:-1] + chr(ord("/") + 1)
+
+
+def metadata_value(value):
+    """Return a metadata value as stored in the index, the strings are kept
+    as they are, the other values are stored as JSON"""
+    return value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+
+
+def node_matches(path, container, metadata, name=None, object_type=None,
+                 meta=None):
+    """Check a container or a data object matches the criteria of
+    ``NamespaceIndex.find``, for the searches done without the index.
+
+    :arg path: Path of the node
+    :arg container: True for a container
+    :arg metadata: The metadata of the node
+    :rtype: bool
+
+    """
+    if name and not fnmatch.fnmatchcase(path.rstrip("/").rsplit("/", 1)[-1], name):
+        return False
+    if object_type and container != (object_type == "container"):
+        return False
+    if meta:
+        values = metadata.get(meta[0])
+        if values is None:
+            return False
+        values = values if isinstance(values, list) else [values]
+        return metadata_value(meta[1]) in [metadata_value(v) for v in values]
+    return True
+
+
+class NamespaceIndex():
+    """A local index of the namespace of an archive, in a SQLite database.
+
+    The index keeps the path, type, size, modification time and user
+    metadata of the containers and data objects read by ``refresh``, so that
+    ``ls`` and ``find`` can be answered without requests. A client with an
+    index (``RadonClient.index``) marks the paths it creates or modifies as
+    stale and removes the paths it deletes, the stale paths are read again
+    by the next refresh. Only the paths under an indexed container are
+    tracked.
+    """
+
+    def __init__(self, filename):
+        """Open (or create) an index.
+
+        :arg filename: Path of the SQLite database
+
+        """
+        self.filename = filename
+        # The index is updated by the threads of the client
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def get_setting(self, key):
+        row = self._db.execute(
+            "SELECT value FROM settings WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_setting(self, key, value):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+            self._db.commit()
+
+    def bind(self, url):
+        """Check the index describes the archive at ``url``, an empty index is
+        bound to it"""
+        indexed_url = self.get_setting("url")
+        if indexed_url is None:
+            self.set_setting("url", url)
+        elif indexed_url != url:
+            raise NamespaceIndexError(
+                "The index describes the archive {}".format(indexed_url)
+            )
+
+    def get(self, path):
+        """Return the row of a path (path, name, container, size, mtime, etag,
+        stale), None if it isn't indexed"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT path, name, container, size, mtime, etag, stale FROM nodes "
+                "WHERE path = ?",
+                (path,),
+            ).fetchone()
+
+    def lookup(self, path):
+        """Return the row of a path given with or without its trailing /"""
+        row = self.get(path)
+        if row is None and not path.endswith("/"):
+            row = self.get(path + "/")
+        return row
+
+    def children(self, path):
+        """Return the rows of the children of a container"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT path, name, container, size, mtime, etag, stale FROM nodes "
+                "WHERE parent = ? ORDER BY path",
+                (path,),
+            ).fetchall()
+
+    def ls(self, path):
+        """List a container from the index, as ``RadonClient.ls``.
+
+        :arg path: Absolute path of the container
+        :returns: A CDMI JSON response with the objectType, objectName and
+          children fields
+        :rtype: Response
+
+        """
+        row = self.lookup(path)
+        if row is None:
+            return Response(404, "'{}' isn't indexed".format(path))
+        path, name = row[0], row[1]
+        if not row[2]:
+            return Response(0, {"objectType": CDMI_OBJECT, "objectName": name})
+        return Response(0, {
+            "objectType": CDMI_CONTAINER,
+            "objectName": name + "/",
+            "children": [
+                child[1] + "/" if child[2] else child[1]
+                for child in self.children(path)
+            ],
+        })
+
+    def find(self, path, name=None, object_type=None, metadata=None):
+        """Search the index for the descendants of a container.
+
+        :arg path: Absolute path of the container (or of a data object)
+        :arg name: A glob pattern the names must match ("*.csv")
+        :arg object_type: "container" or "object" to select a type only
+        :arg metadata: A (name, value) pair of user metadata the paths must
+          have
+        :returns: A generator of (path, container, size, mtime) tuples, in
+          the order of the paths
+
+        """
+        row = self.lookup(path)
+        if row is None:
+            return
+        path = row[0]
+        query = "SELECT path, container, size, mtime FROM nodes WHERE "
+        params = [path]
+        if path.endswith("/"):
+            query += "(path = ? OR (path > ? AND path < ?))"
+            params += [path, subtree_end(path)]
+        else:
+            query += "path = ?"
+        if name:
+            query += " AND name GLOB ?"
+            params.append(name)
+        if object_type:
+            query += " AND container = ?"
+            params.append(1 if object_type == "container" else 0)
+        if metadata:
+            query += (
+                " AND EXISTS (SELECT 1 FROM metadata WHERE metadata.path = nodes.path"
+                " AND metadata.name = ? AND metadata.value = ?)"
+            )
+            params += [metadata[0], metadata_value(metadata[1])]
+        query += " ORDER BY path"
+        for found in self._db.execute(query, params):
+            yield found
+
+    def update(self, path, cdmi_info, etag=None):
+        """Index a container or a data object from its CDMI description"""
+        container = cdmi_info.get("objectType") == CDMI_CONTAINER
+        if container and not path.endswith("/"):
+            path += "/"
+        metadata = cdmi_info.get("metadata", {})
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO nodes (path, parent, name, container, size, "
+                "mtime, etag, stale, indexed) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                (
+                    path,
+                    parent_path(path),
+                    path.rstrip("/").rsplit("/", 1)[-1],
+                    int(container),
+                    None if container else value_size(cdmi_info),
+                    metadata.get("cdmi_mtime"),
+                    etag,
+                    time.time(),
+                ),
+            )
+            self._db.execute("DELETE FROM metadata WHERE path = ?", (path,))
+            rows = []
+            for key, value in metadata.items():
+                if key.startswith("cdmi_"):
+                    continue
+                for val in value if isinstance(value, list) else [value]:
+                    rows.append((path, key, metadata_value(val)))
+            self._db.executemany(
+                "INSERT INTO metadata (path, name, value) VALUES (?, ?, ?)", rows
+            )
+
+    def mark_fresh(self, path):
+        """Record that a path has been revalidated"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE nodes SET stale = 0, indexed = ? WHERE path = ?",
+                (time.time(), path),
+            )
+
+    def touch(self, path):
+        """Mark a path created or modified by the client as stale, it's added
+        to the index if its parent container is indexed"""
+        with self._lock:
+            if self.lookup(path) is None:
+                parent = parent_path(path)
+                if not parent or self.get(parent) is None:
+                    return
+                self._db.execute(
+                    "INSERT INTO nodes (path, parent, name, container, stale) "
+                    "VALUES (?, ?, ?, ?, 1)",
+                    (
+                        path,
+                        parent,
+                        path.rstrip("/").rsplit("/", 1)[-1],
+                        int(path.endswith("/")),
+                    ),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE nodes SET stale = 1 WHERE path IN (?, ?)",
+                    (path, path + "/"),
+                )
+            self._db.commit()
+
+    def remove(self, path, commit=True):
+        """Remove a path, and its descendants for a container"""
+        with self._lock:
+            for node in (path, path if path.endswith("/") else path + "/"):
+                if node.endswith("/"):
+                    where = "path = ? OR (path > ? AND path < ?)"
+                    params = (node, node, subtree_end(node))
+                else:
+                    where = "path = ?"
+                    params = (node,)
+                self._db.execute(
+                    "DELETE FROM metadata WHERE path IN "
+                    "(SELECT path FROM nodes WHERE {})".format(where),
+                    params,
+                )
+                self._db.execute("DELETE FROM nodes WHERE {}".format(where), params)
+            if commit:
+                self._db.commit()
+
+    def refresh(self, client, path, jobs=8):
+        """Read a container and its descendants (or a data object) again, with
+        ``jobs`` requests in parallel.
+
+        The indexed paths are revalidated with conditional requests (with the
+        ETag of their last read), an unchanged container isn't read again
+        and its data objects aren't revalidated, unless the client marked
+        them as stale. The paths which disappeared from the archive are
+        removed from the index.
+
+        :arg client: The client to use
+        :type client: cli.client.RadonClient
+        :arg path: Absolute path of the container (ending with a /) or data
+          object
+        :arg jobs: Number of requests in parallel
+        :returns: A generator of (path, status), the status is "new",
+          "changed", "unchanged", "removed", or the Response of an error
+
+        """
+        executor = ThreadPoolExecutor(jobs)
+        pending = {}
+        written = 0
+
+        def revalidate(node):
+            row = self.get(node)
+            if row is None and not node.endswith("/"):
+                # A data object may have been replaced by a container
+                row = self.get(node + "/")
+            etag = row[5] if row and not row[6] else None
+            res, new_etag = client.get_cdmi_if_changed(node, INDEX_FIELDS, etag)
+            if res.code() == 404 and not node.endswith("/") and row is None:
+                res, new_etag = client.get_cdmi_if_changed(
+                    node + "/", INDEX_FIELDS, None
+                )
+                node += "/"
+            return node, row, res, new_etag
+
+        def submit(node):
+            pending[executor.submit(revalidate, node)] = node
+
+        submit(path)
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    node, row, res, etag = future.result()
+                    if res.code() == 304:
+                        self.mark_fresh(row[0])
+                        status = "unchanged"
+                        if row[2]:
+                            # Same children, only the containers and the
+                            # stale data objects are read again
+                            for child in self.children(row[0]):
+                                if child[2] or child[6]:
+                                    submit(child[0])
+                    elif res.code() == 404:
+                        if row is None:
+                            yield node, res
+                            continue
+                        self.remove(row[0], False)
+                        status = "removed"
+                    elif not res.ok():
+                        yield node, res
+                        continue
+                    else:
+                        cdmi_info = res.json()
+                        container = cdmi_info.get("objectType") == CDMI_CONTAINER
+                        if row is not None and row[2] != int(container):
+                            # Replaced by a node of the other type
+                            self.remove(row[0], False)
+                            row = None
+                        if container and not node.endswith("/"):
+                            node += "/"
+                        status = "new" if row is None else "changed"
+                        self.update(node, cdmi_info, etag)
+                        if container:
+                            names = cdmi_info.get("children", [])
+                            known = {child[0] for child in self.children(node)}
+                            for child in set(known) - {node + n for n in names}:
+                                self.remove(child, False)
+                            for name in names:
+                                submit(node + name)
+                    written += 1
+                    if written % COMMIT_INTERVAL == 0:
+                        with self._lock:
+                            self._db.commit()
+                    yield node, status
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._db.commit()
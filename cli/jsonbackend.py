@@ -0,0 +1,207 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# JSON libraries which can be used, by order of preference
+BACKENDS = ("orjson", "ujson", "json")
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters of a JSON number, raw_decode accepts the start of a number
+# ("1" of "1.5") so they're never decoded at the end of the buffered text
+_NUMBER = re.compile(r"[-+0-9.eE]*")
+
+
+class JsonBackendError(Exception):
+    """The JSON library can't be used"""
+
+
+def available_backends():
+    """Return the names of the JSON libraries installed, by order of
+    preference"""
+    modules = {"orjson": orjson, "ujson": ujson, "json": json}
+    return [name for name in BACKENDS if modules[name] is not None]
+
+
+def set_backend(name=None):
+    """Select the JSON library used by the client to parse the responses and
+    to serialize the request bodies.
+
+    :arg name: "orjson", "ujson" or "json", the fastest one installed by
+      default
+
+    """
+    global backend, _loads, _dumps
+    available = available_backends()
+    if name is None:
+        name = available[0]
+    if name not in BACKENDS:
+        raise JsonBackendError(
+            "Unknown JSON backend {}, use {}".format(name, ", ".join(BACKENDS))
+        )
+    if name not in available:
+        raise JsonBackendError("The {} package isn't installed".format(name))
+    backend = name
+    if name == "orjson":
+        _loads = orjson.loads
+        _dumps = orjson_dumps
+    elif name == "ujson":
+        _loads = ujson.loads
+        _dumps = ujson_dumps
+    else:
+        _loads = json.loads
+        _dumps = json.dumps
+
+
+def loads(data):
+    """Parse a JSON document with the selected library.
+
+    :arg data: The document
+    :type data: bytes or str
+    :raises ValueError: The document isn't valid
+
+    """
+    return _loads(data)
+
+
+def dumps(obj):
+    """Serialize ``obj`` as a JSON document with the selected library.
+
+    :returns: The document, as bytes with orjson, as a str otherwise (both
+      can be sent as a request body)
+
+    """
+    return _dumps(obj)
+
+
+def orjson_dumps(obj):
+    """Serialize ``obj`` with orjson, the document is returned as bytes"""
+    return orjson.dumps(obj)
+
+
+def ujson_dumps(obj):
+    """Serialize ``obj`` with ujson"""
+    return ujson.dumps(obj, escape_forward_slashes=False)
+
+
+class _ChunkParser():
+    """Parse a JSON document read in chunks, one value at a time"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """Read the next chunk, return False at the end of the document"""
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self.decoder.decode(b"", True)
+        else:
+            text = self.decoder.decode(chunk)
+        self.text = self.text[self.pos:] + text
+        self.pos = 0
+        return not self.eof or bool(text)
+
+    def peek(self):
+        """Return the next character which isn't a whitespace, "" at the end
+        of the document"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self.more():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(
+                "Invalid JSON document, expected {!r} at {!r}".format(
+                    char, self.text[self.pos:self.pos + 20]
+                )
+            )
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, the chunks are read until it's complete"""
+        self.peek()
+        while True:
+            # A number may continue in the next chunk
+            end = _NUMBER.match(self.text, self.pos).end()
+            if end == len(self.text) and self.more():
+                continue
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except ValueError:
+                if not self.more():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+
+def iter_array(chunks, key):
+    """Yield the elements of an array of a JSON object as they are read, the
+    document is never held in memory (as the "children" of a CDMI
+    container). The rest of the document isn't read once the array is
+    complete.
+
+    :arg chunks: An iterable of bytes, the JSON object
+    :arg key: The key of the array in the object
+    :returns: A generator of the elements, nothing if the key is missing
+
+    """
+    parser = _ChunkParser(chunks)
+    parser.expect("{")
+    if parser.peek() == "}":
+        return
+    while True:
+        name = parser.value()
+        parser.expect(":")
+        if name != key:
+            parser.value()
+        else:
+            parser.expect("[")
+            if parser.peek() == "]":
+                return
+            while True:
+                yield parser.value()
+                if parser.peek() == "]":
+                    return
+                parser.expect(",")
+        if parser.peek() == "}":
+            return
+        parser.expect(",")
+
+
+set_backend()
@@ -0,0 +1,155 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+
+from cli.client import Response
+
+
+class ManifestError(Exception):
+    """The manifest can't be used"""
+
+
+def manifest_entry(row, line):
+    """Check and normalize an entry of a manifest, a row which isn't an
+    object is returned with the error to report for it"""
+    if not isinstance(row, dict):
+        return {
+            "url": None,
+            "dest": "line {}".format(line),
+            "mimetype": None,
+            "metadata": {},
+            "error": Response(400, "Line {}: not a JSON object".format(line)),
+        }
+    url = (row.get("url") or "").strip()
+    dest = (row.get("dest") or "").strip()
+    if not url or not dest:
+        raise ManifestError("Line {}: url and dest are required".format(line))
+    metadata = row.get("metadata") or {}
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except ValueError:
+            raise ManifestError("Line {}: metadata isn't a JSON object".format(line))
+    if not isinstance(metadata, dict):
+        raise ManifestError("Line {}: metadata isn't a JSON object".format(line))
+    return {
+        "url": url,
+        "dest": dest,
+        "mimetype": (row.get("mimetype") or "").strip() or None,
+        "metadata": metadata,
+    }
+
+
+def load_manifest(path):
+    """Read the references to create from a manifest, one at a time so that
+    large manifests aren't loaded in memory.
+
+    A CSV manifest has the columns url, dest, mimetype (optional) and
+    metadata (optional, a JSON object). A JSONL manifest has a JSON object
+    with the same fields per line. "-" reads a JSONL manifest from the
+    standard input.
+
+    :arg path: Path of the manifest (.csv or .jsonl)
+    :returns: A generator of {"url", "dest", "mimetype", "metadata"}
+
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if path != "-" and ext not in (".csv", ".jsonl"):
+        raise ManifestError("Unknown file format for {}".format(path))
+    fh = sys.stdin if path == "-" else open(path, "r", newline="")
+    try:
+        if ext == ".csv":
+            # Line 1 is the header
+            for line, row in enumerate(csv.DictReader(fh), 2):
+                yield manifest_entry(row, line)
+        else:
+            for line, text in enumerate(fh, 1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError:
+                    raise ManifestError("Line {}: invalid JSON".format(line))
+                yield manifest_entry(row, line)
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+
+def register_references(client, entries, jobs=8):
+    """Create the references of a manifest with ``jobs`` requests in
+    parallel.
+
+    A reference is created directly, its missing parent containers are only
+    created if the server answers that the parent doesn't exist, and each of
+    them is created once. The errors (as conflicts with existing objects)
+    don't stop the registration.
+
+    :arg client: The client to use
+    :type client: cli.client.RadonClient
+    :arg entries: The references, as returned by ``load_manifest``
+    :arg jobs: Number of requests in parallel
+    :returns: A generator of (entry, Response), in completion order
+
+    """
+    pwd = client.pwd()
+    created = set()
+    # A lock per container to create, the other references aren't blocked
+    # while a container is created
+    locks = {}
+    locks_lock = threading.Lock()
+
+    def create_parents(path):
+        """Create the missing ancestors of a path, top-down"""
+        parts = path.strip("/").split("/")[:-1]
+        for idx in range(1, len(parts) + 1):
+            parent = "/" + "/".join(parts[:idx]) + "/"
+            with locks_lock:
+                lock = locks.setdefault(parent, threading.Lock())
+            with lock:
+                if parent in created:
+                    continue
+                res = client.mkdir(parent)
+                if not res.ok() and res.code() != 409:
+                    return res
+                created.add(parent)
+        return None
+
+    def register(entry):
+        if "error" in entry:
+            return entry["error"]
+        path = entry["dest"]
+        if not path.startswith("/"):
+            path = pwd + path
+        res = client.put_reference(
+            path, entry["url"], entry["mimetype"], entry["metadata"]
+        )
+        if res.code() == 404:
+            error = create_parents(path)
+            if error:
+                return error
+            res = client.put_reference(
+                path, entry["url"], entry["mimetype"], entry["metadata"]
+            )
+        return res
+
+    tasks = ((entry, register, (entry,)) for entry in entries)
+    return client._run_many(tasks, jobs)
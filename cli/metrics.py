@@ -0,0 +1,224 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cli.trace import LATENCY_BUCKETS, Tracer
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def escape_label(value):
+    """Escape a label value for the OpenMetrics text format"""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return value.replace("\n", "\\n")
+
+
+def format_labels(labels):
+    """Return the OpenMetrics representation of a tuple of (name, value)
+    labels"""
+    if not labels:
+        return ""
+    return "{{{}}}".format(
+        ",".join('{}="{}"'.format(name, escape_label(value)) for name, value in labels)
+    )
+
+
+class MetricsRegistry():
+    """Metrics of the requests sent by one or more RadonClient, in the
+    OpenMetrics text format.
+
+    The registry is fed by the trace records of the clients (see
+    ``cli.trace.Tracer``). The metrics can be scraped from a local HTTP
+    endpoint (``serve``) or written for the textfile collector of the
+    Prometheus node exporter (``write_textfile``).
+    """
+
+    def __init__(self, prefix="radon_client"):
+        self.prefix = prefix
+        self.requests = {}
+        self.bytes_sent = {}
+        self.bytes_received = {}
+        self.retries = {}
+        # Histograms: labels -> [bucket counts, sum, count]
+        self.durations = {}
+        self.clients = []
+        self.caches = {}
+        self.server = None
+        self._lock = threading.Lock()
+
+    def add_cache(self, name, cache_info):
+        """Export the hits and misses of a cache.
+
+        :arg name: Name of the cache, used as a label
+        :arg cache_info: A callable returning an object with ``hits`` and
+          ``misses`` attributes (as ``functools.lru_cache().cache_info``)
+
+        """
+        self.caches[name] = cache_info
+
+    def bind(self, client):
+        """Collect the metrics of the requests sent by a RadonClient.
+
+        :arg client: The client to observe
+        :type client: cli.client.RadonClient
+
+        """
+        if client.tracer is None:
+            client.tracer = Tracer()
+        if self.observe not in client.tracer.hooks:
+            client.tracer.add_hook(self.observe)
+        if client not in self.clients:
+            self.clients.append(client)
+
+    def observe(self, record):
+        """Add a trace record to the metrics, used as a tracer hook"""
+        op = (("method", record["method"]), ("path", record["path"]))
+        status = record["status"] if record["status"] is not None else "error"
+        with self._lock:
+            key = op + (("status", status),)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytes_sent[op] = self.bytes_sent.get(op, 0) + record["bytes_out"]
+            self.bytes_received[op] = (
+                self.bytes_received.get(op, 0) + record["bytes_in"]
+            )
+            self.retries[op] = self.retries.get(op, 0) + record["retries"]
+            if op not in self.durations:
+                self.durations[op] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            histogram = self.durations[op]
+            histogram[0][bisect.bisect_left(LATENCY_BUCKETS, record["total"])] += 1
+            histogram[1] += record["total"]
+            histogram[2] += 1
+
+    def _family(self, lines, name, kind, help_text):
+        lines.append("# TYPE {}_{} {}".format(self.prefix, name, kind))
+        lines.append("# HELP {}_{} {}".format(self.prefix, name, help_text))
+
+    def render(self):
+        """Return the metrics in the OpenMetrics text format.
+
+        :rtype: str
+
+        """
+        lines = []
+        with self._lock:
+            counters = [
+                ("requests", "Requests sent to the archive", self.requests),
+                ("sent_bytes", "Bytes sent to the archive", self.bytes_sent),
+                ("received_bytes", "Bytes received from the archive",
+                 self.bytes_received),
+                ("retries", "Retries done by the connection pool", self.retries),
+            ]
+            for name, help_text, values in counters:
+                self._family(lines, name, "counter", help_text)
+                for labels, value in sorted(values.items()):
+                    lines.append("{}_{}_total{} {}".format(
+                        self.prefix, name, format_labels(labels), value
+                    ))
+            self._family(
+                lines, "request_duration_seconds", "histogram",
+                "Duration of the requests sent to the archive"
+            )
+            for labels, (buckets, total, count) in sorted(self.durations.items()):
+                cumulative = 0
+                bounds = [repr(b) for b in LATENCY_BUCKETS] + ["+Inf"]
+                for bound, value in zip(bounds, buckets):
+                    cumulative += value
+                    lines.append("{}_request_duration_seconds_bucket{} {}".format(
+                        self.prefix, format_labels(labels + (("le", bound),)),
+                        cumulative
+                    ))
+                lines.append("{}_request_duration_seconds_sum{} {}".format(
+                    self.prefix, format_labels(labels), total
+                ))
+                lines.append("{}_request_duration_seconds_count{} {}".format(
+                    self.prefix, format_labels(labels), count
+                ))
+        self._family(
+            lines, "requests_in_flight", "gauge", "Requests sent or waiting to be sent"
+        )
+        inflight = sum(client.throttle.inflight() for client in self.clients)
+        lines.append("{}_requests_in_flight {}".format(self.prefix, inflight))
+        if self.caches:
+            self._family(lines, "cache_hits", "counter", "Hits of the client caches")
+            for name, cache_info in sorted(self.caches.items()):
+                lines.append("{}_cache_hits_total{} {}".format(
+                    self.prefix, format_labels((("cache", name),)), cache_info().hits
+                ))
+            self._family(
+                lines, "cache_misses", "counter", "Misses of the client caches"
+            )
+            for name, cache_info in sorted(self.caches.items()):
+                lines.append("{}_cache_misses_total{} {}".format(
+                    self.prefix, format_labels((("cache", name),)),
+                    cache_info().misses
+                ))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, address="127.0.0.1"):
+        """Expose the metrics on http://address:port/metrics from a
+        background thread.
+
+        :arg port: TCP port of the endpoint
+        :arg address: Address of the endpoint, local only by default
+
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            """Answer the scrape requests"""
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                # Don't pollute the output of the commands
+                pass
+
+        self.server = ThreadingHTTPServer((address, port), MetricsHandler)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+
+    def shutdown(self):
+        """Stop the HTTP endpoint"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def write_textfile(self, path):
+        """Write the metrics in a file for the textfile collector. The file
+        is replaced atomically so the collector never reads a partial file.
+
+        :arg path: Path of the file (should end with .prom)
+
+        """
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as fh:
+            fh.write(self.render())
+        os.replace(tmp_path, path)
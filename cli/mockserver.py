@@ -0,0 +1,507 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from base64 import b64decode, b64encode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+CDMI_CAPABILITY = "application/cdmi-capability"
+CDMI_CONTAINER = "application/cdmi-container"
+CDMI_OBJECT = "application/cdmi-object"
+
+
+class MockRadonServer():
+    """An in-process server implementing the part of the Radon CDMI and admin
+    APIs used by RadonClient. The archive is kept in memory.
+
+    It's used to measure the client offline (``radon bench``), an optional
+    latency can be injected in every answer to simulate a remote archive.
+    """
+
+    def __init__(self, latency=0.0, port=0):
+        """Create a new ``MockRadonServer``.
+
+        :arg latency: Delay added to each answer, in seconds
+        :arg port: TCP port to listen to, a free port is used by default
+
+        """
+        self.latency = latency
+        self.port = port
+        self.lock = threading.RLock()
+        # path -> node, containers paths end with a /
+        self.nodes = {"/": self.new_node(CDMI_CONTAINER)}
+        self.users = {}
+        self.groups = {}
+        # Set to {} to simulate a server which can't copy or move
+        self.capabilities = {
+            "cdmi_copy_dataobject": "true",
+            "cdmi_move_dataobject": "true",
+            "cdmi_copy_container": "true",
+            "cdmi_move_container": "true",
+        }
+        self.server = None
+
+    @property
+    def url(self):
+        """Base url of the server"""
+        return "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def new_node(self, object_type, value=b"", mimetype=None, metadata=None):
+        """Return a new node of the namespace"""
+        return {
+            "objectType": object_type,
+            "objectID": uuid.uuid4().hex,
+            "metadata": metadata or {},
+            "value": value,
+            "mimetype": mimetype or "application/octet-stream",
+            "reference": None,
+        }
+
+    def start(self):
+        """Start the server in a background thread and return its url"""
+        mock = self
+
+        class Handler(MockRadonHandler):
+            """Handler bound to this server"""
+            server_mock = mock
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        return self.url
+
+    def stop(self):
+        """Stop the server"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def add_user(self, username, password, administrator=True, email=""):
+        """Create a user which can authenticate on the server"""
+        with self.lock:
+            self.users[username] = {
+                "uuid": uuid.uuid4().hex,
+                "username": username,
+                "password": password,
+                "email": email,
+                "administrator": administrator,
+                "active": True,
+            }
+
+
+def parent_path(path):
+    """Return the path of the parent container of a path"""
+    stripped = path.rstrip("/")
+    return stripped[: stripped.rfind("/") + 1] or "/"
+
+
+def object_name(path):
+    """Return the name of a node as used by CDMI (containers end with a /)"""
+    if path == "/":
+        return "Home"
+    name = path.rstrip("/").rsplit("/", 1)[-1]
+    return name + "/" if path.endswith("/") else name
+
+
+class MockRadonHandler(BaseHTTPRequestHandler):
+    """Answer the requests sent to a MockRadonServer"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, avoid the delayed ACK stalls
+    disable_nagle_algorithm = True
+    server_mock = None
+
+    def log_message(self, *args):
+        pass
+
+    # Helpers
+
+    def read_body(self):
+        """Read the request body, plain or chunked"""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        return self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+
+    def reply(self, status, body=b"", content_type="application/json", headers=None):
+        """Prepare the answer, it's sent once the archive is unlocked"""
+        self.answer = (status, body, content_type, headers)
+
+    def send_answer(self, status, body, content_type, headers):
+        """Send a full answer"""
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        elif isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def split_url(self):
+        """Return the API ("cdmi" or "admin"), the path and the query"""
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        for api in ("cdmi", "admin"):
+            prefix = "/api/{}".format(api)
+            if path.startswith(prefix):
+                return api, path[len(prefix):] or "/", unquote(parts.query)
+        return None, path, unquote(parts.query)
+
+    def dispatch(self):
+        if self.server_mock.latency:
+            time.sleep(self.server_mock.latency)
+        api, path, query = self.split_url()
+        if api == "cdmi":
+            method = getattr(self, "cdmi_{}".format(self.command.lower()), None)
+        elif api == "admin":
+            method = getattr(self, "admin_{}".format(self.command.lower()), None)
+        else:
+            method = None
+        # The body is read and the answer sent outside of the lock so that
+        # the transfers run concurrently
+        self.body = self.read_body()
+        if method is None:
+            self.reply(404, {"detail": "Not found"})
+        else:
+            with self.server_mock.lock:
+                method(path, query)
+        self.send_answer(*self.answer)
+
+    do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = dispatch
+
+    # CDMI API
+
+    def cdmi_json(self, path, node, query):
+        """Return the CDMI representation of a node, with field selection"""
+        info = {
+            "objectType": node["objectType"],
+            "objectID": node["objectID"],
+            "objectName": object_name(path),
+            "parentURI": parent_path(path) if path != "/" else "/",
+            "metadata": node["metadata"],
+        }
+        if node["objectType"] == CDMI_CONTAINER:
+            info["children"] = sorted(
+                object_name(p)
+                for p in self.server_mock.nodes
+                if p != path and parent_path(p) == path
+            )
+            info["childrenrange"] = "0-{}".format(len(info["children"]) - 1)
+        else:
+            info["mimetype"] = node["mimetype"]
+            info["valuetransferencoding"] = "base64"
+            info["value"] = b64encode(node["value"]).decode("ascii")
+            info["valuerange"] = "0-{}".format(len(node["value"]) - 1)
+        if not query:
+            return info
+        selected = {}
+        for field in query.split(";"):
+            if field.startswith("metadata:"):
+                prefix = field[len("metadata:"):]
+                metadata = selected.setdefault("metadata", {})
+                for key, value in node["metadata"].items():
+                    if key.startswith(prefix):
+                        metadata[key] = value
+            elif field.startswith("children:") and "children" in info:
+                start, end = field[len("children:"):].split("-")
+                selected["children"] = info["children"][int(start): int(end) + 1]
+            elif field in info:
+                selected[field] = info[field]
+        return selected
+
+    def cdmi_get(self, path, query):
+        nodes = self.server_mock.nodes
+        if path.startswith("/cdmi_capabilities/"):
+            self.reply(200, {
+                "objectType": CDMI_CAPABILITY,
+                "capabilities": self.server_mock.capabilities,
+            }, CDMI_CAPABILITY)
+            return
+        node = nodes.get(path)
+        if node is None:
+            self.reply(404, {"detail": "Not found"})
+            return
+        accept = self.headers.get("Accept", "")
+        if node["objectType"] == CDMI_OBJECT and accept not in (
+            CDMI_OBJECT,
+            CDMI_CONTAINER,
+        ):
+            self.send_value(node)
+            return
+        info = self.cdmi_json(path, node, query)
+        # The ETag changes with the representation, as the children of a
+        # container
+        digest = hashlib.md5(json.dumps(info, sort_keys=True).encode("utf-8"))
+        etag = '"{}"'.format(digest.hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            self.reply(304, b"", node["objectType"], {"ETag": etag})
+            return
+        self.reply(200, info, node["objectType"], {"ETag": etag})
+
+    cdmi_head = cdmi_get
+
+    def send_value(self, node):
+        """Send the content of a data object, with Range support"""
+        value = node["value"]
+        byte_range = self.headers.get("Range")
+        if byte_range and byte_range.startswith("bytes="):
+            start, end = byte_range[len("bytes="):].split("-")
+            start = int(start)
+            end = min(int(end) if end else len(value) - 1, len(value) - 1)
+            self.reply(
+                206,
+                value[start: end + 1],
+                node["mimetype"],
+                {"Content-Range": "bytes {}-{}/{}".format(start, end, len(value))},
+            )
+            return
+        self.reply(200, value, node["mimetype"])
+
+    def cdmi_put(self, path, query):
+        nodes = self.server_mock.nodes
+        body = self.body
+        content_type = self.headers.get("Content-Type", "")
+        if path.endswith("/") or content_type == CDMI_CONTAINER:
+            path = path if path.endswith("/") else path + "/"
+            object_type = CDMI_CONTAINER
+        else:
+            if path + "/" in nodes:
+                # Metadata update of a container given without its trailing /
+                path = path + "/"
+            object_type = CDMI_OBJECT
+        if parent_path(path) not in nodes:
+            self.reply(404, {"detail": "Parent container doesn't exist"})
+            return
+        node = nodes.get(path)
+        if content_type in (CDMI_CONTAINER, CDMI_OBJECT):
+            try:
+                data = json.loads(body.decode("utf-8")) if body else {}
+            except ValueError:
+                self.reply(400, {"detail": "Invalid JSON"})
+                return
+        else:
+            # Non-CDMI upload of the value of a data object
+            if node is None:
+                node = self.server_mock.new_node(CDMI_OBJECT)
+                nodes[path] = node
+            node["value"] = body
+            node["mimetype"] = content_type or node["mimetype"]
+            self.reply(201, {})
+            return
+        if "copy" in data or "move" in data:
+            self.copy_nodes(path, data)
+            return
+        if object_type == CDMI_CONTAINER and node is None and not data:
+            nodes[path] = self.server_mock.new_node(CDMI_CONTAINER)
+            self.reply(201, self.cdmi_json(path, nodes[path], ""), CDMI_CONTAINER)
+            return
+        if node is not None and "reference" in data:
+            self.reply(409, {"detail": "Resource already exists"})
+            return
+        if node is None:
+            node = self.server_mock.new_node(object_type)
+            nodes[path] = node
+            status = 201
+        else:
+            status = 200
+        if "metadata" in data:
+            if query.startswith("metadata:"):
+                # Partial update of the selected metadata fields
+                for field in query.split(";"):
+                    key = field[len("metadata:"):]
+                    if key in data["metadata"]:
+                        node["metadata"][key] = data["metadata"][key]
+                    else:
+                        node["metadata"].pop(key, None)
+            else:
+                node["metadata"] = data["metadata"]
+        if "value" in data:
+            value = data["value"]
+            if data.get("valuetransferencoding") == "base64":
+                node["value"] = b64decode(value)
+            else:
+                node["value"] = value.encode("utf-8")
+        if "mimetype" in data:
+            node["mimetype"] = data["mimetype"]
+        if "reference" in data:
+            node["reference"] = data["reference"]
+        self.reply(status, self.cdmi_json(path, node, ""), node["objectType"])
+
+    def copy_nodes(self, path, data):
+        """Copy or move a node and its descendants on the server"""
+        nodes = self.server_mock.nodes
+        move = "move" in data
+        src = urlsplit(data["move" if move else "copy"]).path
+        if src.startswith("/api/cdmi"):
+            src = src[len("/api/cdmi"):] or "/"
+        if src not in nodes and src + "/" in nodes:
+            src = src + "/"
+        feature = "cdmi_{}_{}".format(
+            "move" if move else "copy",
+            "container" if src.endswith("/") else "dataobject",
+        )
+        if self.server_mock.capabilities.get(feature) != "true":
+            self.reply(400, {"detail": "Unsupported operation"})
+            return
+        if src not in nodes or src == "/" or path.startswith(src):
+            self.reply(400, {"detail": "Invalid source"})
+            return
+        if src.endswith("/"):
+            sources = [p for p in nodes if p.startswith(src)]
+        else:
+            sources = [src]
+        for other in sources:
+            node = dict(nodes[other], metadata=dict(nodes[other]["metadata"]))
+            if not move:
+                node["objectID"] = uuid.uuid4().hex
+            else:
+                del nodes[other]
+            nodes[path + other[len(src):]] = node
+        node = nodes[path]
+        self.reply(201, self.cdmi_json(path, node, ""), node["objectType"])
+
+    def cdmi_delete(self, path, query):
+        nodes = self.server_mock.nodes
+        if path not in nodes or path == "/":
+            self.reply(404, {"detail": "Not found"})
+            return
+        for other in [p for p in nodes if p.startswith(path)]:
+            if other == path or path.endswith("/"):
+                del nodes[other]
+        self.reply(204)
+
+    # Admin API
+
+    def authorized(self):
+        """Return the name of the authenticated user, None for anonymous"""
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Basic "):
+            return None
+        username, _, password = b64decode(header[6:]).decode("utf-8").partition(":")
+        user = self.server_mock.users.get(username)
+        if user and user["password"] == password:
+            return username
+        return None
+
+    def user_json(self, user):
+        """Return the description of a user as sent by the admin API"""
+        info = {k: v for k, v in user.items() if k != "password"}
+        info["groups"] = [
+            {"name": name, "uuid": group["uuid"]}
+            for name, group in sorted(self.server_mock.groups.items())
+            if user["username"] in group["members"]
+        ]
+        return info
+
+    def admin_get(self, path, query):
+        mock = self.server_mock
+        parts = path.strip("/").split("/")
+        if parts[0] == "authenticate":
+            if self.authorized():
+                self.reply(200, {"msg": "ok"})
+            else:
+                self.reply(401, {"detail": "Invalid username/password."})
+        elif parts == ["users"]:
+            self.reply(200, sorted(mock.users))
+        elif parts == ["groups"]:
+            self.reply(200, sorted(mock.groups))
+        elif len(parts) == 2 and parts[0] == "users" and parts[1] in mock.users:
+            self.reply(200, self.user_json(mock.users[parts[1]]))
+        elif len(parts) == 2 and parts[0] == "groups" and parts[1] in mock.groups:
+            group = mock.groups[parts[1]]
+            self.reply(200, dict(group, members=sorted(group["members"])))
+        else:
+            self.reply(404, {"detail": "Not found"})
+
+    def admin_post(self, path, query):
+        mock = self.server_mock
+        data = json.loads(self.body.decode("utf-8") or "{}")
+        if path.strip("/") == "users":
+            if data.get("username") in mock.users:
+                self.reply(409, {"detail": "User already exists"})
+                return
+            mock.add_user(
+                data["username"],
+                data.get("password", ""),
+                data.get("administrator", False),
+                data.get("email", ""),
+            )
+            self.reply(201, self.user_json(mock.users[data["username"]]))
+        elif path.strip("/") == "groups":
+            if data.get("groupname") in mock.groups:
+                self.reply(409, {"detail": "Group already exists"})
+                return
+            mock.groups[data["groupname"]] = {
+                "uuid": uuid.uuid4().hex,
+                "name": data["groupname"],
+                "members": [],
+            }
+            self.reply(201, mock.groups[data["groupname"]])
+        else:
+            self.reply(404, {"detail": "Not found"})
+
+    def admin_put(self, path, query):
+        mock = self.server_mock
+        data = json.loads(self.body.decode("utf-8") or "{}")
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "users" and parts[1] in mock.users:
+            user = mock.users[parts[1]]
+            for key in ("email", "administrator", "active", "password"):
+                if key in data:
+                    user[key] = data[key]
+            self.reply(200, self.user_json(user))
+        elif len(parts) == 2 and parts[0] == "groups" and parts[1] in mock.groups:
+            group = mock.groups[parts[1]]
+            for name in data.get("add_users", []):
+                if name in mock.users and name not in group["members"]:
+                    group["members"].append(name)
+            for name in data.get("rm_users", []):
+                if name in group["members"]:
+                    group["members"].remove(name)
+            self.reply(200, {"msg": "Group {} has been modified".format(parts[1])})
+        else:
+            self.reply(404, {"detail": "Not found"})
+
+    def admin_delete(self, path, query):
+        mock = self.server_mock
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "users" and parts[1] in mock.users:
+            del mock.users[parts[1]]
+            self.reply(200, {})
+        elif len(parts) == 2 and parts[0] == "groups" and parts[1] in mock.groups:
+            del mock.groups[parts[1]]
+            self.reply(200, {})
+        else:
+            self.reply(404, {"detail": "Not found"})
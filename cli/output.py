@@ -0,0 +1,133 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import errno
+import json
+
+# Exit codes of the commands, they don't depend on the output format
+EXIT_OK = 0
+# Other errors, as some objects of a bulk command which failed
+EXIT_ERROR = 1
+# Invalid arguments or input file
+EXIT_USAGE = 2
+EXIT_NOT_FOUND = 3
+# Authentication failed or permission denied
+EXIT_DENIED = 4
+# The object, user or group already exists
+EXIT_CONFLICT = 5
+# The server failed, is overloaded or can't be reached
+EXIT_SERVER = 6
+
+
+def exit_code(code):
+    """Return the exit code of a command from the code it returned, which
+    is the code of a ``Response`` (an HTTP status), an errno value or an
+    exit code.
+
+    :arg code: The code returned by the command, None means success
+    :rtype: int
+
+    """
+    if not code:
+        return EXIT_OK
+    if code in (404, errno.ENOENT):
+        return EXIT_NOT_FOUND
+    if code in (401, 403, errno.EACCES):
+        return EXIT_DENIED
+    if code in (409, errno.EEXIST):
+        return EXIT_CONFLICT
+    if code in (400, errno.EINVAL):
+        return EXIT_USAGE
+    if code == 429 or code >= 500:
+        return EXIT_SERVER
+    return EXIT_ERROR
+
+
+def json_default(value):
+    """Serialize the values ``json`` doesn't know (as bytes)"""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+class JsonOutput():
+    """Write the results of a command as JSON.
+
+    A command writes either a single ``result`` or the ``item`` records of a
+    listing. With ``lines`` (--jsonl) each record is written on its own line
+    as soon as it's produced. Otherwise (--json) a single document is
+    written: the result object, or an array whose elements are streamed as
+    they're produced, so that large listings are never held in memory.
+    """
+
+    def __init__(self, stream, lines=False):
+        """Create a new ``JsonOutput``.
+
+        :arg stream: The stream where the records are written
+        :arg lines: Write JSON lines instead of a single document
+
+        """
+        self.stream = stream
+        self.lines = lines
+        # First record of a --json document, written once the kind of
+        # document (object or array) is known
+        self._first = None
+        self._count = 0
+
+    def _dumps(self, record):
+        return json.dumps(record, default=json_default)
+
+    def item(self, record):
+        """Write a record of a listing"""
+        self._write(record, True)
+
+    def result(self, record):
+        """Write the result of a command"""
+        self._write(record, False)
+
+    def _write(self, record, is_item):
+        self._count += 1
+        if self.lines:
+            self.stream.write(self._dumps(record) + "\n")
+            self.stream.flush()
+            return
+        if self._count == 1:
+            self._first = (record, is_item)
+            return
+        if self._count == 2:
+            self.stream.write("[\n  " + self._dumps(self._first[0]))
+            self._first = None
+        self.stream.write(",\n  " + self._dumps(record))
+        self.stream.flush()
+
+    def close(self, failed=False):
+        """End the document, a failed command which wrote no record writes
+        nothing (the error is on stderr)"""
+        if self.lines or (failed and self._count == 0):
+            return
+        if self._count == 0:
+            self.stream.write("[]\n")
+        elif self._first is not None:
+            record, is_item = self._first
+            if is_item:
+                self.stream.write("[\n  " + self._dumps(record) + "\n]\n")
+            else:
+                self.stream.write(self._dumps(record) + "\n")
+        else:
+            self.stream.write("\n]\n")
+        self.stream.flush()
@@ -0,0 +1,170 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from blessings import Terminal
+
+from cli.transfer import format_duration, format_size
+
+# Maximum number of redraws per second on a terminal
+FPS = 4
+# Seconds between two lines when the output isn't a terminal
+LOG_INTERVAL = 10.0
+# Seconds of history used to compute the current rate
+RATE_WINDOW = 5.0
+# Maximum number of objects in progress shown on a terminal
+MAX_FILES = 5
+
+
+class ProgressRenderer():
+    """Display the progress of transfers counted in a ``TransferStats``.
+
+    On a terminal, the aggregate bytes, current rate, ETA and number of
+    active workers are redrawn with a line per object in progress, at most
+    ``fps`` times per second. Otherwise a plain line is logged every
+    ``log_interval`` seconds. The rendering runs in its own thread and only
+    reads the statistics, the transfers don't wait for it.
+    """
+
+    def __init__(self, stats, stream, terminal=None, fps=FPS,
+                 log_interval=LOG_INTERVAL, max_files=MAX_FILES):
+        """Create a new ``ProgressRenderer``.
+
+        :arg stats: The statistics of the transfers
+        :type stats: cli.transfer.TransferStats
+        :arg stream: The stream where the progress is written (stderr when
+          stdout carries data)
+        :arg terminal: The terminal of the stream, if it's already created
+        :type terminal: blessings.Terminal
+        :arg fps: Maximum number of redraws per second on a terminal
+        :arg log_interval: Seconds between two lines on other streams
+        :arg max_files: Maximum number of objects in progress shown
+
+        """
+        self.stats = stats
+        self.stream = stream
+        if terminal is None or terminal.stream is not stream:
+            terminal = Terminal(stream=stream)
+        self.terminal = terminal
+        self.interactive = terminal.is_a_tty
+        self.interval = 1.0 / fps if self.interactive else log_interval
+        self.max_files = max_files
+        # (time, bytes) samples to compute the current rate
+        self._samples = deque()
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self.interactive:
+            # Leave the screen to the messages of the command
+            with self._lock:
+                self._draw([])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                self.render()
+
+    @contextmanager
+    def suspended(self):
+        """Erase the progress while a message is printed, it's redrawn below
+        the message"""
+        with self._lock:
+            if self.interactive:
+                self._draw([])
+            yield
+
+    def rate(self, now, nbytes):
+        """Return the number of bytes per second over the last seconds, so
+        that a stalled transfer shows up as such"""
+        self._samples.append((now, nbytes))
+        while now - self._samples[0][0] > RATE_WINDOW and len(self._samples) > 2:
+            self._samples.popleft()
+        first_time, first_bytes = self._samples[0]
+        if now <= first_time:
+            return self.stats.throughput()
+        return (nbytes - first_bytes) / (now - first_time)
+
+    def summary(self, nbytes, objects, active, rate):
+        """Return the line of the aggregate progress"""
+        stats = self.stats
+        done = format_size(nbytes)
+        if stats.total_bytes:
+            done += "/{} ({:.0%})".format(
+                format_size(stats.total_bytes), nbytes / stats.total_bytes
+            )
+        count = str(objects)
+        if stats.total_objects is not None:
+            count += "/{}".format(stats.total_objects)
+        eta = "--:--"
+        if stats.total_bytes and rate:
+            eta = format_duration(max(0, stats.total_bytes - nbytes) / rate)
+        return "{} objects, {}, {}/s, ETA {}, {} active".format(
+            count, done, format_size(rate), eta, len(active)
+        )
+
+    def render(self):
+        """Display the current progress"""
+        nbytes, objects, active = self.stats.snapshot()
+        rate = self.rate(time.monotonic(), nbytes)
+        line = self.summary(nbytes, objects, active, rate)
+        if not self.interactive:
+            self.stream.write("Progress - {}\n".format(line))
+            self.stream.flush()
+            return
+        lines = [line]
+        width = self.terminal.width or 80
+        for name, done, size in sorted(active)[: self.max_files]:
+            progress = format_size(done)
+            if size:
+                progress += "/" + format_size(size)
+            # Keep the end of long paths
+            name = name if len(name) <= width // 2 else "..." + name[-width // 2:]
+            lines.append("  {} {}".format(name, progress))
+        if len(active) > self.max_files:
+            lines.append("  and {} more".format(len(active) - self.max_files))
+        self._draw([text[:width - 1] for text in lines])
+
+    def _draw(self, lines):
+        """Replace the lines drawn before"""
+        term = self.terminal
+        out = []
+        if self._lines:
+            out.append("\r" + term.move_up * (self._lines - 1))
+        for idx in range(max(len(lines), self._lines)):
+            text = lines[idx] if idx < len(lines) else ""
+            out.append("\r" + text + term.clear_eol)
+            if idx < max(len(lines), self._lines) - 1:
+                out.append("\n")
+        if len(lines) < self._lines:
+            # Go back to the last line drawn, the next ones are blank
+            out.append(term.move_up * (self._lines - max(1, len(lines))) + "\r")
+        self._lines = len(lines)
+        self.stream.write("".join(out))
+        self.stream.flush()
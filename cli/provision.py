@@ -0,0 +1,208 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import csv
+import json
+import os
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+TRUE_VALUES = ("true", "y", "yes", "1")
+
+
+class ProvisionError(Exception):
+    """The provisioning file can't be used"""
+
+
+def to_bool(value):
+    """Convert a boolean field of a provisioning file"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def load_spec(path):
+    """Read a provisioning file and return a normalized description of users
+    and groups.
+
+    A CSV file has a line per user with the columns username, email,
+    administrator, active, password and groups (separated with ";"). A YAML
+    or JSON file has a "users" list (same fields, groups being a list) and an
+    optional "groups" list of {"name", "members"}.
+
+    :arg path: Path of the file (.csv, .yaml, .yml or .json)
+    :returns: {"users": {username: user}, "groups": {name: set of members}}
+    :rtype: dict
+
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", newline="") as fh:
+        if ext == ".csv":
+            users = []
+            for row in csv.DictReader(fh):
+                row["groups"] = [g for g in (row.get("groups") or "").split(";") if g]
+                users.append(row)
+            data = {"users": users}
+        elif ext in (".yaml", ".yml"):
+            if yaml is None:
+                raise ProvisionError("PyYAML is needed to read {}".format(path))
+            data = yaml.safe_load(fh) or {}
+        elif ext == ".json":
+            data = json.load(fh)
+        else:
+            raise ProvisionError("Unknown file format for {}".format(path))
+
+    if not isinstance(data, dict):
+        raise ProvisionError("{} doesn't describe users and groups".format(path))
+    spec = {"users": {}, "groups": {}}
+    for idx, user in enumerate(entries(data, "users"), 1):
+        what = "User entry {}".format(idx)
+        if not isinstance(user, dict):
+            raise ProvisionError("{} isn't a mapping".format(what))
+        username = name_field(user.get("username"), what, "username")
+        entry = {"username": username}
+        for key in ("email", "password"):
+            if user.get(key):
+                entry[key] = str(user[key]).strip()
+        for key in ("administrator", "active"):
+            if user.get(key) not in (None, ""):
+                entry[key] = to_bool(user[key])
+        spec["users"][username] = entry
+        for groupname in name_list(user.get("groups"), what, "groups"):
+            spec["groups"].setdefault(groupname, set()).add(username)
+    for idx, group in enumerate(entries(data, "groups"), 1):
+        what = "Group entry {}".format(idx)
+        if not isinstance(group, dict):
+            raise ProvisionError("{} isn't a mapping with a name".format(what))
+        name = name_field(group.get("name"), what, "name")
+        members = spec["groups"].setdefault(name, set())
+        members.update(name_list(group.get("members"), what, "members"))
+    return spec
+
+
+def entries(data, key):
+    """Return the list of entries of a provisioning file"""
+    value = data.get(key) or []
+    if not isinstance(value, list):
+        raise ProvisionError("The {} of the file must be a list".format(key))
+    return value
+
+
+def name_field(value, what, key):
+    """Return a user or group name of an entry, stripped"""
+    if not isinstance(value, str) or not value.strip():
+        raise ProvisionError("{} doesn't have a {}".format(what, key))
+    return value.strip()
+
+
+def name_list(value, what, key):
+    """Return a list of user or group names of an entry, stripped"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ProvisionError("{}: {} must be a list of names".format(what, key))
+    names = []
+    for name in value:
+        if not isinstance(name, str) or not name.strip():
+            raise ProvisionError(
+                "{}: {} must be a list of names, not {!r}".format(what, key, name)
+            )
+        names.append(name.strip())
+    return names
+
+
+def plan_import(spec, users, groups, user_details, group_details):
+    """Compare a provisioning description with the state of the archive.
+
+    :arg spec: Description returned by ``load_spec``
+    :arg users: Names of the existing users
+    :arg groups: Names of the existing groups
+    :arg user_details: Descriptions of the existing users of the spec, as
+      returned by the admin API ({username: dict})
+    :arg group_details: Descriptions of the existing groups of the spec, as
+      returned by the admin API ({name: dict})
+    :returns: Two lists of actions, the second one must be applied once the
+      first one is done. An action is a tuple whose first element is the
+      name of the operation ("mkgroup", "mkuser", "moduser", "atg")
+    :rtype: tuple
+    :raises ProvisionError: A member of a group is neither in the spec nor
+      an existing user, or the description of an existing user or group of
+      the spec is missing
+
+    """
+    for name, members in sorted(spec["groups"].items()):
+        unknown = sorted(members - set(spec["users"]) - set(users))
+        if unknown:
+            raise ProvisionError(
+                "Group {}: unknown users {}".format(name, ", ".join(unknown))
+            )
+    missing = sorted(set(spec["users"]) & set(users) - set(user_details))
+    missing += sorted(set(spec["groups"]) & set(groups) - set(group_details))
+    if missing:
+        raise ProvisionError(
+            "The descriptions of {} are missing".format(", ".join(missing))
+        )
+    creations = []
+    updates = []
+    for name in sorted(spec["groups"]):
+        if name not in groups:
+            creations.append(("mkgroup", name))
+    for username, user in sorted(spec["users"].items()):
+        if username not in users:
+            creations.append((
+                "mkuser",
+                username,
+                user.get("email", ""),
+                user.get("administrator", False),
+                user.get("password"),
+            ))
+            if user.get("active") is False:
+                updates.append(("moduser", username, {"active": False}))
+            continue
+        current = user_details[username]
+        changes = {}
+        for key in ("email", "administrator", "active"):
+            if key in user and user[key] != current.get(key):
+                changes[key] = user[key]
+        if changes:
+            updates.append(("moduser", username, changes))
+    for name, members in sorted(spec["groups"].items()):
+        current = set(group_details.get(name, {}).get("members", []))
+        missing = sorted(members - current)
+        if missing:
+            updates.append(("atg", name, missing))
+    return creations, updates
+
+
+def describe_action(action):
+    """Return a human readable description of an action"""
+    if action[0] == "mkgroup":
+        return "Create group {}".format(action[1])
+    if action[0] == "mkuser":
+        return "Create user {} ({}{})".format(
+            action[1], action[2] or "no email",
+            ", administrator" if action[3] else ""
+        )
+    if action[0] == "moduser":
+        return "Modify user {}: {}".format(
+            action[1],
+            ", ".join("{}={}".format(k, v) for k, v in sorted(action[2].items())),
+        )
+    return "Add {} to group {}".format(", ".join(action[2]), action[1])
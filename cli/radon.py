@@ -18,33 +18,46 @@ __doc_opt__ = """
 Radon Command Line Interface.
 
 Usage:
-  radon init --url=<URL> [--username=<USER>] [--password=<PWD>]
-  radon whoami
-  radon exit
-  radon pwd
-  radon ls [<path>] [-a]
-  radon cd [<path>]
-  radon cdmi <path>
-  radon mkdir <path>
-  radon put <src> [<dest>] [--mimetype=<MIME>]
-  radon put --ref <url> <dest> [--mimetype=<MIME>]
-  radon get <src> [<dest>] [--force]
-  radon rm <path>
-  radon chmod <path> (read|write|null) <group>
-  radon meta add <path> <meta_name> <meta_value>
-  radon meta set <path> <meta_name> <meta_value>
-  radon meta rm <path> <meta_name> [<meta_value>]
-  radon meta ls <path> [<meta_name>]
-  radon admin lu [<name>]
-  radon admin lg [<name>]
-  radon admin mkuser [<name>]
-  radon admin mkldapuser [<name>]
-  radon admin moduser <name> (email | administrator | active | password) [<value>]
-  radon admin rmuser [<name>]
-  radon admin mkgroup [<name>]
-  radon admin rmgroup [<name>]
-  radon admin atg <name> <user> ...
-  radon admin rfg <name> <user> ...
+  radon init --url=<URL> [--username=<USER>] [--password=<PWD>] [options]
+  radon whoami [options]
+  radon exit [options]
+  radon pwd [options]
+  radon ls [<path>] [-a | --index] [options]
+  radon find [<path>] [--name=<PAT>] [--type=<TYPE>] [--meta=<KV>] [--index] [options]
+  radon index refresh [<path>] [options]
+  radon cd [<path>] [options]
+  radon cdmi <path> [options]
+  radon mkdir <path> [options]
+  radon put <src> [<dest>] [--mimetype=<MIME>] [options]
+  radon put --ref <url> <dest> [--mimetype=<MIME>] [options]
+  radon put --ref --manifest=<FILE> [options]
+  radon put --tar <src> [<dest>] [options]
+  radon get <src> [<dest>] [--force] [options]
+  radon get -R --tar <src> [<dest>] [--force] [options]
+  radon cat <path> [options]
+  radon rm <path> [options]
+  radon cp <src> <dest> [-R] [options]
+  radon mv <src> <dest> [-R] [options]
+  radon chmod <path> (read|write|null) <group> [-R] [options]
+  radon acl check <path> <principal> [-R] [options]
+  radon meta add <path> <meta_name> <meta_value> [options]
+  radon meta set <path> <meta_name> <meta_value> [options]
+  radon meta rm <path> <meta_name> [<meta_value>] [options]
+  radon meta ls <path> [<meta_name>] [options]
+  radon admin lu [<name>] [options]
+  radon admin lu --all [--format=<FMT>] [options]
+  radon admin lg [<name>] [options]
+  radon admin lg --all [--format=<FMT>] [options]
+  radon admin mkuser [<name>] [options]
+  radon admin mkldapuser [<name>] [options]
+  radon admin moduser <name> (email | administrator | active | password) [<value>] [options]
+  radon admin rmuser [<name>] [options]
+  radon admin mkgroup [<name>] [options]
+  radon admin rmgroup [<name>] [options]
+  radon admin atg <name> <user> ... [options]
+  radon admin rfg <name> <user> ... [options]
+  radon admin import <file> [--dry-run] [options]
+  radon bench [<bench>...] [--latency=<MS>] [--count=<N>] [--size=<BYTES>] [options]
   radon (-h | --help)
   radon --version
 
@@ -52,12 +65,48 @@ Options:
   -h --help     Show this screen.
   --version     Show version.
   --url=<URL>   Location of Radon server
+  --max-rate=<N>  Maximum number of requests per second sent to the server
+  --max-bandwidth=<BYTES>  Maximum transfer rate in bytes per second (K, M and
+                           G suffixes accepted)
+  --max-jobs=<N>  Maximum number of requests in flight, adjusted to the load
+                  of the server
+  --compress=<CODEC>  Compress the uploads with gzip or zstd (none to disable),
+                      they are decompressed when they are downloaded
+  --json          Write the results as a JSON document
+  --jsonl         Write the results as JSON lines, one per entry of listings
+  --stats         Print a summary of the requests latency on stderr
+  --trace=<FILE>  Append a JSON line per request sent to the server to FILE
+  --metrics-port=<PORT>  Expose OpenMetrics on http://127.0.0.1:PORT/metrics
+                         while the command runs
+  --metrics-file=<FILE>  Write OpenMetrics to FILE when the command ends
+                         (for the node exporter textfile collector)
+  --jobs=<N>      Number of requests sent in parallel [default: 8]
+  --tar           Upload the members of a tar archive to a container, or
+                  download a container as a tar archive
+  --manifest=<FILE>  CSV or JSONL file of the references to create (url, dest,
+                     mimetype, metadata), - for JSONL on stdin
+  -R              Apply the command to the descendants of a container
+  --dry-run       Show the changes without applying them
+  --index         Answer from the local index of the namespace instead of the
+                  archive (see radon index refresh)
+  --name=<PAT>    Glob pattern of the names of the paths to find
+  --type=<TYPE>   Type of the paths to find: container or object
+  --meta=<KV>     User metadata the paths to find have (name=value)
+  --all           List the details of all the users or groups
+  --format=<FMT>  Format of the detailed listings: text, json or csv
+                  [default: text]
+  --latency=<MS>  Latency injected by the benchmark server [default: 0]
+  --count=<N>     Number of operations of the benchmarks [default: 200]
+  --size=<BYTES>  Size of the small objects of the benchmarks [default: 4K]
 
 
 """
 
+import csv
+from contextlib import redirect_stdout
 import errno
 import os
+from concurrent.futures import ThreadPoolExecutor
 import pickle
 import sys
 from getpass import getpass
@@ -65,6 +114,7 @@ from operator import methodcaller
 import json
 import string
 import random
+import tarfile
 
 import requests
 import requests.exceptions
@@ -72,11 +122,71 @@ from blessings import Terminal
 from docopt import docopt
 
 import cli
-from cli.acl import cdmi_str_to_str_acemask, str_to_cdmi_str_acemask
-from cli.client import RadonClient
+from cli.acl import (
+    acemask_to_cdmi_str,
+    acemask_to_str,
+    cdmi_strs_to_str_acemasks,
+    has_own_ace,
+    merge_ace,
+    str_to_cdmi_str_acemask,
+)
+from cli.audit import ACL_FIELDS, AuditError, PermissionAnalyzer
+from cli.bench import BENCHMARKS, run_benchmarks
+from cli.client import (
+    CDMI_CONTAINER,
+    CDMI_OBJECT,
+    RadonClient,
+    Response,
+    normalize_path_cached,
+    read_chunks,
+)
+from cli.compression import (
+    ENCODING_METADATA,
+    CompressedWriter,
+    CompressionError,
+    check_codec,
+    codec_from_name,
+)
+from cli.index import NamespaceIndex, NamespaceIndexError, node_matches
+from cli.manifest import ManifestError, load_manifest, register_references
+from cli.metrics import MetricsRegistry
+from cli.mockserver import MockRadonServer
+from cli.output import JsonOutput, exit_code, json_default
+from cli.provision import ProvisionError, describe_action, load_spec, plan_import
+from cli.tarstream import export_tar, ingest_tar, value_size
+from cli.progress import ProgressRenderer
+from cli.transfer import (
+    RANGE_THRESHOLD,
+    RangeNotSupported,
+    TransferError,
+    TransferScheduler,
+    TransferStats,
+)
+from cli.trace import JsonlTraceWriter, Tracer
+from cli.transport import ProgressFile
 
 SESSION_PATH = os.path.join(os.path.expanduser("~/.radon"), "session.pickle")
 
+# Columns of the CSV listings of users and groups
+USER_FIELDS = ["username", "email", "uuid", "administrator", "active", "groups"]
+GROUP_FIELDS = ["name", "uuid", "members"]
+
+
+def csv_value(value):
+    """Flatten a field of a user or group description for a CSV cell"""
+    if isinstance(value, list):
+        return ";".join(el["name"] if isinstance(el, dict) else el for el in value)
+    return value
+
+
+def parse_size(value):
+    """Convert a size with an optional K, M or G suffix into an int"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
 
 def random_password(length=10):
     """Generate a random string of fixed length """
@@ -90,6 +200,69 @@ class RadonApplication():
     def __init__(self, session_path):
         self.terminal = Terminal()
         self.session_path = session_path
+        # The index of the namespace is kept next to the session
+        self.index_path = os.path.join(os.path.dirname(session_path), "index.sqlite")
+        self.index = None
+        self.tracer = None
+        self.trace_writer = None
+        self.metrics = None
+        # A cli.output.JsonOutput with --json or --jsonl
+        self.output = None
+
+    def acl_check(self, args):
+        """Print the effective permissions of a user or a group on a path, or
+        on a container and its descendants with -R."""
+        client = self.get_client(args)
+        path = args["<path>"]
+        name = args["<principal>"]
+        if not path.startswith("/"):
+            path = client.pwd() + path
+        analyzer = PermissionAnalyzer(client)
+        try:
+            identifiers, administrator = analyzer.principal(name)
+            if args["-R"]:
+                nodes = client.walk(path, ACL_FIELDS, int(args["--jobs"]))
+            else:
+                res = client.get_cdmi(path, ACL_FIELDS)
+                if res.ok() and res.json().get("objectType") == CDMI_CONTAINER:
+                    path = path if path.endswith("/") else path + "/"
+                nodes = [(path, res)]
+        except AuditError as err:
+            self.print_error(str(err))
+            return 1
+        through = ", ".join(sorted(identifiers - {name}))
+        if not self.output:
+            print("Effective permissions of {}{}:".format(
+                name, " (through {})".format(through) if through else ""
+            ))
+            if administrator:
+                print("  {} is an administrator, the ACLs don't apply".format(name))
+        errors = 0
+        for node, res in nodes:
+            if not res.ok():
+                self.print_outcome(node, res)
+                errors += 1
+                continue
+            analyzer.add_node(node, res.json())
+            try:
+                is_object, acemask = analyzer.check(node, name)
+            except AuditError as err:
+                self.print_error(str(err))
+                errors += 1
+                continue
+            level = acemask_to_str(acemask, is_object) or acemask_to_cdmi_str(
+                acemask, is_object
+            )
+            self.print_item(
+                {
+                    "path": node,
+                    "principal": name,
+                    "permissions": level,
+                    "administrator": administrator,
+                },
+                "  {}: {}".format(node, level),
+            )
+        return 1 if errors else 0
 
     def admin_atg(self, args):
         """Add user(s) to a group."""
@@ -104,6 +277,95 @@ class RadonApplication():
             return res.code()
         return 0
 
+    def admin_import(self, args):
+        """Create users and groups and add users to groups from a file.
+
+        The file is compared with the existing users and groups, fetched
+        once, and only the missing changes are applied, in parallel."""
+        client = self.get_client(args)
+        try:
+            spec = load_spec(args["<file>"])
+        except (OSError, ValueError, ProvisionError) as excpt:
+            self.print_error(excpt)
+            return errno.EINVAL
+        res_users = client.list_users()
+        if not res_users.ok():
+            self.print_error(res_users.msg())
+            return res_users.code()
+        res_groups = client.list_groups()
+        if not res_groups.ok():
+            self.print_error(res_groups.msg())
+            return res_groups.code()
+        users = set(res_users.msg())
+        groups = set(res_groups.msg())
+        known_users = sorted(users & set(spec["users"]))
+        known_groups = sorted(groups & set(spec["groups"]))
+        with ThreadPoolExecutor(int(args["--jobs"])) as executor:
+            user_details = {}
+            group_details = {}
+            failed = None
+            for names, fetch, details in (
+                (known_users, client.list_user, user_details),
+                (known_groups, client.list_group, group_details),
+            ):
+                for name, res in zip(names, executor.map(fetch, names)):
+                    if res.ok():
+                        details[name] = res.json()
+                    else:
+                        # The plan would be wrong without the description
+                        self.print_error("Can't read {}: {}".format(name, res.msg()))
+                        failed = res
+            if failed:
+                return failed.code()
+            try:
+                creations, updates = plan_import(
+                    spec, users, groups, user_details, group_details
+                )
+            except ProvisionError as excpt:
+                self.print_error(excpt)
+                return errno.EINVAL
+            if not (creations or updates):
+                self.print_result({"actions": []}, "Nothing to do")
+                return 0
+            if args["--dry-run"]:
+                for action in creations + updates:
+                    self.print_item(
+                        {"action": describe_action(action)}, describe_action(action)
+                    )
+                return 0
+            errors = 0
+            # Memberships and modifications need the users and groups created
+            for batch in (creations, updates):
+                results = executor.map(
+                    lambda action: self.apply_action(client, action), batch
+                )
+                for action, res in zip(batch, results):
+                    if not res.ok():
+                        errors += 1
+                    if self.output:
+                        self.print_outcome(describe_action(action), res, "action")
+                    elif res.ok():
+                        self.print_success(describe_action(action))
+                    else:
+                        self.print_error(
+                            "{}: {}".format(describe_action(action), res.msg())
+                        )
+        return 1 if errors else 0
+
+    def apply_action(self, client, action):
+        """Apply an action planned by ``plan_import``"""
+        if action[0] == "mkgroup":
+            return client.create_group(action[1])
+        if action[0] == "mkuser":
+            _, username, email, is_admin, password = action
+            # Accounts without password can only be used through LDAP
+            return client.create_user(
+                username, email, is_admin, password or random_password(20)
+            )
+        if action[0] == "moduser":
+            return client.mod_user(action[1], action[2])
+        return client.add_user_group(action[1], action[2])
+
     def admin_lg(self, args):
         """List all groups or a specific group if the name is specified"""
         client = self.get_client(args)
@@ -116,22 +378,18 @@ class RadonApplication():
             if not res.ok():
                 self.print_error(res.msg())
                 return res.code()
-            group_info = res.json()
-            members = ", ".join(group_info.get("members", []))
-            print("{0.bold}Group name{0.normal}: {1}".format(
-                self.terminal, group_info.get("name", name)
-            ))
-            print("{0.bold}Group id{0.normal}: {1}".format(
-                self.terminal, group_info.get("uuid", "")
-            ))
-            print("{0.bold}Members{0.normal}: {1}".format(self.terminal, members))
+            self.print_group(res.json(), name)
         else:
             res = client.list_groups()
             if not res.ok():
                 self.print_error(res.msg())
                 return res.code()
+            if args["--all"]:
+                return self.print_details(
+                    client.list_group, res.msg(), self.print_group, GROUP_FIELDS, args
+                )
             for groupname in res.msg():
-                print(groupname)
+                self.print_item({"name": groupname}, groupname)
         return 0
 
     def admin_lu(self, args):
@@ -146,31 +404,18 @@ class RadonApplication():
             if not res.ok():
                 self.print_error(res.msg())
                 return res.code()
-            user_info = res.json()
-            groups = ", ".join([el["name"] for el in user_info.get("groups", [])])
-            print("{0.bold}User name{0.normal}: {1}".format(
-                self.terminal, user_info.get("username", name)
-            ))
-            print("{0.bold}Email{0.normal}: {1}".format(
-                self.terminal, user_info.get("email", "")
-            ))
-            print("{0.bold}User id{0.normal}: {1}".format(
-                self.terminal, user_info.get("uuid", "")
-            ))
-            print("{0.bold}Administrator{0.normal}: {1}".format(
-                self.terminal, user_info.get("administrator", False)
-            ))
-            print("{0.bold}Active{0.normal}: {1}".format(
-                self.terminal, user_info.get("active", False)
-            ))
-            print("{0.bold}Groups{0.normal}: {1}".format(self.terminal, groups))
+            self.print_user(res.json(), name)
         else:
             res = client.list_users()
             if not res.ok():
                 self.print_error(res.msg())
                 return res.code()
+            if args["--all"]:
+                return self.print_details(
+                    client.list_user, res.msg(), self.print_user, USER_FIELDS, args
+                )
             for username in res.msg():
-                print(username)
+                self.print_item({"username": username}, username)
         return 0
 
     def admin_mkgroup(self, args):
@@ -320,6 +565,37 @@ class RadonApplication():
             return res.code()
         return 0
 
+    def bench(self, args):
+        """Run the benchmarks against an in-process mock server."""
+        names = args["<bench>"]
+        known = [name for name, _ in BENCHMARKS]
+        for name in names:
+            if name not in known:
+                self.print_error(
+                    "Unknown benchmark {}, use one of {}".format(name, ", ".join(known))
+                )
+                return errno.EINVAL
+        mock = MockRadonServer(latency=float(args["--latency"]) / 1000)
+        url = mock.start()
+        try:
+            client = RadonClient(url)
+            if args["--max-rate"] or args["--max-bandwidth"] or args["--max-jobs"]:
+                client.configure_throttle(
+                    float(args["--max-rate"] or 0),
+                    parse_size(args["--max-bandwidth"] or "0"),
+                    int(args["--max-jobs"] or 0),
+                )
+            client.tracer = self.tracer
+            if self.metrics:
+                self.metrics.bind(client)
+            for result in run_benchmarks(
+                client, mock, names, int(args["--count"]), parse_size(args["--size"])
+            ):
+                self.print_item(vars(result), result)
+        finally:
+            mock.stop()
+        return 0
+
     def change_dir(self, args):
         "Move into a different container."
         client = self.get_client(args)
@@ -331,8 +607,44 @@ class RadonApplication():
         if res.ok():
             # Save the client for future use
             self.save_client(client)
+            self.print_result({"path": client.pwd()})
         else:
             self.print_error(res.msg())
+            return res.code()
+        return 0
+
+    def cat(self, args):
+        """Write the content of a data object to stdout, as it's received."""
+        path = args["<path>"]
+        client = self.get_client(args)
+        try:
+            cfh = client.open(path)
+        except requests.exceptions.ConnectionError as excpt:
+            self.print_error(
+                "'{0}': Redirection failed - Reference isn't accessible"
+                "".format(excpt.request.url)
+            )
+            return 404
+        if cfh.status_code == 404:
+            self.print_error("'{0}': No such object or container".format(path))
+            return 404
+        elif cfh.status_code not in (200, 206):
+            self.print_error(Response(cfh.status_code, cfh).msg())
+            return cfh.status_code
+        out = sys.stdout.buffer
+        try:
+            for chunk in client.decoded_content(path, cfh):
+                out.write(chunk)
+            out.flush()
+        except CompressionError as err:
+            self.print_error("'{}': {}".format(path, err))
+            return 1
+        except BrokenPipeError:
+            # The reader exited (as head), stop quietly
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, out.fileno())
+        finally:
+            cfh.close()
         return 0
 
     def cdmi(self, args):
@@ -341,8 +653,13 @@ class RadonApplication():
         path = args["<path>"]
         res = client.get_cdmi(path)
         if res.ok():
-            print("{} :".format(client.normalize_cdmi_url(path)))
             path_json = res.json()
+            if self.output:
+                self.output.result(
+                    {key: value for key, value in path_json.items() if key != "value"}
+                )
+                return 0
+            print("{} :".format(client.normalize_cdmi_url(path)))
             for key, value in path_json.items():
                 if key != "value":
                     print("  - {0.bold}{1}{0.normal}: {2}".format(
@@ -350,9 +667,16 @@ class RadonApplication():
                     ))
         else:
             self.print_error(res.msg())
+            return res.code()
+        return 0
 
     def chmod(self, args):
-        "Add or remove ACE to a path."
+        """Add or remove ACE to a path.
+
+        The ACE is merged in the existing ACL, the other ACEs and the
+        metadata are kept. With -R, the descendants which have their own ACE
+        for the group are updated too, the others already inherit the ACE.
+        """
         client = self.get_client(args)
         path = args["<path>"]
         group = args["<group>"]
@@ -368,18 +692,132 @@ class RadonApplication():
             "aceflags": "CONTAINER_INHERIT, OBJECT_INHERIT",
             "acemask": str_to_cdmi_str_acemask(level, False),
         }
-        metadata = {"cdmi_acl": [ace]}
-        res = client.put(path, metadata=metadata)
-        if res.ok():
-            self.print_success(res.msg())
+        fields = ["objectType", "metadata:cdmi_acl"]
+        if not args["-R"]:
+            res = client.get_cdmi(path, fields)
+            if res.ok():
+                if res.json().get("objectType") == CDMI_CONTAINER:
+                    path = path if path.endswith("/") else path + "/"
+                acl = res.json().get("metadata", {}).get("cdmi_acl", [])
+                res = client.set_acl(path, merge_ace(acl, ace))
+            if res.ok():
+                self.print_success("{} access for {} on {}".format(
+                    level if level != "null" else "no", group, path
+                ))
+                return 0
+            self.print_acl_error(res)
+            return res.code()
+
+        updated = unchanged = inherited = errors = 0
+        root = True
+        with ThreadPoolExecutor(int(args["--jobs"])) as executor:
+            futures = {}
+            for node, res in client.walk(path, fields, int(args["--jobs"])):
+                if not res.ok():
+                    self.print_acl_error(res, node)
+                    errors += 1
+                    continue
+                acl = res.json().get("metadata", {}).get("cdmi_acl", [])
+                if not root and not has_own_ace(acl, group):
+                    # The descendant inherits the ACE of the container
+                    inherited += 1
+                    continue
+                root = False
+                merged = merge_ace(acl, ace)
+                if merged == acl:
+                    unchanged += 1
+                    continue
+                futures[executor.submit(client.set_acl, node, merged)] = node
+            for future, node in futures.items():
+                res = future.result()
+                if res.ok():
+                    updated += 1
+                    self.print_outcome(node, res)
+                else:
+                    self.print_acl_error(res, node)
+                    errors += 1
+        summary = "{} updated, {} unchanged, {} inherited, {} errors".format(
+            updated, unchanged, inherited, errors
+        )
+        self.print_summary(summary, errors)
+        return 1 if errors else 0
+
+    def print_acl_error(self, res, path=None):
+        """Print the error of an ACL operation"""
+        if res.code() == 403:
+            msg = "You don't have the rights to access ACL for this collection"
         else:
-            if res.code() == 403:
-                self.print_error(
-                    "You don't have the rights to access ACL for this collection"
-                )
+            msg = str(res.msg())
+        if path and self.output:
+            self.output.item({"path": path, "code": res.code(), "error": msg})
+            return
+        if path:
+            msg = "{}: {}".format(path, msg)
+        self.print_error(msg)
+
+    def cp(self, args, move=False):
+        """Copy or move a data object, or a container with -R.
+
+        The server copies the data when it supports the CDMI copy and move
+        operations, otherwise the data objects are streamed through the
+        client in parallel (and the source is deleted once copied for a move).
+        """
+        client = self.get_client(args)
+        src = args["<src>"]
+        dest = args["<dest>"]
+        if not src.startswith("/"):
+            src = client.pwd() + src
+        if not dest.startswith("/"):
+            dest = client.pwd() + dest
+        res = client.get_cdmi(src, ["objectType", "objectName"])
+        if not res.ok():
+            self.print_error(res.msg())
+            return res.code()
+        info = res.json()
+        is_container = info.get("objectType") == CDMI_CONTAINER
+        if is_container:
+            if not args["-R"]:
+                self.print_error("'{}' is a container (use -R)".format(src))
+                return 1
+            src = src if src.endswith("/") else src + "/"
+        if dest.endswith("/"):
+            # Copy in an existing container, with the same name
+            dest = dest + info.get("objectName", "").rstrip("/")
+        if is_container:
+            dest = dest.rstrip("/") + "/"
+            if dest.startswith(src):
+                self.print_error("Cannot copy '{}' into itself".format(src))
+                return 1
+        feature = "cdmi_{}_{}".format(
+            "move" if move else "copy", "container" if is_container else "dataobject"
+        )
+        if client.capabilities().get(feature) == "true":
+            res = client.copy(src, dest, move)
+            if not res.ok():
+                self.print_error(res.msg())
+                return res.code()
+            self.print_result({"path": dest}, dest)
+            return 0
+
+        copied = errors = 0
+        for path, res in client.copy_tree(src, dest, int(args["--jobs"])):
+            if res.ok():
+                copied += 1
             else:
+                errors += 1
+            self.print_outcome(path, res)
+        if errors:
+            self.print_summary("{} copied, {} errors{}".format(
+                copied, errors, ", the source is kept" if move else ""
+            ), errors)
+            return 1
+        if move:
+            res = client.delete(src)
+            if not res.ok():
                 self.print_error(res.msg())
-            return res.code()
+                return res.code()
+        if not self.output:
+            print(dest)
         return 0
 
     def create_client(self, args):
@@ -390,6 +828,9 @@ class RadonApplication():
             self.print_error("You need to be connected to access the server.")
             sys.exit(-1)
         client = RadonClient(url)
+        client.tracer = self.tracer
+        if self.metrics:
+            self.metrics.bind(client)
         # Test for client connection errors here
         res = client.get_cdmi("/")
         if res.code() in [0, 401, 403]:
@@ -399,7 +840,7 @@ class RadonApplication():
             return client
         else:
             self.print_error(res.msg())
-            sys.exit(res.code())
+            sys.exit(exit_code(res.code()))
 
     def exit(self):
         "Close CDMI client session"
@@ -408,9 +849,68 @@ class RadonApplication():
         except OSError:
             # No saved client to log out
             pass
+        self.print_result({"message": "Session closed"})
+
+    def find(self, args):
+        """Print the paths of a container and its descendants which match the
+        criteria, read from the archive or from the index with --index."""
+        client = self.get_client(args)
+        path = args["<path>"] or client.pwd()
+        if not path.startswith("/"):
+            path = client.pwd() + path
+        object_type = args["--type"]
+        if object_type not in (None, "container", "object"):
+            self.print_error(
+                "Unknown type {}, use container or object".format(object_type)
+            )
+            return errno.EINVAL
+        meta = None
+        if args["--meta"]:
+            if "=" not in args["--meta"]:
+                self.print_error("Invalid metadata {}, use name=value".format(
+                    args["--meta"]
+                ))
+                return errno.EINVAL
+            meta = tuple(args["--meta"].split("=", 1))
+        if args["--index"]:
+            if client.index is None or client.index.lookup(path) is None:
+                self.print_error(
+                    "'{}' isn't indexed, use radon index refresh".format(path)
+                )
+                return errno.ENOENT
+            found = client.index.find(path, args["--name"], object_type, meta)
+            for node, container, size, mtime in found:
+                self.print_item({
+                    "path": node,
+                    "objectType": CDMI_CONTAINER if container else CDMI_OBJECT,
+                    "size": size,
+                    "mtime": mtime,
+                }, node)
+            return 0
+        errors = 0
+        fields = ["objectType", "metadata", "valuerange"]
+        for node, res in client.walk(path, fields, int(args["--jobs"])):
+            if not res.ok():
+                errors += 1
+                self.print_outcome(node, res)
+                continue
+            info = res.json()
+            container = info.get("objectType") == CDMI_CONTAINER
+            metadata = info.get("metadata", {})
+            if node_matches(node, container, metadata, args["--name"], object_type,
+                            meta):
+                self.print_item({
+                    "path": node,
+                    "objectType": info.get("objectType"),
+                    "size": None if container else value_size(info),
+                    "mtime": metadata.get("cdmi_mtime"),
+                }, node)
+        return 1 if errors else 0
 
     def get(self, args):
         "Fetch a data object from the archive to a local file."
+        if args["--tar"]:
+            return self.get_tar(args)
         src = args["<src>"]
         # Determine local filename
         if args["<dest>"]:
@@ -444,13 +944,117 @@ class RadonApplication():
                 "".format(excpt.request.url)
             )
             return 404
-        lfh = open(localpath, "wb")
-        for chunk in cfh.iter_content(8192):
-            lfh.write(chunk)
-        lfh.close()
-        print(localpath)
+        size = int(cfh.headers.get("Content-Length") or 0)
+        stats = TransferStats(size or None, 1)
+        try:
+            with open(localpath, "wb") as lfh, self.progress(stats):
+                if size > RANGE_THRESHOLD and self.fetch_ranges(
+                    client, src, size, lfh, cfh, stats, args
+                ):
+                    self.print_result({"path": localpath}, localpath)
+                    return 0
+                stats.begin(src, size or None)
+                for chunk in client.decoded_content(src, cfh):
+                    lfh.write(chunk)
+                    stats.add(len(chunk), name=src)
+        except (CompressionError, TransferError) as err:
+            self.print_error("'{}': {}".format(src, err))
+            return 1
+        finally:
+            cfh.close()
+        self.print_result({"path": localpath}, localpath)
         return 0
 
+    def fetch_ranges(self, client, src, size, lfh, cfh, stats, args):
+        """Download a large data object in ranges fetched in parallel, return
+        False if it has to be downloaded with the response already opened
+        (the object was uploaded compressed or the archive doesn't support
+        ranges)."""
+        res = client.get_cdmi(
+            src, ["metadata:" + ENCODING_METADATA], held_slot=cfh.held_slot
+        )
+        if not res.ok() or ENCODING_METADATA in res.json().get("metadata", {}):
+            return False
+        # The ranges are requested on other connections
+        cfh.close()
+        with TransferScheduler(int(args["--jobs"]), stats=stats) as scheduler:
+            try:
+                for chunk in scheduler.iter_ranges(client, src, size):
+                    lfh.write(chunk)
+            except RangeNotSupported:
+                cfh = client.open(src)
+                try:
+                    stats.begin(src, size)
+                    for chunk in client.decoded_content(src, cfh):
+                        lfh.write(chunk)
+                        stats.add(len(chunk), name=src)
+                finally:
+                    cfh.close()
+        return True
+
+    def get_tar(self, args):
+        """Download a container and its descendants as a single tar archive
+        (- for stdout), compressed if the name ends with .gz, .tgz, .zst or
+        .tzst or with --compress. The metadata and mimetypes are kept in PAX
+        headers, ``put --tar`` restores them."""
+        client = self.get_client(args)
+        src = args["<src>"]
+        if not src.startswith("/"):
+            src = client.pwd() + src
+        res = client.get_cdmi(src, ["objectType"])
+        if not res.ok():
+            self.print_error("'{0}': No such object or container".format(src))
+            return 404
+        if res.json().get("objectType") == CDMI_CONTAINER and not src.endswith("/"):
+            src += "/"
+        name = src.rstrip("/").rsplit("/", 1)[-1] or "radon"
+        localpath = args["<dest>"] or name + ".tar"
+        if localpath != "-" and os.path.exists(localpath):
+            if os.path.isdir(localpath):
+                self.print_error("'{0}' is a directory".format(localpath))
+                return errno.EISDIR
+            if not args["--force"]:
+                self.print_error(
+                    "File '{0}' exists, --force option not used".format(localpath)
+                )
+                return errno.EEXIST
+        codec = client.compression
+        if localpath != "-" and not args["--compress"]:
+            codec = codec_from_name(localpath)
+        out = sys.stdout.buffer if localpath == "-" else open(localpath, "wb")
+        # The messages mustn't be mixed with the archive written to stdout
+        messages = redirect_stdout(sys.stderr if localpath == "-" else sys.stdout)
+        if self.output and localpath == "-":
+            self.output.stream = sys.stderr
+        objects = errors = 0
+        scheduler = TransferScheduler(int(args["--jobs"]))
+        progress = self.progress(scheduler.stats, localpath == "-")
+        with messages:
+            try:
+                with scheduler, progress:
+                    fileobj = CompressedWriter(out, codec) if codec else out
+                    for path, res in export_tar(client, src, fileobj, scheduler):
+                        if res.ok():
+                            objects += 1
+                        else:
+                            errors += 1
+                        with progress.suspended():
+                            self.print_outcome(path, res)
+                    if codec:
+                        fileobj.close()
+            except (CompressionError, TransferError, OSError) as err:
+                self.print_error(str(err))
+                return 1
+            finally:
+                if out is not sys.stdout.buffer:
+                    out.close()
+            summary = "{} objects archived in {}, {} errors ({})".format(
+                objects, localpath, errors, scheduler.stats
+            )
+            if errors or localpath != "-":
+                self.print_summary(summary, errors)
+        return 1 if errors else 0
+
     def get_client(self, args):
         """Return a RadonClient.
 
@@ -469,9 +1073,69 @@ class RadonApplication():
             if client.url != args["--url"]:
                 # Init a fresh RadonClient
                 client = self.create_client(args)
-        client.session = requests.Session()
+        if args["--max-rate"] or args["--max-bandwidth"] or args["--max-jobs"]:
+            client.configure_throttle(
+                float(args["--max-rate"] or 0),
+                parse_size(args["--max-bandwidth"] or "0"),
+                int(args["--max-jobs"] or 0),
+            )
+        if args["--compress"]:
+            codec = args["--compress"].lower()
+            if codec == "none":
+                client.compression = None
+            else:
+                try:
+                    check_codec(codec)
+                except CompressionError as err:
+                    self.print_error(str(err))
+                    sys.exit(1)
+                client.compression = codec
+        client.tracer = self.tracer
+        if self.metrics:
+            self.metrics.bind(client)
+        client.index = self.open_index(client)
         return client
 
+    def index_ls(self, client, path):
+        """List a container from the index, as ``RadonClient.ls``"""
+        if client.index is None:
+            return Response(404, "No index, use radon index refresh")
+        if path is None:
+            path = client.pwd()
+        elif not path.startswith("/"):
+            path = client.pwd() + path
+        return client.index.ls(path)
+
+    def index_refresh(self, args):
+        """Index a container and its descendants, the paths already indexed
+        are revalidated with conditional requests."""
+        client = self.get_client(args)
+        path = args["<path>"] or client.pwd()
+        if not path.startswith("/"):
+            path = client.pwd() + path
+        try:
+            index = self.open_index(client, create=True)
+        except NamespaceIndexError as err:
+            self.print_error("{} ({})".format(err, self.index_path))
+            return errno.EINVAL
+        counts = dict.fromkeys(("new", "changed", "unchanged", "removed"), 0)
+        errors = 0
+        for node, status in index.refresh(client, path, int(args["--jobs"])):
+            if isinstance(status, Response):
+                errors += 1
+                self.print_outcome(node, status)
+            else:
+                counts[status] += 1
+        if self.output:
+            self.print_result(dict(counts, path=path, errors=errors))
+        else:
+            self.print_summary(
+                "{} indexed: {new} new, {changed} changed, {unchanged} unchanged, "
+                "{removed} removed, {} errors".format(path, errors, **counts),
+                errors,
+            )
+        return 1 if errors else 0
+
     def init(self, args):
         """Initialize a CDMI client session.
 
@@ -492,11 +1156,17 @@ class RadonApplication():
                 password = getpass("Password: ")
 
             res = client.authenticate(username, password)
-            if res.ok():
+            if res.ok() and self.output:
+                self.output.result({"message": res.msg(), "username": username})
+            elif res.ok():
                 print(
                     "{0.bold_green}Success{0.normal} - {1} as "
                     "{0.bold}{2}{0.normal}".format(self.terminal, res.msg(), username)
                 )
+            elif self.output:
+                self.print_error(res.msg())
+                # Failed to log in
+                return res.code()
             else:
                 print("{0.bold_red}Failed{0.normal} - {1}".format(
                     self.terminal, res.msg()
@@ -504,6 +1174,8 @@ class RadonApplication():
                 # Failed to log in
                 # Exit without saving client
                 return res.code()
+        elif self.output:
+            self.output.result({"message": "Anonymous access", "username": None})
         else:
             print(
                 "{0.bold_green}Connected{0.normal} -"
@@ -520,7 +1192,12 @@ class RadonApplication():
             path = args["<path>"]
         else:
             path = None
-        res = client.ls(path)
+        if args["--index"]:
+            res = self.index_ls(client, path)
+        else:
+            res = client.ls(path)
+        if res.ok() and self.output:
+            return self.ls_records(client, path, res.json(), args["-a"])
         if res.ok():
             cdmi_info = res.json()
             pwd = client.pwd()
@@ -536,11 +1213,11 @@ class RadonApplication():
                 metadata = cdmi_info.get("metadata", {})
                 cdmi_acl = metadata.get("cdmi_acl", [])
                 if cdmi_acl:
-                    for ace in cdmi_acl:
-                        print("  ACL - {}: {}".format(
-                            ace["identifier"],
-                            cdmi_str_to_str_acemask(ace["acemask"], False),
-                        ))
+                    levels = cdmi_strs_to_str_acemasks(
+                        [ace["acemask"] for ace in cdmi_acl], False
+                    )
+                    for ace, level in zip(cdmi_acl, levels):
+                        print("  ACL - {}: {}".format(ace["identifier"], level))
                 else:
                     print("  ACL: No ACE defined")
 
@@ -558,6 +1235,43 @@ class RadonApplication():
             self.print_error(res.msg())
             return res.code()
 
+    def ls_records(self, client, path, cdmi_info, acl):
+        """List a container as JSON records, the container itself is listed
+        first with its ACL if ``acl`` is set"""
+        if path is None:
+            path = client.pwd()
+        elif not path.startswith("/"):
+            path = client.pwd() + path
+        if cdmi_info["objectType"] != CDMI_CONTAINER:
+            self.output.item({
+                "path": path,
+                "name": cdmi_info["objectName"],
+                "objectType": cdmi_info["objectType"],
+            })
+            return 0
+        path = path if path.endswith("/") else path + "/"
+        if acl:
+            cdmi_acl = cdmi_info.get("metadata", {}).get("cdmi_acl", [])
+            levels = cdmi_strs_to_str_acemasks(
+                [ace["acemask"] for ace in cdmi_acl], False
+            )
+            self.output.item({
+                "path": path,
+                "name": cdmi_info.get("objectName", "/"),
+                "objectType": CDMI_CONTAINER,
+                "acl": [
+                    {"identifier": ace["identifier"], "permissions": level}
+                    for ace, level in zip(cdmi_acl, levels)
+                ],
+            })
+        for child in sorted(cdmi_info["children"], key=methodcaller("lower")):
+            self.output.item({
+                "path": path + child,
+                "name": child,
+                "objectType": CDMI_CONTAINER if child.endswith("/") else CDMI_OBJECT,
+            })
+        return 0
+
     def meta_add(self, args, replace=False):
         """Add metadata"""
         client = self.get_client(args)
@@ -584,10 +1298,15 @@ class RadonApplication():
                     metadata[meta_name] = [metadata[meta_name], meta_value]
         else:
             metadata[meta_name] = meta_value
-        res = client.put(path, metadata=metadata)
+        res = client.put_cdmi(
+            path,
+            json.dumps({"metadata": {meta_name: metadata[meta_name]}}),
+            ["metadata:" + meta_name],
+        )
         if not res.ok():
             self.print_error(res.msg())
             return res.code()
+        self.print_result({"path": path, "metadata": metadata})
         return 0
 
     def meta_ls(self, args):
@@ -608,7 +1327,10 @@ class RadonApplication():
         if meta_name:
             # List 1 field
             if meta_name in cdmi_info["metadata"]:
-                print("{0}:{1}".format(meta_name, cdmi_info["metadata"][meta_name]))
+                val = cdmi_info["metadata"][meta_name]
+                self.print_item(
+                    {"name": meta_name, "value": val}, "{0}:{1}".format(meta_name, val)
+                )
         else:
             # List everything
             for attr, val in cdmi_info["metadata"].items():
@@ -617,9 +1339,13 @@ class RadonApplication():
                     continue
                 if isinstance(val, list):
                     for v in val:
-                        print("{0}:{1}".format(attr, v))
+                        self.print_item(
+                            {"name": attr, "value": v}, "{0}:{1}".format(attr, v)
+                        )
                 else:
-                    print("{0}:{1}".format(attr, val))
+                    self.print_item(
+                        {"name": attr, "value": val}, "{0}:{1}".format(attr, val)
+                    )
         return 0
 
     def meta_rm(self, args):
@@ -655,10 +1381,17 @@ class RadonApplication():
             except KeyError:
                 # Metadata not defined
                 pass
-        res = client.put(path, metadata=metadata)
+        # Only the modified field is sent, it's removed if it's not in the body
+        update = {}
+        if meta_name in metadata:
+            update[meta_name] = metadata[meta_name]
+        res = client.put_cdmi(
+            path, json.dumps({"metadata": update}), ["metadata:" + meta_name]
+        )
         if not res.ok():
             self.print_error(res.msg())
             return res.code()
+        self.print_result({"path": path, "metadata": metadata})
         return 0
 
     def mkdir(self, args):
@@ -671,24 +1404,192 @@ class RadonApplication():
         res = client.mkdir(path)
         if not res.ok():
             self.print_error(res.msg())
+            return res.code()
+        self.print_result({"path": path})
+        return 0
+
+    def open_index(self, client, create=False):
+        """Return the index of the namespace of the archive of the client, None
+        if it doesn't exist (unless ``create`` is set) or if it describes
+        another archive (a NamespaceIndexError is raised if ``create`` is
+        set)."""
+        if self.index is None:
+            if not create and not os.path.exists(self.index_path):
+                return None
+            if not os.path.exists(os.path.dirname(self.index_path)):
+                os.makedirs(os.path.dirname(self.index_path))
+            index = NamespaceIndex(self.index_path)
+            try:
+                index.bind(client.url)
+            except NamespaceIndexError:
+                index.close()
+                if create:
+                    raise
+                return None
+            self.index = index
+        return self.index
+
+    def print_details(self, fetch, names, printer, fields, args):
+        """Fetch the description of users or groups in parallel and print
+        them in order, as they arrive.
+
+        :arg fetch: Client method which returns the description of a name
+        :arg names: List of user or group names
+        :arg printer: Method which prints a description in text format
+        :arg fields: Fields of the descriptions for the CSV format
+        :arg args: Arguments of the command (--format, --jobs)
+
+        """
+        fmt = "records" if self.output else args["--format"]
+        if fmt not in ("text", "json", "csv", "records"):
+            self.print_error("Unknown format {}, use text, json or csv".format(fmt))
+            return errno.EINVAL
+        errors = 0
+        first = True
+        if fmt == "json":
+            sys.stdout.write("[")
+        elif fmt == "csv":
+            writer = csv.writer(sys.stdout)
+            writer.writerow(fields)
+        with ThreadPoolExecutor(int(args["--jobs"])) as executor:
+            for name, res in zip(names, executor.map(fetch, names)):
+                if not res.ok():
+                    errors += 1
+                    if fmt in ("text", "records"):
+                        self.print_error("{}: {}".format(name, res.msg()))
+                    else:
+                        print("Error - {}: {}".format(name, res.msg()), file=sys.stderr)
+                    continue
+                info = res.json()
+                if fmt == "text":
+                    if not first:
+                        print()
+                    printer(info, name)
+                elif fmt == "json":
+                    separator = "" if first else ","
+                    sys.stdout.write("{}\n  {}".format(separator, json.dumps(info)))
+                elif fmt == "records":
+                    self.output.item(info)
+                else:
+                    writer.writerow([csv_value(info.get(field, "")) for field in fields])
+                first = False
+        if fmt == "json":
+            sys.stdout.write("\n]\n")
+        return 1 if errors else 0
 
     def print_error(self, msg):
-        """Display an error message."""
+        """Display an error message, as a JSON record on stderr with --json or
+        --jsonl."""
+        if self.output:
+            print(json.dumps({"error": msg}, default=json_default), file=sys.stderr)
+            return
         print("{0.bold_red}Error{0.normal} - {1}".format(self.terminal, msg))
 
+    def print_group(self, group_info, name):
+        """Display the description of a group."""
+        if self.output:
+            self.output.result(group_info)
+            return
+        members = ", ".join(group_info.get("members", []))
+        print("{0.bold}Group name{0.normal}: {1}".format(
+            self.terminal, group_info.get("name", name)
+        ))
+        print("{0.bold}Group id{0.normal}: {1}".format(
+            self.terminal, group_info.get("uuid", "")
+        ))
+        print("{0.bold}Members{0.normal}: {1}".format(self.terminal, members))
+
+    def print_item(self, record, text):
+        """Display an entry of a listing, ``record`` is written with --json or
+        --jsonl."""
+        if self.output:
+            self.output.item(record)
+        else:
+            print(text)
+
+    def print_outcome(self, path, res, key="path"):
+        """Report the outcome of an object of a bulk command. With --json or
+        --jsonl there is a record per object, otherwise only the errors are
+        displayed."""
+        if self.output:
+            record = {key: path, "code": res.code()}
+            if not res.ok():
+                record["error"] = res.msg()
+            self.output.item(record)
+        elif not res.ok():
+            self.print_error("{}: {}".format(path, res.msg()))
+
+    def print_result(self, record, text=None):
+        """Display the result of a command, ``record`` is written with --json
+        or --jsonl."""
+        if self.output:
+            self.output.result(record)
+        elif text is not None:
+            print(text)
+
     def print_success(self, msg):
         """Display a success message."""
+        if self.output:
+            self.output.result({"message": msg})
+            return
         print("{0.bold_green}Success{0.normal} - {1}".format(self.terminal, msg))
 
+    def print_summary(self, summary, errors):
+        """Display the summary of a bulk command. It's omitted with --json or
+        --jsonl, the records already describe every object."""
+        if self.output:
+            return
+        if errors:
+            self.print_error(summary)
+        else:
+            self.print_success(summary)
+
+    def print_user(self, user_info, name):
+        """Display the description of a user."""
+        if self.output:
+            self.output.result(user_info)
+            return
+        groups = ", ".join([el["name"] for el in user_info.get("groups", [])])
+        print("{0.bold}User name{0.normal}: {1}".format(
+            self.terminal, user_info.get("username", name)
+        ))
+        print("{0.bold}Email{0.normal}: {1}".format(
+            self.terminal, user_info.get("email", "")
+        ))
+        print("{0.bold}User id{0.normal}: {1}".format(
+            self.terminal, user_info.get("uuid", "")
+        ))
+        print("{0.bold}Administrator{0.normal}: {1}".format(
+            self.terminal, user_info.get("administrator", False)
+        ))
+        print("{0.bold}Active{0.normal}: {1}".format(
+            self.terminal, user_info.get("active", False)
+        ))
+        print("{0.bold}Groups{0.normal}: {1}".format(self.terminal, groups))
+
     def print_warning(self, msg):
         """Display a warning message."""
+        if self.output:
+            print(json.dumps({"warning": msg}, default=json_default), file=sys.stderr)
+            return
         print("{0.bold_blue}Warning{0.normal} - {1}".format(self.terminal, msg))
 
+    def progress(self, stats, data_on_stdout=False):
+        """Return a ``ProgressRenderer`` of transfers, on stderr when stdout
+        carries the data of the command"""
+        if data_on_stdout or self.output:
+            return ProgressRenderer(stats, sys.stderr)
+        return ProgressRenderer(stats, sys.stdout, self.terminal)
+
     def put(self, args):
         "Put a file to a path."
         if args["--ref"]:
             return self.put_reference(args)
         src = args["<src>"]
+        if args["--tar"]:
+            return self.put_tar(args)
+        if src == "-":
+            return self.put_stdin(args)
         # Absolutize local path
         local_path = os.path.abspath(src)
         if args["<dest>"]:
@@ -701,36 +1602,140 @@ class RadonApplication():
             return errno.ENOENT
         with open(local_path, "rb") as fh:
             client = self.get_client(args)
-            # To avoid reading large files into memory,
-            # client.put() accepts file-like objects
-            res = client.put(dest, fh, mimetype=args["--mimetype"])
+            size = os.fstat(fh.fileno()).st_size
+            stats = TransferStats(size, 1)
+            stats.begin(local_path, size)
+            # The bytes are counted as they're sent, the file is still sent
+            # without copy
+            body = ProgressFile(fh, lambda nbytes: stats.add(nbytes, name=local_path))
+            with self.progress(stats):
+                # To avoid reading large files into memory,
+                # client.put() accepts file-like objects
+                res = client.put(dest, body, mimetype=args["--mimetype"])
+            stats.end(local_path)
             if res.ok():
+                stats.add(objects=1)
                 cdmi_info = res.json()
-                print(cdmi_info["parentURI"] + cdmi_info["objectName"])
+                path = cdmi_info["parentURI"] + cdmi_info["objectName"]
+                self.print_result({"path": path}, path)
             else:
                 self.print_error(res.msg())
+                return res.code()
         return 0
 
     def put_reference(self, args):
         "Create a reference at path dest with the url."
+        if args["--manifest"]:
+            return self.put_manifest(args)
         dest = args["<dest>"]
         url = args["<url>"]
         client = self.get_client(args)
-        dict_data = {"reference": url}
-        if args["--mimetype"]:
-            dict_data["mimetype"] = args["--mimetype"]
-        data = json.dumps(dict_data)
-        res = client.put_cdmi(dest, data)
+        res = client.put_reference(dest, url, args["--mimetype"])
         if res.ok():
             cdmi_info = res.json()
-            print(cdmi_info["parentURI"] + cdmi_info["objectName"])
-        else:
-            self.print_error(res.msg())
+            path = cdmi_info["parentURI"] + cdmi_info["objectName"]
+            self.print_result({"path": path}, path)
+            return 0
+        self.print_error(res.msg())
+        return res.code()
+
+    def put_stdin(self, args):
+        """Upload the standard input to a data object, without buffering it.
+        The size isn't known so the upload is chunked."""
+        dest = args["<dest>"]
+        if not dest:
+            self.print_error("A destination is needed to upload stdin")
+            return 1
+        client = self.get_client(args)
+        data = read_chunks(sys.stdin.buffer)
+        res = client.put(dest, data, mimetype=args["--mimetype"])
+        if res.ok():
+            cdmi_info = res.json()
+            path = cdmi_info["parentURI"] + cdmi_info["objectName"]
+            self.print_result({"path": path}, path)
+            return 0
+        self.print_error(res.msg())
+        return res.code()
+
+    def put_tar(self, args):
+        """Upload the content of a tar archive (- for stdin) in a container,
+        the archive is unpacked on the fly without writing on the disk."""
+        src = args["<src>"]
+        client = self.get_client(args)
+        dest = args["<dest>"] or client.pwd()
+        if not dest.startswith("/"):
+            dest = client.pwd() + dest
+        if not dest.endswith("/"):
+            dest += "/"
+        objects = skipped = errors = 0
+        try:
+            fileobj = sys.stdin.buffer if src == "-" else open(src, "rb")
+        except OSError as err:
+            self.print_error(str(err))
+            return errno.ENOENT
+        scheduler = TransferScheduler(int(args["--jobs"]))
+        try:
+            progress = self.progress(scheduler.stats)
+            with scheduler, progress:
+                for path, res in ingest_tar(client, fileobj, dest, scheduler):
+                    if res is None:
+                        skipped += 1
+                        with progress.suspended():
+                            self.print_item(
+                                {"path": path, "code": 0, "skipped": True},
+                                "{}: not a regular file, skipped".format(path),
+                            )
+                        continue
+                    if res.ok():
+                        objects += 1
+                    else:
+                        errors += 1
+                    with progress.suspended():
+                        self.print_outcome(path, res)
+        except tarfile.TarError as err:
+            self.print_error("Invalid archive: {}".format(err))
+            return 1
+        finally:
+            if fileobj is not sys.stdin.buffer:
+                fileobj.close()
+        summary = "{} objects uploaded to {}, {} skipped, {} errors ({})".format(
+            objects, dest, skipped, errors, scheduler.stats
+        )
+        self.print_summary(summary, errors)
+        return 1 if errors else 0
+
+    def put_manifest(self, args):
+        """Create the references listed in a manifest, in parallel.
+
+        The conflicts with existing objects and the other errors are reported
+        without stopping the registration.
+        """
+        client = self.get_client(args)
+        entries = load_manifest(args["--manifest"])
+        created = conflicts = errors = 0
+        try:
+            results = register_references(client, entries, int(args["--jobs"]))
+            for entry, res in results:
+                if res.ok():
+                    created += 1
+                elif res.code() == 409:
+                    conflicts += 1
+                else:
+                    errors += 1
+                self.print_outcome(entry["dest"], res)
+        except (ManifestError, OSError) as err:
+            self.print_error(str(err))
+            return 1
+        summary = "{} references created, {} conflicts, {} errors".format(
+            created, conflicts, errors
+        )
+        self.print_summary(summary, errors)
+        return 1 if errors else 0
 
     def pwd(self, args):
         """Print working directory"""
         client = self.get_client(args)
-        print(client.pwd())
+        self.print_result({"path": client.pwd()}, client.pwd())
 
     def rm(self, args):
         """Remove a data object or a collection.
@@ -760,6 +1765,10 @@ class RadonApplication():
                 cdmi_info["parentURI"], cdmi_info["objectName"]
             )
             return self.rm(args)
+        if not res.ok():
+            self.print_error(res.msg())
+            return res.code()
+        self.print_result({"path": path})
         return 0
 
     def save_client(self, client):
@@ -770,17 +1779,48 @@ class RadonApplication():
         with open(self.session_path, "wb") as fh:
             pickle.dump(client, fh, pickle.HIGHEST_PROTOCOL)
 
+    def start_tracing(self, args):
+        """Record the requests sent to the server if --stats, --trace or
+        --metrics-* are used."""
+        metrics = args["--metrics-port"] or args["--metrics-file"]
+        if not (args["--stats"] or args["--trace"] or metrics):
+            return
+        # The statistics by operation are only kept for --stats, the trace
+        # file and the metrics only need the hooks
+        self.tracer = Tracer(keep_stats=bool(args["--stats"]))
+        if args["--trace"]:
+            self.trace_writer = JsonlTraceWriter(args["--trace"])
+            self.tracer.add_hook(self.trace_writer)
+        if metrics:
+            self.metrics = MetricsRegistry()
+            self.metrics.add_cache("normalize_path", normalize_path_cached.cache_info)
+            self.tracer.add_hook(self.metrics.observe)
+        if args["--metrics-port"]:
+            self.metrics.serve(int(args["--metrics-port"]))
+
+    def stop_tracing(self, args):
+        """Close the trace file, print the statistics if --stats is used and
+        write the metrics if --metrics-file is used."""
+        if self.trace_writer:
+            self.trace_writer.close()
+        if self.tracer and args["--stats"]:
+            print(self.tracer.summary(), file=sys.stderr)
+        if self.metrics:
+            if args["--metrics-file"]:
+                self.metrics.write_textfile(args["--metrics-file"])
+            self.metrics.shutdown()
+
     def whoami(self, args):
         """Print name of the user"""
         client = self.get_client(args)
-        print(client.whoami() + " - " + client.url)
+        self.print_result(
+            {"username": client.whoami(), "url": client.url},
+            client.whoami() + " - " + client.url,
+        )
 
 
-def main():
-    """Main function"""
-    arguments = docopt(__doc_opt__, version="Radon CLI {}".format(cli.__version__))
-    app = RadonApplication(SESSION_PATH)
-
+def dispatch(app, arguments):
+    """Call the method of the application for the command"""
     if arguments["init"]:
         return app.init(arguments)
 
@@ -794,6 +1834,10 @@ def main():
         elif arguments["rm"]:
             return app.meta_rm(arguments)
 
+    elif arguments["acl"]:
+        if arguments["check"]:
+            return app.acl_check(arguments)
+
     elif arguments["admin"]:
         if arguments["lu"]:
             return app.admin_lu(arguments)
@@ -815,15 +1859,26 @@ def main():
             return app.admin_atg(arguments)
         if arguments["rfg"]:
             return app.admin_rfg(arguments)
+        if arguments["import"]:
+            return app.admin_import(arguments)
 
     elif arguments["chmod"]:
         return app.chmod(arguments)
+    elif arguments["cp"]:
+        return app.cp(arguments)
+    elif arguments["mv"]:
+        return app.cp(arguments, move=True)
     elif arguments["exit"]:
         return app.exit()
     elif arguments["pwd"]:
         return app.pwd(arguments)
     elif arguments["ls"]:
         return app.ls(arguments)
+    elif arguments["find"]:
+        return app.find(arguments)
+    elif arguments["index"]:
+        if arguments["refresh"]:
+            return app.index_refresh(arguments)
     elif arguments["cd"]:
         return app.change_dir(arguments)
     elif arguments["cdmi"]:
@@ -834,13 +1889,38 @@ def main():
         return app.put(arguments)
     elif arguments["get"]:
         return app.get(arguments)
+    elif arguments["cat"]:
+        return app.cat(arguments)
     elif arguments["rm"]:
         return app.rm(arguments)
     elif arguments["whoami"]:
         return app.whoami(arguments)
+    elif arguments["bench"]:
+        return app.bench(arguments)
 
     return 0
 
 
+def main():
+    """Main function"""
+    arguments = docopt(__doc_opt__, version="Radon CLI {}".format(cli.__version__))
+    app = RadonApplication(SESSION_PATH)
+    if arguments["--json"] or arguments["--jsonl"]:
+        app.output = JsonOutput(sys.stdout, arguments["--jsonl"])
+    app.start_tracing(arguments)
+    code = 1
+    try:
+        code = dispatch(app, arguments)
+    except requests.exceptions.ConnectionError as excpt:
+        app.print_error("Unable to connect: {}".format(excpt))
+        code = 503
+    finally:
+        if app.output:
+            app.output.close(failed=bool(code))
+        app.stop_tracing(arguments)
+    # The exit code is stable whatever the output format
+    return exit_code(code)
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
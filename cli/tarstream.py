@@ -0,0 +1,423 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import itertools
+import json
+import posixpath
+import tarfile
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cli.client import CDMI_CONTAINER, READ_AHEAD, Response, read_chunks
+from cli.compression import ENCODING_METADATA
+from cli.jsonbackend import dumps, loads
+from cli.transfer import ChunkReader, RangeNotSupported, TransferError
+
+# Members larger than this are streamed from or to the archive, the smaller
+# ones are buffered and transferred in parallel
+INLINE_SIZE = 8 * 1024 * 1024
+
+# PAX headers which keep the CDMI metadata and mimetype in an archive
+PAX_METADATA = "RADON.metadata"
+PAX_MIMETYPE = "RADON.mimetype"
+
+EXPORT_FIELDS = ["objectType", "metadata", "mimetype", "valuerange"]
+
+
+def member_path(name):
+    """Return the relative path of a tar member in the archive namespace
+    ("" for the root of the archive), None if it would escape the
+    destination container"""
+    parts = name.replace("\\", "/").split("/")
+    if ".." in parts:
+        return None
+    return posixpath.normpath("/" + "/".join(parts)).lstrip("/")
+
+
+def restore_metadata(client, path, pax_headers):
+    """Set the metadata saved in the PAX headers of a member by
+    ``export_tar``, only the saved fields are updated.
+
+    :returns: The response of the update, None if there's nothing to update
+    :rtype: Response
+
+    """
+    if PAX_METADATA not in pax_headers:
+        return None
+    try:
+        metadata = loads(pax_headers[PAX_METADATA])
+    except ValueError:
+        return Response(400, "Invalid {} header".format(PAX_METADATA))
+    if not isinstance(metadata, dict):
+        return Response(400, "Invalid {} header".format(PAX_METADATA))
+    if not metadata:
+        return None
+    fields = ["metadata:{}".format(key) for key in metadata]
+    return client.put_cdmi(path, dumps({"metadata": metadata}), fields)
+
+
+def ingest_tar(client, fileobj, dest, scheduler, inline_size=INLINE_SIZE):
+    """Upload the members of a tar stream as they are read.
+
+    The archive is read sequentially (it can be a pipe). Containers are
+    created when a directory, or the first file in it, appears. Files up to
+    ``inline_size`` bytes are buffered (within the budget of the scheduler)
+    and uploaded on its lanes, larger files are streamed from the archive.
+    The metadata and mimetypes saved by ``export_tar`` in PAX headers are
+    restored.
+
+    :arg client: The client to use
+    :type client: cli.client.RadonClient
+    :arg fileobj: The tar stream, optionally compressed
+    :arg dest: Path of the destination container (ending with a /)
+    :arg scheduler: The scheduler of the uploads
+    :type scheduler: cli.transfer.TransferScheduler
+    :returns: A generator of (path, Response), the order isn't deterministic.
+      The Response is None for the members which aren't files or
+      directories (links, devices), they are skipped
+
+    """
+    created = set()
+    stats = scheduler.stats
+
+    def ensure_container(path):
+        """Create a container and its missing ancestors, once"""
+        parts = path.strip("/").split("/")
+        for idx in range(1, len(parts) + 1):
+            container = "/" + "/".join(parts[:idx]) + "/"
+            if container in created:
+                continue
+            res = client.mkdir(container)
+            if not res.ok() and res.code() != 409:
+                return container, res
+            created.add(container)
+        return None
+
+    def upload(path, data, pax_headers, size):
+        stats.begin(path, size)
+        try:
+            res = client.put(path, data, pax_headers.get(PAX_MIMETYPE))
+            if res.ok():
+                res = restore_metadata(client, path, pax_headers) or res
+            if res.ok():
+                # The bytes of the streamed members are counted as they're read
+                stats.add(size if isinstance(data, bytes) else 0, 1, path)
+            return res
+        finally:
+            stats.end(path)
+
+    def tracked(path, chunks):
+        for chunk in chunks:
+            stats.add(len(chunk), name=path)
+            yield chunk
+
+    error = ensure_container(dest) if dest != "/" else None
+    if error:
+        yield error
+        return
+    pending = {}
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            name = member_path(member.name)
+            if name is None or (name == "" and not member.isdir()):
+                yield member.name, Response(400, "Unsafe path in the archive")
+                continue
+            path = dest + name
+            if member.isdir():
+                if name == "":
+                    continue
+                error = ensure_container(path + "/")
+                if error:
+                    yield error
+                else:
+                    error = restore_metadata(client, path + "/", member.pax_headers)
+                    if error and not error.ok():
+                        yield path + "/", error
+                continue
+            if not member.isfile():
+                yield path, None
+                continue
+            parent = posixpath.dirname(path).rstrip("/") + "/"
+            error = ensure_container(parent) if parent != "/" else None
+            if error:
+                yield error
+                continue
+            fh = tar.extractfile(member)
+            if member.size > inline_size:
+                data = tracked(path, read_chunks(fh))
+                yield path, upload(path, data, member.pax_headers, member.size)
+            else:
+                # The member is read once its bytes fit in the budget
+                scheduler.budget.acquire(member.size)
+                try:
+                    data = fh.read()
+                except Exception:
+                    scheduler.budget.release(member.size)
+                    raise
+                future = scheduler.submit_held(
+                    member.size, upload, path, data, member.pax_headers, member.size
+                )
+                pending[future] = path
+            for future in [f for f in pending if f.done()]:
+                yield pending.pop(future), future.result()
+    for future, path in pending.items():
+        yield path, future.result()
+
+
+def value_size(cdmi_info):
+    """Return the size of a data object from its CDMI valuerange, None if
+    it's unknown"""
+    try:
+        _, end = cdmi_info["valuerange"].split("-", 1)
+        return int(end) + 1
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+
+def pax_headers(cdmi_info):
+    """Return the PAX headers which save the metadata and the mimetype of a
+    container or a data object"""
+    headers = {}
+    metadata = {
+        k: v for k, v in cdmi_info.get("metadata", {}).items()
+        if k != ENCODING_METADATA
+    }
+    if metadata:
+        headers[PAX_METADATA] = json.dumps(metadata, sort_keys=True)
+    if cdmi_info.get("mimetype"):
+        headers[PAX_MIMETYPE] = cdmi_info["mimetype"]
+    return headers
+
+
+def walk_sorted(client, path, fields=None, jobs=8):
+    """Read a container and its descendants depth-first, in the order of
+    their paths, as ``RadonClient.walk`` does in any order.
+
+    The children of each container are read in parallel, with a bounded
+    number of requests ahead of the one being yielded, so the memory held
+    depends on the depth of the tree and not on its size.
+
+    :arg client: The client to use
+    :type client: cli.client.RadonClient
+    :arg path: Absolute path of the container (or data object)
+    :arg fields: CDMI fields to read, "objectType" and "children" are added
+    :arg jobs: Number of requests in parallel
+    :returns: A generator of (path, Response)
+
+    """
+    fields = list(fields or [])
+    fields += [f for f in ("objectType", "children") if f not in fields]
+    executor = ThreadPoolExecutor(jobs)
+
+    def read_ordered(paths):
+        pending = deque()
+        for child in paths:
+            pending.append((child, executor.submit(client.get_cdmi, child, fields)))
+            if len(pending) >= jobs * READ_AHEAD:
+                child, future = pending.popleft()
+                yield child, future.result()
+        while pending:
+            child, future = pending.popleft()
+            yield child, future.result()
+
+    def visit(node, res):
+        if not res.ok() or res.json().get("objectType") != CDMI_CONTAINER:
+            yield node, res
+            return
+        if not node.endswith("/"):
+            node += "/"
+        children = sorted(res.json().get("children", []))
+        yield node, res
+        for child, child_res in read_ordered(node + name for name in children):
+            yield from visit(child, child_res)
+
+    try:
+        for node, res in read_ordered([path]):
+            yield from visit(node, res)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def export_tar(client, src, fileobj, scheduler, inline_size=INLINE_SIZE):
+    """Write a container and its descendants (or a data object) in a tar
+    stream.
+
+    The members are written in the order of their paths, as the tree is
+    read depth-first by ``walk_sorted``, so the archive starts at once and
+    the memory doesn't depend on the size of the tree. The next data
+    objects are prefetched on
+    the lanes of the scheduler into a bounded reorder buffer (within the
+    budget of the scheduler, objects larger than ``inline_size`` are spooled
+    to a temporary file). The large data objects aren't prefetched, they are
+    downloaded in ranges when their turn comes. The CDMI metadata and the
+    mimetype are saved in PAX headers.
+
+    :arg client: The client to use
+    :type client: cli.client.RadonClient
+    :arg src: Absolute path of the container (ending with a /) or data object
+    :arg fileobj: The writable stream of the archive
+    :arg scheduler: The scheduler of the downloads
+    :type scheduler: cli.transfer.TransferScheduler
+    :returns: A generator of (path, Response), in the order of the archive
+
+    """
+    # Names in the archive start with the name of the source
+    base = posixpath.dirname(src.rstrip("/")).rstrip("/") + "/"
+    # The root container has no name in the archive
+    entries = (
+        (path, res)
+        for path, res in walk_sorted(client, src, EXPORT_FIELDS, scheduler.jobs)
+        if path != base
+    )
+    mtime = int(time.time())
+    budget = scheduler.budget
+    stats = scheduler.stats
+
+    def spool_content(path, res):
+        """Write the content of an opened data object in a spooled file"""
+        spool = tempfile.SpooledTemporaryFile(inline_size)
+        for chunk in client.decoded_content(path, res):
+            spool.write(chunk)
+            stats.add(len(chunk), name=path)
+        spool.seek(0)
+        return spool
+
+    def fetch(path, size):
+        """Download a data object in a spooled file"""
+        stats.begin(path, size)
+        try:
+            res = client.open(path)
+            if res.status_code != 200:
+                return Response(res.status_code, res)
+            try:
+                return spool_content(path, res)
+            finally:
+                res.close()
+        finally:
+            stats.end(path)
+
+    def member(path, info, size):
+        tarinfo = tarfile.TarInfo(path[len(base):].rstrip("/"))
+        tarinfo.mtime = mtime
+        tarinfo.pax_headers = pax_headers(info)
+        if path.endswith("/"):
+            tarinfo.type = tarfile.DIRTYPE
+            tarinfo.mode = 0o755
+        else:
+            tarinfo.size = size
+            tarinfo.mode = 0o644
+        return tarinfo
+
+    def add_spooled(tar, path, info, spool):
+        """Write a spooled data object in the archive"""
+        with spool:
+            spool.seek(0, 2)
+            size = spool.tell()
+            spool.seek(0)
+            tar.addfile(member(path, info, size), spool)
+
+    def add_whole(tar, path, info):
+        """Stream a data object to the archive with a single request"""
+        res = client.open(path)
+        if res.status_code != 200:
+            return Response(res.status_code, res)
+        stats.begin(path, value_size(info))
+        try:
+            length = res.headers.get("Content-Length")
+            encoding = res.headers.get("Content-Encoding", "identity")
+            if length is None or encoding.lower() != "identity":
+                # The size of the member is only known once the content is
+                # read and decoded
+                add_spooled(tar, path, info, spool_content(path, res))
+            else:
+                chunks = read_chunks(res.raw)
+                tar.addfile(
+                    member(path, info, int(length)), ChunkReader(chunks, stats, path)
+                )
+        finally:
+            res.close()
+            stats.end(path)
+        return Response(0, "ok")
+
+    def add_ranges(tar, path, info):
+        """Stream a large data object to the archive, downloaded in ranges"""
+        size = value_size(info)
+        chunks = scheduler.iter_ranges(client, path, size)
+        try:
+            first = next(chunks, b"")
+        except RangeNotSupported:
+            return add_whole(tar, path, info)
+        except TransferError as err:
+            return err.response
+        # An error past this point leaves a truncated member, it's raised
+        tar.addfile(
+            member(path, info, size), ChunkReader(itertools.chain([first], chunks))
+        )
+        return Response(0, "ok")
+
+    with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        window = deque()
+        entry = next(entries, None)
+        while True:
+            # Prefetch the next data objects in the reorder buffer
+            while entry is not None and len(window) < scheduler.jobs * 4:
+                path, res = entry
+                info = res.json() if res.ok() else None
+                size = value_size(info) if info else None
+                if info is None:
+                    # The error is reported in the order of the archive
+                    task, cost = res, 0
+                elif path.endswith("/") or info.get("objectType") == CDMI_CONTAINER:
+                    task, cost = None, 0
+                elif (
+                    size is not None
+                    and size > inline_size
+                    and ENCODING_METADATA not in info.get("metadata", {})
+                ):
+                    task, cost = "stream", 0
+                else:
+                    cost = inline_size if size is None else min(size, inline_size)
+                    if not budget.try_acquire(cost):
+                        break
+                    task = scheduler.submit(size, fetch, path, size)
+                window.append((path, info, task, cost))
+                entry = next(entries, None)
+            if not window:
+                break
+            path, info, task, cost = window.popleft()
+            if isinstance(task, Response):
+                yield path, task
+                continue
+            if task is None:
+                tar.addfile(member(path, info, 0))
+                res = Response(0, "ok")
+            elif task == "stream":
+                res = add_ranges(tar, path, info)
+            else:
+                try:
+                    spool = task.result()
+                finally:
+                    budget.release(cost)
+                if isinstance(spool, Response):
+                    yield path, spool
+                    continue
+                add_spooled(tar, path, info, spool)
+                res = Response(0, "ok")
+            if res.ok():
+                stats.add(objects=1)
+            yield path, res
@@ -0,0 +1,279 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import threading
+import time
+
+# Status codes the archive uses to signal it is overloaded
+OVERLOAD_STATUS = (429, 503)
+
+
+class TokenBucket():
+    """A token bucket, used to limit the rate of an operation (requests/s or
+    bytes/s). A consumer may go into debt, it then waits until the bucket is
+    refilled, so a single large request is never blocked forever."""
+
+    def __init__(self, rate, capacity=None):
+        """Create a new ``TokenBucket``.
+
+        :arg rate: Number of tokens added per second
+        :arg capacity: Maximum number of tokens stored (default to ``rate``)
+
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"rate": self.rate, "capacity": self.capacity}
+
+    def __setstate__(self, state):
+        self.__init__(state["rate"], state["capacity"])
+
+    def consume(self, amount=1):
+        """Take ``amount`` tokens from the bucket, wait if there are not enough
+        tokens available.
+
+        :arg amount: Number of tokens to take
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._stamp) * self.rate
+            )
+            self._stamp = now
+            self._tokens -= amount
+            deficit = -self._tokens
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
+
+
+class AdaptiveConcurrency():
+    """Limit the number of requests in flight with an AIMD controller.
+
+    The limit grows additively (+1 per window of successful requests) while
+    the archive is healthy and is halved when the archive answers with
+    429/503 or when the latency goes over ``tolerance`` times its recent
+    average. The latency is the time to the first byte of the answer, so
+    that the time spent transferring large bodies isn't taken for
+    overload."""
+
+    def __init__(self, max_limit, min_limit=1, tolerance=2.0):
+        """Create a new ``AdaptiveConcurrency``.
+
+        :arg max_limit: Maximum number of requests in flight
+        :arg min_limit: Minimum number of requests in flight
+        :arg tolerance: Ratio to the average latency which is considered as a
+          sign of overload
+
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.tolerance = tolerance
+        self.limit = float(max(min_limit, max_limit // 2))
+        self._inflight = 0
+        self._latency = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def __getstate__(self):
+        return {
+            "max_limit": self.max_limit,
+            "min_limit": self.min_limit,
+            "tolerance": self.tolerance,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["max_limit"], state["min_limit"], state["tolerance"])
+
+    def acquire(self):
+        """Wait for a free slot"""
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    def inflight(self):
+        """Return the number of requests in flight"""
+        return self._inflight
+
+    def release(self, status, latency):
+        """Release a slot and adjust the limit with the outcome of the request.
+
+        :arg status: HTTP status code of the request, None if it failed
+        :arg latency: Time to the first byte of the answer in seconds, None
+          if it isn't a measure of the health of the archive (the time was
+          spent sending a large body)
+
+        """
+        with self._cond:
+            self._inflight -= 1
+            overloaded = status is None or status in OVERLOAD_STATUS
+            if latency is not None:
+                if self._latency is None:
+                    self._latency = latency
+                elif latency > self.tolerance * self._latency:
+                    overloaded = True
+                # Exponential moving average of the latency
+                self._latency = 0.8 * self._latency + 0.2 * latency
+            now = time.monotonic()
+            if overloaded:
+                # Decrease at most once per round-trip, requests already in
+                # flight are answers to the previous limit
+                if now - self._last_decrease > (self._latency or 0.0):
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class StreamSlot():
+    """The slot of the concurrency limit held while a streamed body is read.
+
+    It's given as ``held_slot`` to the requests sent to read that body (as
+    the metadata read to decode it), so they don't wait for another slot
+    whichever thread sends them."""
+
+    def __init__(self, throttle, status, latency, slot):
+        """Create a new ``StreamSlot``.
+
+        :arg throttle: The ``Throttle`` the slot was taken from
+        :arg status: HTTP status code of the request
+        :arg latency: Time to the first byte of the answer in seconds, or
+          None
+        :arg slot: The value returned by ``Throttle.acquire``
+
+        """
+        self.held = True
+        self._throttle = throttle
+        self._outcome = (status, latency, slot)
+        self._lock = threading.Lock()
+        self._released = False
+
+    def release(self):
+        """Release the slot once the body is read, the next calls do
+        nothing"""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+            self.held = False
+        self._throttle.release(*self._outcome)
+
+
+class Throttle():
+    """Client-side limits applied to every request sent to the archive.
+
+    Each limit is optional, a value of 0 disables it."""
+
+    def __init__(self, max_rate=0, max_bandwidth=0, max_jobs=0):
+        """Create a new ``Throttle``.
+
+        :arg max_rate: Maximum number of requests per second
+        :arg max_bandwidth: Maximum number of bytes per second
+        :arg max_jobs: Maximum number of requests in flight, the effective
+          limit adapts to the health of the archive
+
+        """
+        self.max_rate = max_rate
+        self.max_bandwidth = max_bandwidth
+        self.max_jobs = max_jobs
+        self.requests = TokenBucket(max_rate) if max_rate else None
+        self.bandwidth = TokenBucket(max_bandwidth) if max_bandwidth else None
+        self.concurrency = AdaptiveConcurrency(max_jobs) if max_jobs else None
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {
+            "max_rate": self.max_rate,
+            "max_bandwidth": self.max_bandwidth,
+            "max_jobs": self.max_jobs,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["max_rate"], state["max_bandwidth"], state["max_jobs"])
+
+    def acquire(self, nbytes=0, held_slot=None):
+        """Wait until a request of ``nbytes`` can be sent.
+
+        A request sent to read a streamed body (as the metadata read to
+        decode it) doesn't wait for another slot of the concurrency limit
+        while the slot of the body is held.
+
+        :arg nbytes: Size of the request body
+        :arg held_slot: The ``StreamSlot`` of the body the request is sent
+          for, or None
+        :returns: True if a slot of the concurrency limit has been taken
+        :rtype: bool
+
+        """
+        with self._lock:
+            self._inflight += 1
+        nested = held_slot is not None and held_slot.held
+        slot = self.concurrency is not None and not nested
+        if slot:
+            self.concurrency.acquire()
+        if self.requests:
+            self.requests.consume(1)
+        if self.bandwidth and nbytes:
+            self.bandwidth.consume(nbytes)
+        return slot
+
+    def consume(self, nbytes):
+        """Account for ``nbytes`` received from the archive.
+
+        :arg nbytes: Size of the response body
+
+        """
+        if self.bandwidth and nbytes:
+            self.bandwidth.consume(nbytes)
+
+    def inflight(self):
+        """Return the number of requests sent or waiting to be sent"""
+        return self._inflight
+
+    def release(self, status, latency, slot=True):
+        """Release the request slot taken by ``acquire``.
+
+        :arg status: HTTP status code of the request, None if it failed
+        :arg latency: Time to the first byte of the answer in seconds, None
+          if it isn't a measure of the health of the archive
+        :arg slot: The value returned by ``acquire``
+
+        """
+        with self._lock:
+            self._inflight -= 1
+        if self.concurrency and slot:
+            self.concurrency.release(status, latency)
+
+    def begin_stream(self, status, latency, slot=True):
+        """Keep the slot taken by ``acquire`` while a streamed body is read.
+
+        :arg status: HTTP status code of the request
+        :arg latency: Time to the first byte of the answer in seconds, or
+          None
+        :arg slot: The value returned by ``acquire``
+        :returns: The held slot, released with ``StreamSlot.release`` from
+          any thread
+        :rtype: StreamSlot
+
+        """
+        return StreamSlot(self, status, latency, slot)
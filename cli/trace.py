@@ -0,0 +1,170 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import bisect
+import json
+import threading
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0,
+)
+
+
+class OperationStats():
+    """Aggregated statistics for one operation (method and path template)"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # One more bucket for the requests slower than the last bound
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.max_latency = 0.0
+
+    def add(self, record):
+        """Add a trace record to the statistics"""
+        self.count += 1
+        if record["status"] is None or record["status"] >= 400:
+            self.errors += 1
+        self.retries += record["retries"]
+        self.bytes_in += record["bytes_in"]
+        self.bytes_out += record["bytes_out"]
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, record["total"])] += 1
+        self.max_latency = max(self.max_latency, record["total"])
+
+    def percentile(self, pct):
+        """Return the latency percentile ``pct`` (0-100) in seconds, estimated
+        from the histogram (interpolated in its bucket), so that the memory
+        doesn't grow with the number of requests"""
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        lower = 0.0
+        for idx, count in enumerate(self.buckets):
+            upper = (
+                LATENCY_BUCKETS[idx] if idx < len(LATENCY_BUCKETS) else self.max_latency
+            )
+            if count and seen + count >= rank:
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(value, self.max_latency)
+            seen += count
+            lower = upper
+        return self.max_latency
+
+
+class Tracer():
+    """Record every HTTP request sent by a RadonClient.
+
+    A record is a dict with the following keys:
+      - start: wall clock time when the request was sent
+      - method: HTTP method
+      - path: path template of the request ("/api/cdmi/{object}", ...)
+      - url: full URL of the request
+      - status: HTTP status code, None if the request failed
+      - bytes_out: size of the request body
+      - bytes_in: size of the response body
+      - ttfb: time to the response headers, in seconds
+      - total: duration of the request, in seconds
+      - retries: number of retries done by the connection pool
+
+    Hooks are called with each record, they may be added by library users
+    to export the records.
+    """
+
+    def __init__(self, keep_stats=True):
+        """Create a new ``Tracer``.
+
+        :arg keep_stats: Aggregate the records by operation for ``summary``,
+          the records are only passed to the hooks otherwise
+
+        """
+        self.hooks = []
+        self.keep_stats = keep_stats
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """Register a function called with each trace record.
+
+        :arg hook: A callable which takes a record (dict) as argument
+
+        """
+        self.hooks.append(hook)
+
+    def record(self, record):
+        """Add a trace record and pass it to the hooks"""
+        if self.keep_stats:
+            key = (record["method"], record["path"])
+            with self._lock:
+                if key not in self.stats:
+                    self.stats[key] = OperationStats()
+                self.stats[key].add(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def summary(self):
+        """Return a text summary of the statistics with a latency histogram
+        for each operation.
+
+        :rtype: str
+
+        """
+        lines = ["Request statistics:"]
+        bounds = ["<{}ms".format(round(b * 1000)) for b in LATENCY_BUCKETS]
+        bounds.append(">={}ms".format(round(LATENCY_BUCKETS[-1] * 1000)))
+        for (method, path), stats in sorted(self.stats.items()):
+            lines.append(
+                "  {} {}: {} requests, {} errors, {} retries, "
+                "{} bytes in, {} bytes out".format(
+                    method, path, stats.count, stats.errors, stats.retries,
+                    stats.bytes_in, stats.bytes_out
+                )
+            )
+            lines.append(
+                "    p50={:.1f}ms p90={:.1f}ms p99={:.1f}ms max={:.1f}ms".format(
+                    stats.percentile(50) * 1000,
+                    stats.percentile(90) * 1000,
+                    stats.percentile(99) * 1000,
+                    stats.max_latency * 1000,
+                )
+            )
+            top = max(stats.buckets)
+            for bound, count in zip(bounds, stats.buckets):
+                if count:
+                    bar = "#" * max(1, int(40 * count / top))
+                    lines.append("    {:>7} {:>7} {}".format(bound, count, bar))
+        return "\n".join(lines)
+
+
+class JsonlTraceWriter():
+    """A trace hook which writes each record as a JSON line in a file"""
+
+    def __init__(self, path):
+        self._fh = open(path, "a")
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record)
+        with self._lock:
+            self._fh.write(line + "\n")
+
+    def close(self):
+        """Close the trace file"""
+        self._fh.close()
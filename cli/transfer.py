@@ -0,0 +1,373 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cli.client import Response
+
+# Objects up to this size run on the small objects lane
+SMALL_SIZE = 1024 * 1024
+# Size of the ranges of the large objects downloaded in parallel
+PART_SIZE = 8 * 1024 * 1024
+# Objects larger than this are downloaded in ranges
+RANGE_THRESHOLD = 4 * PART_SIZE
+# Maximum number of bytes held in memory by the transfers
+BUFFER_SIZE = 64 * 1024 * 1024
+
+
+class TransferError(Exception):
+    """A transfer failed, ``response`` is the Response of the archive"""
+
+    def __init__(self, response):
+        super(TransferError, self).__init__(response.msg())
+        self.response = response
+
+
+class RangeNotSupported(TransferError):
+    """The archive ignored a Range request, nothing has been transferred"""
+
+
+class ByteBudget():
+    """Bound the number of bytes held in memory by concurrent tasks.
+
+    ``acquire`` blocks until the bytes fit in the budget. A single request
+    larger than the budget is accepted when nothing else is held, so that it
+    can't block forever.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes):
+        """Wait until ``nbytes`` can be held"""
+        with self._cond:
+            while self.used and self.used + nbytes > self.limit:
+                self._cond.wait()
+            self.used += nbytes
+
+    def try_acquire(self, nbytes):
+        """Hold ``nbytes`` if they fit in the budget, return False otherwise
+        without waiting"""
+        with self._cond:
+            if self.used and self.used + nbytes > self.limit:
+                return False
+            self.used += nbytes
+            return True
+
+    def hold(self, nbytes):
+        """Hold ``nbytes`` even if they don't fit in the budget, so that a
+        task which must progress isn't blocked"""
+        with self._cond:
+            self.used += nbytes
+
+    def release(self, nbytes):
+        """Release bytes acquired before"""
+        with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
+
+
+class TransferStats():
+    """Count the bytes and objects transferred, to report the throughput and
+    the remaining time while the transfers run."""
+
+    def __init__(self, total_bytes=None, total_objects=None):
+        """Create a new ``TransferStats``.
+
+        :arg total_bytes: Number of bytes to transfer, None if unknown
+        :arg total_objects: Number of objects to transfer, None if unknown
+
+        """
+        self.total_bytes = total_bytes
+        self.total_objects = total_objects
+        self.bytes = 0
+        self.objects = 0
+        self.start = time.monotonic()
+        # name -> [bytes transferred, size] of the objects in progress
+        self.active = {}
+        self._lock = threading.Lock()
+
+    def begin(self, name, size=None):
+        """Record the start of the transfer of an object"""
+        with self._lock:
+            self.active[name] = [0, size]
+
+    def end(self, name):
+        """Record the end of the transfer of an object, successful or not"""
+        with self._lock:
+            self.active.pop(name, None)
+
+    def add(self, nbytes=0, objects=0, name=None):
+        """Account for transferred bytes and completed objects, ``name`` is
+        the object in progress the bytes belong to"""
+        with self._lock:
+            self.bytes += nbytes
+            self.objects += objects
+            if name in self.active:
+                self.active[name][0] += nbytes
+
+    def snapshot(self):
+        """Return the bytes and objects transferred with the objects in
+        progress, as a consistent (bytes, objects, [(name, bytes, size)])"""
+        with self._lock:
+            active = [(name, done, size) for name, (done, size) in self.active.items()]
+            return self.bytes, self.objects, active
+
+    def elapsed(self):
+        """Return the number of seconds since the transfers started"""
+        return time.monotonic() - self.start
+
+    def throughput(self):
+        """Return the average number of bytes transferred per second"""
+        elapsed = self.elapsed()
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Return the estimated number of seconds left, None if unknown"""
+        rate = self.throughput()
+        if self.total_bytes is None or not rate:
+            return None
+        return max(0.0, (self.total_bytes - self.bytes) / rate)
+
+    def __str__(self):
+        done = format_size(self.bytes)
+        if self.total_bytes is not None:
+            done += "/" + format_size(self.total_bytes)
+        objects = str(self.objects)
+        if self.total_objects is not None:
+            objects += "/{}".format(self.total_objects)
+        text = "{} objects, {}, {}/s".format(
+            objects, done, format_size(self.throughput())
+        )
+        eta = self.eta()
+        if eta is not None:
+            text += ", ETA {}".format(format_duration(eta))
+        return text
+
+
+class TransferScheduler():
+    """Run the transfers of a mixed dataset, where a few huge objects must not
+    stall the many small ones.
+
+    Objects up to ``small_size`` bytes run on a dedicated lane of ``jobs``
+    workers, the larger ones on a lane of ``jobs // 2`` workers. The bytes
+    held in memory by the transfers are bounded by ``buffer_size``, and the
+    large objects are downloaded in ``part_size`` ranges fetched in
+    parallel.
+    """
+
+    def __init__(self, jobs=8, buffer_size=BUFFER_SIZE, small_size=SMALL_SIZE,
+                 part_size=PART_SIZE, stats=None):
+        """Create a new ``TransferScheduler``.
+
+        :arg jobs: Number of workers of the small objects lane
+        :arg buffer_size: Maximum number of bytes held in memory
+        :arg small_size: Maximum size of the objects of the small lane
+        :arg part_size: Size of the ranges of the large objects
+        :arg stats: The statistics updated by the transfers
+        :type stats: TransferStats
+
+        """
+        self.jobs = jobs
+        self.small_size = small_size
+        self.part_size = part_size
+        self.budget = ByteBudget(buffer_size)
+        self.stats = stats or TransferStats()
+        self._small = ThreadPoolExecutor(jobs)
+        self._large = ThreadPoolExecutor(max(1, jobs // 2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def shutdown(self):
+        """Wait for the running transfers and stop the workers"""
+        self._small.shutdown()
+        self._large.shutdown()
+
+    def submit(self, size, fn, *args):
+        """Run ``fn(*args)`` on the lane of an object of ``size`` bytes (None
+        if unknown, it's considered large).
+
+        :returns: A future of the result
+        :rtype: concurrent.futures.Future
+
+        """
+        if size is not None and size <= self.small_size:
+            return self._small.submit(fn, *args)
+        return self._large.submit(fn, *args)
+
+    def submit_buffered(self, size, fn, *args):
+        """Hold ``size`` bytes of the budget (waiting for them if needed)
+        while ``fn(*args)`` runs on the lane of an object of ``size`` bytes.
+
+        :returns: A future of the result
+        :rtype: concurrent.futures.Future
+
+        """
+        self.budget.acquire(size)
+        return self.submit_held(size, fn, *args)
+
+    def submit_held(self, size, fn, *args):
+        """Run ``fn(*args)`` on the lane of an object of ``size`` bytes, the
+        bytes already acquired from the budget (before the object was read
+        in memory) are released when it's done.
+
+        :returns: A future of the result
+        :rtype: concurrent.futures.Future
+
+        """
+        try:
+            future = self.submit(size, fn, *args)
+        except Exception:
+            self.budget.release(size)
+            raise
+        future.add_done_callback(lambda _: self.budget.release(size))
+        return future
+
+    def fetch_range(self, client, path, start, end):
+        """Download the bytes ``start`` to ``end`` (included) of a data
+        object"""
+        res = client.open(path, start, end)
+        try:
+            if res.status_code == 200:
+                raise RangeNotSupported(
+                    Response(501, "The archive doesn't support byte ranges")
+                )
+            if res.status_code != 206:
+                raise TransferError(Response(res.status_code, res))
+            data = res.content
+        finally:
+            res.close()
+        if len(data) != end - start + 1:
+            raise TransferError(Response(500, "Truncated range of {}".format(path)))
+        self.stats.add(len(data), name=path)
+        return data
+
+    def iter_ranges(self, client, path, size):
+        """Download a data object in ranges fetched in parallel.
+
+        The next ranges are fetched while the previous ones are consumed, as
+        long as they fit in the budget (one range at least is always in
+        flight, so that a full budget can't block the download). A
+        ``RangeNotSupported`` error is raised before any data if the archive
+        ignores the ranges.
+
+        :arg client: The client to use
+        :type client: cli.client.RadonClient
+        :arg path: Path of the data object
+        :arg size: Size of the data object
+        :returns: A generator of bytes, in the order of the object
+
+        """
+        window = deque()
+        self.stats.begin(path, size)
+        try:
+            for start in range(0, size, self.part_size):
+                nbytes = min(self.part_size, size - start)
+                while window and not self.budget.try_acquire(nbytes):
+                    yield self._pop_range(window)
+                if not window:
+                    self.budget.hold(nbytes)
+                end = start + nbytes - 1
+                future = self._large.submit(self.fetch_range, client, path, start, end)
+                window.append((future, nbytes))
+            while window:
+                yield self._pop_range(window)
+        finally:
+            # The consumer stopped or a range failed, drop the other ones
+            for future, nbytes in window:
+                if not future.cancel():
+                    try:
+                        future.result()
+                    except TransferError:
+                        pass
+                self.budget.release(nbytes)
+            self.stats.end(path)
+
+    def _pop_range(self, window):
+        """Wait for the oldest range of the window and release its bytes"""
+        future, nbytes = window[0]
+        data = future.result()
+        window.popleft()
+        self.budget.release(nbytes)
+        return data
+
+
+class ChunkReader():
+    """A read-only file-like object over an iterable of bytes, as expected by
+    ``tarfile.TarFile.addfile``."""
+
+    def __init__(self, chunks, stats=None, name=None):
+        """Create a new ``ChunkReader``.
+
+        :arg chunks: An iterable of bytes
+        :arg stats: The statistics where the bytes read are counted
+        :arg name: The object in progress the bytes belong to
+
+        """
+        self._chunks = iter(chunks)
+        # The current chunk and the position of the next byte to read in it,
+        # each byte is copied once whatever the sizes of the reads
+        self._view = memoryview(b"")
+        self._pos = 0
+        self._stats = stats
+        self._name = name
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if self._pos >= len(self._view):
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                if self._stats:
+                    self._stats.add(len(chunk), name=self._name)
+                self._view = memoryview(chunk)
+                self._pos = 0
+                continue
+            end = len(self._view)
+            if size > 0:
+                end = min(end, self._pos + size)
+            parts.append(self._view[self._pos:end])
+            if size > 0:
+                size -= end - self._pos
+            self._pos = end
+        return b"".join(parts)
+
+
+def format_size(nbytes):
+    """Return a human readable size (1.5 MiB)"""
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if nbytes < 1024 or unit == "TiB":
+            break
+        nbytes /= 1024.0
+    if unit == "B":
+        return "{} B".format(int(nbytes))
+    return "{:.1f} {}".format(nbytes, unit)
+
+
+def format_duration(seconds):
+    """Return a duration as H:MM:SS"""
+    seconds = int(round(seconds))
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
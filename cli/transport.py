@@ -0,0 +1,204 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import http.client
+import mmap
+import os
+import socket
+import stat
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from requests import exceptions
+from requests.utils import select_proxy
+
+# Bytes sent at once by the zero-copy transport when the progress of a body
+# is reported
+SEND_SLICE = 4 * 1024 * 1024
+
+
+def regular_file_size(body):
+    """Return the size of the regular file behind a request body, None if the
+    body isn't a regular file.
+
+    :arg body: body of a request
+    :rtype: int
+
+    """
+    try:
+        fstat = os.fstat(body.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    if not stat.S_ISREG(fstat.st_mode):
+        return None
+    return fstat.st_size
+
+
+class ProgressFile():
+    """A file object whose bytes sent in a request body are reported to a
+    callback, to show the progress of an upload.
+
+    The ``ZeroCopyAdapter`` still sends the file without copying it, in
+    slices after which the bytes are reported. The bytes read by any other
+    transport (or by the compression) are reported as they're read.
+    """
+
+    def __init__(self, fileobj, callback):
+        """Create a new ``ProgressFile``.
+
+        :arg fileobj: A file opened in binary mode
+        :arg callback: Called with the number of bytes sent
+
+        """
+        self.fileobj = fileobj
+        self.callback = callback
+
+    @property
+    def mode(self):
+        return self.fileobj.mode
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    def tell(self):
+        return self.fileobj.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.fileobj.seek(offset, whence)
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        if data:
+            self.callback(len(data))
+        return data
+
+
+def iter_slices(view, callback):
+    """Yield slices of a memoryview, the bytes are reported to ``callback``
+    once a slice has been sent"""
+    for start in range(0, len(view), SEND_SLICE):
+        part = view[start:start + SEND_SLICE]
+        yield part
+        callback(len(part))
+
+
+class ZeroCopyAdapter(HTTPAdapter):
+    """A transport adapter which uploads the regular files without copying
+    them in userspace buffers.
+
+    Plain HTTP requests without proxy send the file with ``socket.sendfile``
+    (the kernel copies the pages from the page cache to the socket). Other
+    requests send ``memoryview`` slices of a memory-mapped file. Any other
+    body is sent as usual.
+    """
+
+    def __init__(self, use_sendfile=True, **kwargs):
+        """Create a new ``ZeroCopyAdapter``.
+
+        :arg use_sendfile: Use ``socket.sendfile`` when possible
+        :arg kwargs: Extra parameters for ``requests.adapters.HTTPAdapter``
+
+        """
+        self.use_sendfile = use_sendfile
+        super(ZeroCopyAdapter, self).__init__(**kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None,
+             proxies=None):
+        size = regular_file_size(request.body)
+        if not size:
+            return super(ZeroCopyAdapter, self).send(
+                request, stream, timeout, verify, cert, proxies
+            )
+        url = urlsplit(request.url)
+        if (
+            self.use_sendfile
+            and url.scheme == "http"
+            and not select_proxy(request.url, proxies)
+        ):
+            return self.send_file(request, size, timeout)
+        return self.send_mmap(request, size, stream, timeout, verify, cert, proxies)
+
+    def send_file(self, request, size, timeout):
+        """Send the request on a new connection, the body is sent with
+        ``socket.sendfile``. The connection is closed if the request fails,
+        the errors are raised as the ``requests`` exceptions."""
+        url = urlsplit(request.url)
+        if isinstance(timeout, tuple):
+            timeout = timeout[0]
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+        try:
+            return self.build_response(request, self.sendfile(conn, request, size))
+        except socket.timeout as err:
+            connected = conn.sock is not None
+            conn.close()
+            if connected:
+                raise exceptions.ReadTimeout(err, request=request)
+            raise exceptions.ConnectTimeout(err, request=request)
+        except (OSError, http.client.HTTPException) as err:
+            conn.close()
+            raise exceptions.ConnectionError(err, request=request)
+
+    def sendfile(self, conn, request, size):
+        """Send the request on ``conn`` with ``socket.sendfile`` and return
+        the answer"""
+        body = request.body
+        offset = body.tell()
+        conn.putrequest(request.method, request.path_url, skip_accept_encoding=True)
+        for key, value in request.headers.items():
+            if key.lower() not in ("connection", "content-length"):
+                conn.putheader(key, value)
+        conn.putheader("Content-Length", str(size - offset))
+        # The connection isn't pooled
+        conn.putheader("Connection", "close")
+        conn.endheaders()
+        if isinstance(body, ProgressFile):
+            # The underlying file is sent, it's never read in userspace
+            fileobj = body.fileobj
+            while offset < size:
+                sent = conn.sock.sendfile(
+                    fileobj, offset, min(SEND_SLICE, size - offset)
+                )
+                if not sent:
+                    break
+                offset += sent
+                body.callback(sent)
+        else:
+            conn.sock.sendfile(body, offset, size - offset)
+        return conn.getresponse()
+
+    def send_mmap(self, request, size, stream, timeout, verify, cert, proxies):
+        """Send the request with a memoryview of the memory-mapped file as
+        body"""
+        body = request.body
+        offset = body.tell()
+        mapped = mmap.mmap(body.fileno(), 0, access=mmap.ACCESS_READ)
+        whole = memoryview(mapped)
+        view = whole[offset:]
+        try:
+            if isinstance(body, ProgressFile):
+                request.body = iter_slices(view, body.callback)
+            else:
+                request.body = view
+            request.headers["Content-Length"] = str(len(view))
+            return super(ZeroCopyAdapter, self).send(
+                request, stream, timeout, verify, cert, proxies
+            )
+        finally:
+            # The mapping can only be closed once the views are released
+            request.body = body
+            view.release()
+            whole.release()
+            mapped.close()
@@ -0,0 +1,71 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import sys
+
+import pytest
+
+import cli.radon
+from cli.client import RadonClient
+from cli.mockserver import MockRadonServer
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--mock-latency",
+        type=float,
+        default=0.0,
+        help="Latency injected in every answer of the mock server, in ms",
+    )
+
+
+@pytest.fixture(scope="module")
+def mock(request):
+    """An in-process mock archive, shared by the tests of a module"""
+    server = MockRadonServer(latency=request.config.getoption("--mock-latency") / 1000)
+    server.start()
+    server.add_user("admin", "radon")
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(mock):
+    """A client logged in the mock archive"""
+    client = RadonClient(mock.url)
+    res = client.authenticate("admin", "radon")
+    assert res.ok(), res.msg()
+    return client
+
+
+@pytest.fixture
+def radon(mock, tmp_path, monkeypatch, capsys):
+    """Run the command line interface in the process, logged in the mock
+    archive with a session in a temporary directory. Return a function
+    which takes the arguments and returns (exit code, stdout, stderr)."""
+    monkeypatch.setattr(cli.radon, "SESSION_PATH", str(tmp_path / "session.pickle"))
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["radon"] + list(args))
+        code = cli.radon.main()
+        out, err = capsys.readouterr()
+        return code, out, err
+
+    code, out, err = run("init", "--url=" + mock.url, "--username=admin",
+                         "--password=radon")
+    assert code == 0, err
+    return run
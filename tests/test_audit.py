@@ -0,0 +1,123 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import pytest
+
+from cli.acl import merge_ace
+from cli.audit import AuditError, PermissionAnalyzer
+from cli.client import dumps
+
+READ = 0x09
+WRITE = 0x56
+
+
+def ace(identifier, aceflags="NO_FLAGS", acemask=READ, acetype="ALLOW"):
+    return {
+        "identifier": identifier,
+        "acetype": acetype,
+        "aceflags": aceflags,
+        "acemask": acemask,
+    }
+
+
+def test_merge_ace_replace():
+    acl = [ace("bob"), ace("eve"), ace("bob", acetype="DENY")]
+    merged = merge_ace(acl, ace("bob", acemask=WRITE))
+    assert merged == [
+        ace("bob", acemask=WRITE), ace("eve"), ace("bob", acetype="DENY")
+    ]
+
+
+def test_merge_ace_inherited():
+    inherited = ace("bob", aceflags="INHERITED")
+    merged = merge_ace([inherited], ace("bob", acemask=WRITE))
+    assert merged == [inherited, ace("bob", acemask=WRITE)]
+
+
+def test_merge_ace_duplicates():
+    merged = merge_ace([ace("bob"), ace("bob", acemask=WRITE)], ace("bob", acemask=0))
+    assert merged == [ace("bob", acemask=0)]
+
+
+@pytest.fixture
+def tree(client, mock):
+    """A tree /audit/sub/deep/ with an object at each level and without ACL,
+    and a user bob in the group team"""
+    mock.add_user("bob", "bob", administrator=False)
+    client.create_group("team")
+    client.add_user_group("team", ["bob"])
+
+    def set_acl(path, acl):
+        res = client.put_cdmi(path, dumps({"metadata": {"cdmi_acl": acl}}))
+        assert res.ok(), res.msg()
+
+    for path in ("/audit/", "/audit/sub/", "/audit/sub/deep/"):
+        client.mkdir(path)
+        client.put(path + "file", b"x")
+        set_acl(path, [])
+    return set_acl
+
+
+def check(client, path, name="bob"):
+    return PermissionAnalyzer(client).check(path, name)
+
+
+def test_object_inherit(client, tree):
+    tree("/audit/", [ace("team", "OBJECT_INHERIT")])
+    assert check(client, "/audit/") == (False, READ)
+    assert check(client, "/audit/file") == (True, READ)
+    # Kept on the containers below as inherit-only
+    assert check(client, "/audit/sub/") == (False, 0)
+    assert check(client, "/audit/sub/file") == (True, READ)
+    assert check(client, "/audit/sub/deep/") == (False, 0)
+    assert check(client, "/audit/sub/deep/file") == (True, READ)
+
+
+def test_no_propagate(client, tree):
+    tree("/audit/", [ace("bob", "OBJECT_INHERIT, CONTAINER_INHERIT, NO_PROPAGATE")])
+    assert check(client, "/audit/file") == (True, READ)
+    assert check(client, "/audit/sub/") == (False, READ)
+    assert check(client, "/audit/sub/file") == (True, 0)
+
+
+def test_inherit_only(client, tree):
+    tree("/audit/", [ace("bob", "CONTAINER_INHERIT, INHERIT_ONLY", WRITE)])
+    assert check(client, "/audit/") == (False, 0)
+    assert check(client, "/audit/sub/") == (False, WRITE)
+    assert check(client, "/audit/sub/deep/") == (False, WRITE)
+    assert check(client, "/audit/sub/file") == (True, 0)
+
+
+def test_deny_first(client, tree):
+    tree("/audit/", [ace("EVERYONE@", "OBJECT_INHERIT", READ | WRITE)])
+    tree("/audit/sub/", [ace("team", "OBJECT_INHERIT", WRITE, "DENY")])
+    assert check(client, "/audit/sub/file") == (True, READ)
+    assert check(client, "/audit/file") == (True, READ | WRITE)
+
+
+def test_unknown_principal(client, tree):
+    with pytest.raises(AuditError, match="nobody isn't a user or a group"):
+        check(client, "/audit/", "nobody")
+
+
+def test_chmod(radon, client):
+    client.mkdir("/chmod/")
+    code, out, err = radon("chmod", "/chmod", "read", "team")
+    assert code == 0, err
+    assert out.strip().endswith("read access for team on /chmod/")
+    acl = client.get_cdmi("/chmod/").json()["metadata"]["cdmi_acl"]
+    assert [ace["identifier"] for ace in acl] == ["team"]
@@ -0,0 +1,107 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from cli.bench import fill_container
+
+pytest.importorskip("pytest_benchmark")
+
+SMALL_SIZE = 4096
+LARGE_SIZE = 16 * 1024 * 1024
+
+
+def test_put_small(benchmark, client):
+    client.mkdir("/put-small/")
+    data = os.urandom(SMALL_SIZE)
+    paths = ("/put-small/obj{}".format(idx) for idx in itertools.count())
+    res = benchmark(lambda: client.put(next(paths), data))
+    assert res.ok(), res.msg()
+
+
+def test_get_small(benchmark, client, mock):
+    fill_container(mock, "/get-small/", 1, SMALL_SIZE)
+    data = benchmark(lambda: client.open("/get-small/obj0").content)
+    assert len(data) == SMALL_SIZE
+
+
+@pytest.fixture(scope="module")
+def large_file():
+    with tempfile.TemporaryFile() as fh:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(LARGE_SIZE // len(chunk)):
+            fh.write(chunk)
+        yield fh
+
+
+def test_put_large(benchmark, client, large_file):
+    benchmark.extra_info["bytes"] = LARGE_SIZE
+    res = benchmark.pedantic(
+        client.put,
+        args=("/put-large", large_file),
+        setup=lambda: large_file.seek(0),
+        rounds=5,
+    )
+    assert res.ok(), res.msg()
+
+
+def test_get_large(benchmark, client, mock):
+    fill_container(mock, "/get-large/", 1, LARGE_SIZE)
+    benchmark.extra_info["bytes"] = LARGE_SIZE
+
+    def download():
+        res = client.open("/get-large/obj0")
+        return sum(len(chunk) for chunk in res.iter_content(1024 * 1024))
+
+    assert benchmark.pedantic(download, rounds=5) == LARGE_SIZE
+
+
+@pytest.mark.parametrize("nb_children", [10, 100, 1000, 10000])
+def test_ls(benchmark, client, mock, nb_children):
+    path = "/ls-{}/".format(nb_children)
+    fill_container(mock, path, nb_children, 0)
+    res = benchmark(client.ls, path)
+    assert len(res.json()["children"]) == nb_children
+
+
+def test_meta_rmw(benchmark, client, mock):
+    fill_container(mock, "/meta/", 1, SMALL_SIZE)
+    path = "/meta/obj0"
+    counter = itertools.count()
+
+    def read_modify_write():
+        metadata = client.get_cdmi(path).json()["metadata"]
+        metadata["bench"] = str(next(counter))
+        return client.put(path, metadata=metadata)
+
+    res = benchmark(read_modify_write)
+    assert res.ok(), res.msg()
+
+
+def test_startup(benchmark):
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-m", "cli.radon", "--version"],),
+        kwargs={"stdout": subprocess.DEVNULL, "check": True},
+        rounds=5,
+    )
@@ -0,0 +1,43 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+from cli.bench import fill_container
+
+
+def test_copy_tree(client, mock):
+    fill_container(mock, "/tree/", 30, 100)
+    client.mkdir("/tree/sub dir/")
+    client.put("/tree/sub dir/x", b"x" * 10, metadata={"k": "v"})
+    client.chdir("/tree/")
+    results = dict(client.copy_tree("./", "/tree-copy/", jobs=3))
+    assert len(results) == 33
+    assert all(res.ok() for res in results.values())
+    assert client.open("/tree-copy/sub dir/x").content == b"x" * 10
+    assert client.get_cdmi("/tree-copy/sub dir/x").json()["metadata"]["k"] == "v"
+    assert len(client.ls("/tree-copy/").json()["children"]) == 31
+
+
+def test_copy_tree_missing(client):
+    results = list(client.copy_tree("/missing/", "/missing-copy/"))
+    assert [(path, res.code()) for path, res in results] == [("/missing/", 404)]
+
+
+def test_copy_relative(client, mock):
+    fill_container(mock, "/rel/", 1, 10)
+    client.chdir("/rel/")
+    assert client.copy("obj0", "obj1").ok()
+    assert mock.nodes["/rel/obj1"]["value"] == mock.nodes["/rel/obj0"]["value"]
@@ -0,0 +1,148 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import pytest
+
+from cli.client import RadonClient
+from cli.index import NamespaceIndex, NamespaceIndexError
+
+
+@pytest.fixture
+def index(tmp_path, mock):
+    index = NamespaceIndex(str(tmp_path / "index.sqlite"))
+    index.bind(mock.url)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def other(mock):
+    """A client without index, which changes the archive behind the index"""
+    other = RadonClient(mock.url)
+    other.authenticate("admin", "radon")
+    return other
+
+
+def refresh(index, client, path):
+    return dict(index.refresh(client, path, jobs=4))
+
+
+def make_tree(client, root):
+    client.mkdir(root)
+    client.mkdir(root + "sub/")
+    client.put(root + "a.csv", b"a", metadata={"project": "alpha"})
+    client.put(root + "sub/b.txt", b"bb")
+
+
+def test_refresh(index, client):
+    make_tree(client, "/idx1/")
+    assert refresh(index, client, "/idx1/") == {
+        "/idx1/": "new",
+        "/idx1/a.csv": "new",
+        "/idx1/sub/": "new",
+        "/idx1/sub/b.txt": "new",
+    }
+    assert index.ls("/idx1").json()["children"] == ["a.csv", "sub/"]
+    assert index.ls("/idx1/sub/b.txt").json()["objectName"] == "b.txt"
+    assert index.ls("/missing/").code() == 404
+    assert [row[0] for row in index.find("/idx1/", name="*.txt")] == [
+        "/idx1/sub/b.txt"
+    ]
+    assert [row[0] for row in index.find("/idx1/", object_type="container")] == [
+        "/idx1/", "/idx1/sub/"
+    ]
+    assert [row[0] for row in index.find("/idx1/", metadata=("project", "alpha"))] == [
+        "/idx1/a.csv"
+    ]
+    assert index.get("/idx1/sub/b.txt")[3] == 2
+
+
+def test_refresh_unchanged(index, client):
+    make_tree(client, "/idx2/")
+    refresh(index, client, "/idx2/")
+    # The data objects of the unchanged containers aren't revalidated
+    assert refresh(index, client, "/idx2/") == {
+        "/idx2/": "unchanged",
+        "/idx2/sub/": "unchanged",
+    }
+
+
+def test_refresh_stale(index, client):
+    make_tree(client, "/idx3/")
+    refresh(index, client, "/idx3/")
+    client.index = index
+    client.put("/idx3/sub/b.txt", b"changed")
+    client.put("/idx3/sub/c.txt", b"c")
+    assert index.get("/idx3/sub/b.txt")[6] == 1
+    assert index.get("/idx3/sub/c.txt")[6] == 1
+    statuses = refresh(index, client, "/idx3/")
+    assert statuses["/idx3/sub/b.txt"] == "changed"
+    assert statuses["/idx3/sub/c.txt"] in ("new", "changed")
+    assert index.get("/idx3/sub/b.txt")[3] == 7
+    assert index.get("/idx3/sub/b.txt")[6] == 0
+
+
+def test_refresh_removed(index, client, other):
+    make_tree(client, "/idx4/")
+    refresh(index, client, "/idx4/")
+    other.delete("/idx4/sub/b.txt")
+    other.delete("/idx4/a.csv")
+    statuses = refresh(index, client, "/idx4/")
+    assert statuses["/idx4/"] == "changed"
+    assert index.get("/idx4/a.csv") is None
+    assert index.get("/idx4/sub/b.txt") is None
+    other.delete("/idx4/sub/")
+    other.delete("/idx4/")
+    assert refresh(index, client, "/idx4/") == {"/idx4/": "removed"}
+    assert list(index.find("/idx4/")) == []
+
+
+def test_client_delete(index, client):
+    make_tree(client, "/idx5/")
+    refresh(index, client, "/idx5/")
+    client.index = index
+    client.delete("/idx5/sub/b.txt")
+    assert index.get("/idx5/sub/b.txt") is None
+    assert index.ls("/idx5/sub/").json()["children"] == []
+
+
+def test_replaced_type(index, client, other):
+    make_tree(client, "/idx6/")
+    refresh(index, client, "/idx6/")
+    other.delete("/idx6/a.csv")
+    other.mkdir("/idx6/a.csv/")
+    statuses = refresh(index, client, "/idx6/")
+    assert statuses["/idx6/a.csv/"] == "new"
+    assert index.get("/idx6/a.csv") is None
+    assert index.get("/idx6/a.csv/")[2] == 1
+
+
+def test_bind(index):
+    with pytest.raises(NamespaceIndexError, match="describes the archive"):
+        index.bind("http://other.example.org")
+
+
+def test_cli(radon, client):
+    make_tree(client, "/idx7/")
+    code, out, err = radon("index", "refresh", "/idx7/")
+    assert code == 0, err
+    assert "4 new, 0 changed, 0 unchanged, 0 removed, 0 errors" in out
+    code, out, err = radon("ls", "/idx7/", "--index")
+    assert code == 0
+    assert out.split()[1:] == ["sub/", "a.csv"]
+    code, out, err = radon("index", "refresh", "/idx7/")
+    assert "0 new, 0 changed, 2 unchanged" in out
@@ -0,0 +1,83 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import json
+import random
+
+import pytest
+
+from cli.jsonbackend import iter_array
+
+
+DOCUMENT = {
+    "objectType": "application/cdmi-container",
+    "size": 12.5e3,
+    "count": -42,
+    "metadata": {"project": "alpha", "ratio": 0.125, "tags": ["a", "b"]},
+    "children": [
+        "data/",
+        "été.csv",
+        1.5,
+        -3e-5,
+        1e5,
+        10,
+        True,
+        None,
+        {"name": "x\"y", "size": 123456789},
+        [],
+    ],
+    "completionStatus": "Complete",
+}
+
+
+def split_chunks(data, sizes):
+    """Split ``data`` in chunks of the given sizes (the last one gets the
+    rest)"""
+    chunks = []
+    for size in sizes:
+        chunks.append(data[:size])
+        data = data[size:]
+    return chunks + [data]
+
+
+@pytest.mark.parametrize(
+    "chunks, expected",
+    [
+        ([b'{"children": [1.', b"5]}"], [1.5]),
+        ([b'{"children": [1', b"e5]}"], [1e5]),
+        ([b'{"children": [-', b"12, 3", b"4]}"], [-12, 34]),
+        ([b'{"size": 1', b'0, "children": ["a"]}'], ["a"]),
+        ([b'{"children": [tr', b"ue, nu", b"ll]}"], [True, None]),
+        ([b'{"children": []}'], []),
+        ([b'{"size": 1}'], []),
+    ],
+)
+def test_iter_array_split_tokens(chunks, expected):
+    assert list(iter_array(chunks, "children")) == expected
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_iter_array_random_chunks(seed):
+    rand = random.Random(seed)
+    data = json.dumps(DOCUMENT, ensure_ascii=False).encode("utf-8")
+    sizes = [rand.randint(0, 8) for _ in range(len(data))]
+    chunks = split_chunks(data, sizes)
+    assert list(iter_array(chunks, "children")) == DOCUMENT["children"]
+
+
+def test_iter_array_invalid_document():
+    with pytest.raises(ValueError):
+        list(iter_array([b'{"children": [1 2]}'], "children"))
@@ -0,0 +1,90 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import pytest
+
+from cli.client import RadonClient
+from cli.manifest import ManifestError, load_manifest, register_references
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_load_csv(tmp_path):
+    path = write(
+        tmp_path,
+        "refs.csv",
+        'url,dest,mimetype,metadata\n'
+        'http://a/1,/refs/1,text/plain,"{""k"": ""v""}"\n'
+        "http://a/2,2,,\n",
+    )
+    entries = list(load_manifest(path))
+    assert entries == [
+        {"url": "http://a/1", "dest": "/refs/1", "mimetype": "text/plain",
+         "metadata": {"k": "v"}},
+        {"url": "http://a/2", "dest": "2", "mimetype": None, "metadata": {}},
+    ]
+
+
+@pytest.mark.parametrize(
+    "text",
+    ['{"url": "http://a"}\n', '{"url": "u", "dest": "d", "metadata": "[1]"}\n', "{\n"],
+)
+def test_load_invalid(tmp_path, text):
+    path = write(tmp_path, "refs.jsonl", text)
+    with pytest.raises(ManifestError):
+        list(load_manifest(path))
+
+
+def test_register(tmp_path, client, mock):
+    path = write(
+        tmp_path,
+        "refs.jsonl",
+        '{"url": "http://a/1", "dest": "/manifest/x/y/1", "metadata": {"k": "v"}}\n'
+        "[1, 2]\n"
+        '"x"\n'
+        '{"url": "http://a/2", "dest": "/manifest/x/y/2"}\n'
+        '{"url": "http://a/3", "dest": "/manifest/x/z/3"}\n',
+    )
+    results = {
+        entry["dest"]: res
+        for entry, res in register_references(client, load_manifest(path), 4)
+    }
+    assert results["line 2"].code() == 400
+    assert results["line 3"].code() == 400
+    for dest in ("/manifest/x/y/1", "/manifest/x/y/2", "/manifest/x/z/3"):
+        assert results[dest].ok(), results[dest].msg()
+    assert mock.nodes["/manifest/x/y/1"]["reference"] == "http://a/1"
+    assert mock.nodes["/manifest/x/y/1"]["metadata"] == {"k": "v"}
+    # Already registered
+    results = list(register_references(client, load_manifest(path), 4))
+    assert sorted(res.code() for _, res in results) == [400, 400, 409, 409, 409]
+
+
+def test_register_connection_error():
+    # Nothing listens on the port, each reference fails without stopping
+    # the others
+    client = RadonClient("http://127.0.0.1:9")
+    entries = [
+        {"url": "http://a/1", "dest": "/1", "mimetype": None, "metadata": {}},
+        {"url": "http://a/2", "dest": "/2", "mimetype": None, "metadata": {}},
+    ]
+    results = list(register_references(client, entries, 2))
+    assert [res.code() for _, res in results] == [503, 503]
@@ -0,0 +1,71 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import pytest
+
+from cli.client import fast_normalize_path, normalize_path, normalize_path_cached
+
+PATHS = [
+    "/",
+    "",
+    ".",
+    "..",
+    "./",
+    "../",
+    "/a/b/c",
+    "/a/b/c/",
+    "/a/./b",
+    "/a/b/.",
+    "/a/b/./",
+    "/a/../b",
+    "/a/b/..",
+    "/a/b/../",
+    "/..",
+    "/../a",
+    "/a/.../b",
+    "/a/..b/.c",
+    "/a//b",
+    "//a/b",
+    "/a/b//",
+    "/a///b/",
+    "a",
+    "a/",
+    "a/b/../c",
+    "./a",
+    "../a/",
+    "../../..",
+    "a//b/",
+    "/data file/é.csv",
+    "data file/é/",
+    "/a/b%20c",
+    "/~user/x_y-z.tar.gz",
+]
+
+
+@pytest.mark.parametrize("pwd", ["/", "/bench/dir0/", "/a b/é/"])
+@pytest.mark.parametrize("path", PATHS)
+def test_fast_normalize(pwd, path):
+    normalize_path_cached.cache_clear()
+    assert fast_normalize_path(pwd, path) == normalize_path(pwd, path)
+    # Memoized
+    assert fast_normalize_path(pwd, path) == normalize_path(pwd, path)
+
+
+def test_normalize():
+    assert normalize_path("/a/b/", "../c/./d/") == "/a/c/d/"
+    assert normalize_path("/a/", "d e") == "/a/d%20e"
+    assert fast_normalize_path("/", "/a/b/") == "/a/b/"
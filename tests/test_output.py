@@ -0,0 +1,113 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import errno
+import io
+import json
+
+import pytest
+
+from cli.output import (
+    EXIT_CONFLICT,
+    EXIT_DENIED,
+    EXIT_ERROR,
+    EXIT_NOT_FOUND,
+    EXIT_OK,
+    EXIT_SERVER,
+    EXIT_USAGE,
+    JsonOutput,
+    exit_code,
+)
+
+
+@pytest.mark.parametrize(
+    "code, expected",
+    [
+        (None, EXIT_OK),
+        (0, EXIT_OK),
+        (404, EXIT_NOT_FOUND),
+        (errno.ENOENT, EXIT_NOT_FOUND),
+        (401, EXIT_DENIED),
+        (403, EXIT_DENIED),
+        (errno.EACCES, EXIT_DENIED),
+        (409, EXIT_CONFLICT),
+        (errno.EEXIST, EXIT_CONFLICT),
+        (400, EXIT_USAGE),
+        (errno.EINVAL, EXIT_USAGE),
+        (429, EXIT_SERVER),
+        (500, EXIT_SERVER),
+        (503, EXIT_SERVER),
+        (1, EXIT_ERROR),
+        (errno.EISDIR, EXIT_ERROR),
+    ],
+)
+def test_exit_code(code, expected):
+    assert exit_code(code) == expected
+
+
+def write(records, lines=False, failed=False):
+    stream = io.StringIO()
+    output = JsonOutput(stream, lines)
+    for kind, record in records:
+        getattr(output, kind)(record)
+    output.close(failed)
+    return stream.getvalue()
+
+
+def test_json_result():
+    assert json.loads(write([("result", {"path": "/a"})])) == {"path": "/a"}
+
+
+def test_json_items():
+    records = [("item", {"n": n}) for n in range(3)]
+    assert json.loads(write(records)) == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert json.loads(write(records[:1])) == [{"n": 0}]
+    assert json.loads(write([])) == []
+
+
+def test_json_failed():
+    assert write([], failed=True) == ""
+    assert json.loads(write([("item", {"n": 0})], failed=True)) == [{"n": 0}]
+
+
+def test_jsonl():
+    records = [("item", {"n": 0}), ("item", {"data": b"x", "set": {2, 1}})]
+    assert write(records, lines=True).splitlines() == [
+        '{"n": 0}',
+        '{"data": "x", "set": [1, 2]}',
+    ]
+    assert write([], lines=True) == ""
+
+
+def test_cli_json(radon, client):
+    client.mkdir("/output/")
+    client.put("/output/a", b"a")
+    entry = {"path": "/output/a", "name": "a", "objectType": "application/cdmi-object"}
+    code, out, err = radon("ls", "/output/", "--json")
+    assert code == EXIT_OK
+    assert json.loads(out) == [entry]
+    code, out, err = radon("ls", "/output/", "--jsonl")
+    assert code == EXIT_OK
+    assert [json.loads(line) for line in out.splitlines()] == [entry]
+
+
+def test_cli_not_found(radon, tmp_path):
+    for args in (("ls", "/missing/"), ("get", "/missing", str(tmp_path / "x"))):
+        code, out, err = radon(*args, "--json")
+        assert code == EXIT_NOT_FOUND
+        assert out == ""
+        assert "/missing" in json.loads(err)["error"]
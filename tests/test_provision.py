@@ -0,0 +1,129 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import json
+
+import pytest
+
+from cli.client import RadonClient, Response
+from cli.provision import ProvisionError, load_spec, plan_import
+
+
+def write_spec(tmp_path, data, name="spec.json"):
+    path = tmp_path / name
+    path.write_text(json.dumps(data) if name.endswith(".json") else data)
+    return str(path)
+
+
+def test_load_csv(tmp_path):
+    path = write_spec(
+        tmp_path,
+        "username,email,administrator,active,password,groups\n"
+        "alice,a@x,yes,,pw,g1;g2\n"
+        "bob,,no,false,,\n",
+        "spec.csv",
+    )
+    spec = load_spec(path)
+    assert spec["users"]["alice"] == {
+        "username": "alice", "email": "a@x", "password": "pw", "administrator": True
+    }
+    assert spec["users"]["bob"] == {
+        "username": "bob", "administrator": False, "active": False
+    }
+    assert spec["groups"] == {"g1": {"alice"}, "g2": {"alice"}}
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        ({"groups": ["g1"]}, "Group entry 1 isn't a mapping"),
+        ({"groups": [{"members": ["a"]}]}, "Group entry 1 doesn't have a name"),
+        ({"groups": [{"name": "g", "members": [1]}]}, "Group entry 1: members"),
+        ({"users": [{"username": "u"}, {"email": "x"}]},
+         "User entry 2 doesn't have a username"),
+        ({"users": [{"username": "u", "groups": "g"}]}, "User entry 1: groups"),
+        ({"users": {"u": {}}}, "The users of the file must be a list"),
+        ([1], "doesn't describe users and groups"),
+    ],
+)
+def test_load_invalid(tmp_path, data, message):
+    with pytest.raises(ProvisionError, match=message):
+        load_spec(write_spec(tmp_path, data))
+
+
+def spec(users, groups):
+    return {
+        "users": {name: dict(fields, username=name) for name, fields in users.items()},
+        "groups": groups,
+    }
+
+
+def test_plan():
+    wanted = spec(
+        {"new": {"email": "n@x"}, "old": {"email": "o@x", "active": False}},
+        {"g": {"new", "old", "other"}, "h": {"old"}},
+    )
+    creations, updates = plan_import(
+        wanted,
+        {"old", "other"},
+        {"h"},
+        {"old": {"email": "o@x", "active": True, "administrator": False}},
+        {"h": {"members": ["old"]}},
+    )
+    assert creations == [("mkgroup", "g"), ("mkuser", "new", "n@x", False, None)]
+    assert updates == [
+        ("moduser", "old", {"active": False}),
+        ("atg", "g", ["new", "old", "other"]),
+    ]
+
+
+def test_plan_unknown_member():
+    wanted = spec({"a": {}}, {"g": {"a", "ghost"}})
+    with pytest.raises(ProvisionError, match="Group g: unknown users ghost"):
+        plan_import(wanted, set(), set(), {}, {})
+
+
+def test_plan_missing_details():
+    wanted = spec({"a": {"email": "a@x"}}, {})
+    with pytest.raises(ProvisionError, match="descriptions of a are missing"):
+        plan_import(wanted, {"a"}, set(), {}, {})
+
+
+def test_import(radon, tmp_path, mock):
+    path = write_spec(tmp_path, {
+        "users": [{"username": "carol", "email": "c@x", "groups": ["team"]}],
+        "groups": [{"name": "team", "members": ["admin"]}],
+    })
+    code, out, err = radon("admin", "import", path, "--dry-run")
+    assert code == 0
+    assert "Create user carol" in out and "Add admin, carol to group team" in out
+    code, out, err = radon("admin", "import", path)
+    assert code == 0, err
+    assert sorted(mock.groups["team"]["members"]) == ["admin", "carol"]
+    code, out, err = radon("admin", "import", path)
+    assert code == 0 and "Nothing to do" in out
+
+
+def test_import_failed_details(radon, tmp_path, monkeypatch):
+    path = write_spec(tmp_path, {"users": [{"username": "admin", "email": "a@x"}]})
+    monkeypatch.setattr(
+        RadonClient, "list_user", lambda self, name: Response(500, "Server error")
+    )
+    code, out, err = radon("admin", "import", path)
+    assert code != 0
+    assert "Can't read admin: Server error" in out + err
+    assert "Modify user" not in out
@@ -0,0 +1,116 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import io
+import os
+import tarfile
+import threading
+
+from cli.tarstream import export_tar, ingest_tar, walk_sorted
+from cli.transfer import TransferScheduler
+
+
+def make_tree(client):
+    client.mkdir("/src/")
+    client.mkdir("/src/sub/")
+    client.mkdir("/src/sub/deep/")
+    client.put("/src/a.txt", b"a" * 100, metadata={"project": "alpha"})
+    client.put("/src/sub/b.bin", os.urandom(5000))
+    client.put("/src/sub/deep/large", os.urandom(300000))
+    client.put("/src/sub0", b"")
+    return {
+        path: client.open(path).content
+        for path in ("/src/a.txt", "/src/sub/b.bin", "/src/sub/deep/large", "/src/sub0")
+    }
+
+
+def test_walk_sorted(client):
+    make_tree(client)
+    paths = [path for path, res in walk_sorted(client, "/src/", jobs=2)]
+    assert paths == sorted(paths)
+    assert paths[0] == "/src/" and len(paths) == 7
+
+
+def test_export_ingest_round_trip(client):
+    contents = make_tree(client)
+    archive = io.BytesIO()
+    with TransferScheduler(2) as scheduler:
+        results = list(export_tar(client, "/src/", archive, scheduler, 1000))
+    assert all(res.ok() for _, res in results)
+    # The members are in the order of the paths
+    assert [path for path, _ in results] == sorted(path for path, _ in results)
+    archive.seek(0)
+    with tarfile.open(fileobj=archive) as tar:
+        names = tar.getnames()
+    assert names == sorted(names)
+    assert "src/sub/deep/large" in names
+    archive.seek(0)
+    with TransferScheduler(2) as scheduler:
+        results = list(ingest_tar(client, archive, "/copy/", scheduler, 1000))
+    assert all(res.ok() for _, res in results)
+    for path, content in contents.items():
+        assert client.open("/copy" + path).content == content
+    metadata = client.get_cdmi("/copy/src/a.txt").json()["metadata"]
+    assert metadata["project"] == "alpha"
+
+
+def test_ingest_unsafe_path(client):
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        info = tarfile.TarInfo("../escape")
+        info.size = 1
+        tar.addfile(info, io.BytesIO(b"x"))
+    archive.seek(0)
+    with TransferScheduler(2) as scheduler:
+        results = list(ingest_tar(client, archive, "/unsafe/", scheduler))
+    assert [(path, res.code()) for path, res in results] == [("../escape", 400)]
+
+
+def test_ingest_reads_within_budget(client, monkeypatch):
+    size = 10000
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        for idx in range(40):
+            info = tarfile.TarInfo("obj{}".format(idx))
+            info.size = size
+            tar.addfile(info, io.BytesIO(os.urandom(size)))
+    archive.seek(0)
+    scheduler = TransferScheduler(2, buffer_size=3 * size)
+    budget = scheduler.budget
+    held = []
+    lock = threading.Lock()
+    extractfile = tarfile.TarFile.extractfile
+
+    def checked_extractfile(tar, member):
+        fh = extractfile(tar, member)
+        read = fh.read
+
+        def checked_read(*args):
+            # The bytes of the member are held before they're read
+            with lock:
+                held.append(budget.used)
+            return read(*args)
+
+        fh.read = checked_read
+        return fh
+
+    monkeypatch.setattr(tarfile.TarFile, "extractfile", checked_extractfile)
+    with scheduler:
+        results = list(ingest_tar(client, archive, "/budget/", scheduler, size))
+    assert len(results) == 40 and all(res.ok() for _, res in results)
+    assert held and max(held) <= budget.limit
+    assert min(held) >= size
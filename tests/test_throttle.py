@@ -0,0 +1,164 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import gzip
+import threading
+
+import pytest
+
+from cli import throttle
+from cli.client import dumps
+from cli.compression import ENCODING_METADATA
+from cli.throttle import AdaptiveConcurrency, Throttle, TokenBucket
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the sleeps of the token buckets instead of waiting"""
+    calls = []
+    monkeypatch.setattr(throttle.time, "sleep", calls.append)
+    return calls
+
+
+def test_bucket_burst(sleeps):
+    bucket = TokenBucket(10)
+    for _ in range(10):
+        bucket.consume()
+    assert sleeps == []
+
+
+def test_bucket_debt(sleeps):
+    bucket = TokenBucket(100, capacity=50)
+    bucket.consume(50)
+    bucket.consume(150)
+    assert len(sleeps) == 1
+    assert sleeps[0] == pytest.approx(1.5, abs=0.05)
+
+
+def test_aimd_increase():
+    limiter = AdaptiveConcurrency(8)
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(200, 0.01)
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+    for _ in range(200):
+        limiter.acquire()
+        limiter.release(200, 0.01)
+    assert limiter.limit == 8
+
+
+@pytest.mark.parametrize("status", [429, 503, None])
+def test_aimd_overload(status):
+    limiter = AdaptiveConcurrency(8)
+    limiter.acquire()
+    limiter.release(status, None)
+    assert limiter.limit == 2
+    assert limiter.inflight() == 0
+
+
+def test_aimd_minimum():
+    limiter = AdaptiveConcurrency(8, min_limit=2)
+    limiter._last_decrease = -1.0
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(503, None)
+        limiter._last_decrease = -1.0
+    assert limiter.limit == 2
+
+
+def test_aimd_latency():
+    limiter = AdaptiveConcurrency(8, tolerance=2.0)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(200, 0.1)
+    limit = limiter.limit
+    # The time spent sending a body isn't a sign of overload
+    limiter.acquire()
+    limiter.release(200, None)
+    assert limiter.limit > limit
+    limiter.acquire()
+    limiter.release(200, 1.0)
+    assert limiter.limit < limit
+
+
+def test_aimd_wait():
+    limiter = AdaptiveConcurrency(2)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def worker():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release(200, 0.01)
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_throttle_held_slot():
+    limits = Throttle(max_jobs=4)
+    slot = limits.acquire()
+    stream = limits.begin_stream(200, 0.01, slot)
+    assert limits.concurrency.inflight() == 1
+    # A request sent for the body, from another thread, doesn't need a slot
+    nested = []
+    thread = threading.Thread(
+        target=lambda: nested.append(limits.acquire(held_slot=stream))
+    )
+    thread.start()
+    thread.join(5)
+    assert nested == [False]
+    limits.release(200, 0.01, nested[0])
+    assert limits.concurrency.inflight() == 1
+    stream.release()
+    stream.release()
+    assert limits.concurrency.inflight() == 0
+    assert limits.inflight() == 0
+    # Once the body is read its slot is no longer held
+    assert limits.acquire(held_slot=stream)
+
+
+def test_throttle_stream_other_requests():
+    limits = Throttle(max_jobs=4)
+    stream = limits.begin_stream(200, 0.01, limits.acquire())
+    # Another request of the thread which opened the stream takes a slot
+    assert limits.acquire()
+    assert limits.concurrency.inflight() == 2
+    stream.release()
+
+
+def test_decoded_content_one_slot(client):
+    client.put_http("/compressed", gzip.compress(b"data" * 100), "text/plain")
+    client.put_cdmi("/compressed", dumps({"metadata": {ENCODING_METADATA: "gzip"}}))
+    client.configure_throttle(max_jobs=1)
+    assert client.throttle.concurrency.limit == 1
+    content = []
+
+    def read():
+        res = client.open("/compressed")
+        content.append(b"".join(client.decoded_content("/compressed", res)))
+        res.close()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join(10)
+    assert content == [b"data" * 100]
+    assert client.throttle.concurrency.inflight() == 0
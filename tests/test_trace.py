@@ -0,0 +1,69 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import pytest
+
+from cli.trace import OperationStats, Tracer
+
+
+def record(total, status=200):
+    return {
+        "method": "GET",
+        "path": "/api/cdmi/{object}",
+        "status": status,
+        "retries": 0,
+        "bytes_in": 10,
+        "bytes_out": 0,
+        "total": total,
+    }
+
+
+def test_percentiles_from_histogram():
+    stats = OperationStats()
+    # 90 requests of 15 ms, 9 of 150 ms, 1 of 30 s
+    for total in [0.015] * 90 + [0.15] * 9 + [30.0]:
+        stats.add(record(total))
+    assert 0.01 <= stats.percentile(50) <= 0.02
+    assert 0.1 <= stats.percentile(95) <= 0.2
+    assert stats.percentile(100) == 30.0
+    assert stats.max_latency == 30.0
+    assert not hasattr(stats, "latencies")
+
+
+def test_percentile_never_above_max():
+    stats = OperationStats()
+    stats.add(record(0.0011))
+    assert stats.percentile(99) == pytest.approx(0.0011)
+    assert OperationStats().percentile(50) == 0.0
+
+
+def test_summary():
+    tracer = Tracer()
+    tracer.record(record(0.003))
+    tracer.record(record(0.5, status=503))
+    summary = tracer.summary()
+    assert "GET /api/cdmi/{object}: 2 requests, 1 errors" in summary
+    assert "max=500.0ms" in summary
+
+
+def test_hooks_only():
+    tracer = Tracer(keep_stats=False)
+    records = []
+    tracer.add_hook(records.append)
+    tracer.record(record(0.01))
+    assert records == [record(0.01)]
+    assert tracer.stats == {}
@@ -0,0 +1,76 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import io
+import os
+import tarfile
+import time
+
+from cli.transfer import ChunkReader, TransferStats
+
+# Size of the reads of tarfile.TarFile.addfile (tarfile.copyfileobj)
+TAR_BLOCK_SIZE = 16 * 1024
+
+
+def read_blocks(reader, size):
+    blocks = []
+    while True:
+        block = reader.read(size)
+        if not block:
+            return b"".join(blocks)
+        blocks.append(block)
+
+
+def test_chunk_reader_blocks():
+    chunks = [os.urandom(size) for size in (1, 0, 70000, 16384, 3, 100000)]
+    stats = TransferStats()
+    stats.begin("obj")
+    reader = ChunkReader(iter(chunks), stats, "obj")
+    assert read_blocks(reader, TAR_BLOCK_SIZE) == b"".join(chunks)
+    assert stats.bytes == sum(len(chunk) for chunk in chunks)
+    assert reader.read(10) == b""
+
+
+def test_chunk_reader_read_all():
+    reader = ChunkReader([b"abc", b"def", b"gh"])
+    assert reader.read(4) == b"abcd"
+    assert reader.read() == b"efgh"
+    assert reader.read() == b""
+
+
+def test_chunk_reader_tar_member():
+    chunks = [os.urandom(1024 * 1024) for _ in range(5)] + [b"end"]
+    data = b"".join(chunks)
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w|") as tar:
+        info = tarfile.TarInfo("obj")
+        info.size = len(data)
+        tar.addfile(info, ChunkReader(chunks))
+    out.seek(0)
+    with tarfile.open(fileobj=out) as tar:
+        assert tar.extractfile("obj").read() == data
+
+
+def test_chunk_reader_large_chunks_linear():
+    # Each byte of the large ranges is copied once, as with a BytesIO
+    part = b"x" * (8 * 1024 * 1024)
+    start = time.monotonic()
+    read_blocks(io.BytesIO(part * 4), TAR_BLOCK_SIZE)
+    reference = time.monotonic() - start
+    start = time.monotonic()
+    read_blocks(ChunkReader([part] * 4), TAR_BLOCK_SIZE)
+    assert time.monotonic() - start < 10 * reference + 0.2
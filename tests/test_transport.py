@@ -0,0 +1,72 @@
+"""Copyright 2019 -
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+
+import socket
+
+import pytest
+import requests
+
+from cli.transport import ProgressFile, ZeroCopyAdapter
+
+
+@pytest.fixture
+def session():
+    session = requests.Session()
+    session.mount("http://", ZeroCopyAdapter())
+    return session
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / "upload"
+    path.write_bytes(b"x" * 100000)
+    with open(path, "rb") as fh:
+        yield fh
+
+
+def test_sendfile(client, upload):
+    sent = []
+    res = client.put("/sendfile", ProgressFile(upload, sent.append))
+    assert res.ok(), res.msg()
+    assert sum(sent) == 100000
+    assert client.open("/sendfile").content == b"x" * 100000
+
+
+def test_sendfile_timeout(session, upload):
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        url = "http://127.0.0.1:{}/x".format(server.getsockname()[1])
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            session.put(url, data=upload, timeout=0.2)
+        conn, _ = server.accept()
+        with conn:
+            conn.settimeout(5)
+            # The request was sent, then the connection was closed
+            received = b""
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                received += data
+    assert received.startswith(b"PUT /x HTTP/1.1")
+    assert received.endswith(b"x" * 100000)
+
+
+def test_sendfile_refused(session, upload):
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        port = server.getsockname()[1]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.put("http://127.0.0.1:{}/x".format(port), data=upload)